@@ -0,0 +1,901 @@
+import numpy as np
+np.set_printoptions(precision=3, floatmode="fixed")
+
+
+class BatchBounder:
+    # every allowed combination of (exogeneity, monotonicity, strong_exo).
+    # strong exogeneity implies exogeneity.
+    FLAG_COMBOS = (
+        (False, False, False),
+        (True, False, False),
+        (False, True, False),
+        (True, True, False),
+        (True, False, True),
+        (True, True, True))
+    # the 4 constraint scenarios (exogeneity, monotonicity) of
+    # calc_all_scenarios_pns3_bds(), in the order of its output
+    SCENARIOS = (
+        (False, False),
+        (True, False),
+        (False, True),
+        (True, True))
+    # default tolerance of the compatibility flag. Strata whose E_{y|x}
+    # lies on a bound would otherwise be flagged incompatible by rounding
+    # errors of ~1e-17.
+    COMPAT_TOL = 1e-12
+
+    def __init__(self, o_y_bar_x, px, e_y_bar_x=None):
+        """
+        This class is a vectorized version of class Bounder. A Bounder
+        object holds a single stratum as Python scalars. A BatchBounder
+        object holds N strata as NumPy arrays and calculates the bounds for
+        all of them in one NumPy pass, using boolean masks instead of Python
+        branching.
+
+        The notation is the same as in class Bounder, except that every
+        array gets an extra leading axis of length N, the number of strata.
+        For each stratum, the results are identical to those obtained by
+        building a Bounder object and calling Bounder.set_pns3_bds() on it.
+
+        A row of e_y_bar_x that contains a NaN is treated as a stratum
+        without Experimental data (the analogue of Bounder's
+        e_y_bar_x=None).
+
+        The constraint flags exogeneity, monotonicity and strong_exo can be
+        either bools (same constraints for all strata) or bool arrays of
+        shape (N, ) (one set of constraints per stratum).
+
+        Attributes
+        ----------
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+            E_{y|x} for each stratum
+        exogeneity : bool, np.array[shape=(N, )]
+        left_bds_e_y_bar_x : np.array[shape=(N, 2, 2)]
+            left (low) bounds for each element of E_{y|x}
+        monotonicity : bool, np.array[shape=(N, )]
+        num_strata : int
+            N
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+            O_{y|x} for each stratum
+        pns3_bds : np.array[shape=(N, 3, 2)]
+            pns3_bds[n] = [[PNS_low, PNS_high],
+                           [PN_low, PN_high],
+                           [PS_low, PS_high]] for stratum n
+        px : np.array[shape=(N, 2)]
+            P(x) for each stratum
+        right_bds_e_y_bar_x : np.array[shape=(N, 2, 2)]
+            right (high) bounds for each element of E_{y|x}
+        strong_exo : bool, np.array[shape=(N, )]
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+            O_{y|x}
+        px : np.array[shape=(N, 2)]
+            P(x)
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+            E_{y|x}
+        """
+        self.o_y_bar_x = None
+        self.px = None
+        self.num_strata = 0
+        self.set_obs_probs(o_y_bar_x, px)
+
+        self.e_y_bar_x = None
+        if e_y_bar_x is not None:
+            self.set_exp_probs(e_y_bar_x)
+        self.left_bds_e_y_bar_x = np.zeros(shape=(self.num_strata, 2, 2))
+        self.right_bds_e_y_bar_x = np.zeros(shape=(self.num_strata, 2, 2))
+        self.pns3_bds = np.zeros(shape=(self.num_strata, 3, 2))
+
+        self.exogeneity = False
+        self.monotonicity = False
+        self.strong_exo = False
+
+    def set_obs_probs(self, o_y_bar_x, px):
+        """
+        This method refreshes the class attributes with new observational
+        probabilities. It checks the shapes of the input.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+            O_{y|x}
+        px : np.array[shape=(N, 2)]
+            P(x)
+
+        Returns
+        -------
+        None
+
+        """
+        o_y_bar_x = np.asarray(o_y_bar_x)
+        px = np.asarray(px)
+        BatchBounder.check_batch_shapes(o_y_bar_x, px)
+        self.o_y_bar_x = o_y_bar_x
+        self.px = px
+        self.num_strata = o_y_bar_x.shape[0]
+
+    def set_exp_probs(self, e_y_bar_x):
+        """
+        This method refreshes the class attributes with new experimental
+        probabilities. It checks the shape of the input.
+
+        Parameters
+        ----------
+        e_y_bar_x : np.array[shape=(N, 2, 2)]
+            E_{y|x}
+
+        Returns
+        -------
+        None
+
+        """
+        e_y_bar_x = np.asarray(e_y_bar_x)
+        BatchBounder.check_batch_shapes(self.o_y_bar_x, self.px, e_y_bar_x)
+        self.e_y_bar_x = e_y_bar_x
+
+    @staticmethod
+    def check_batch_shapes(o_y_bar_x, px, e_y_bar_x=None):
+        """
+        Checks that the input arrays have consistent batch shapes. Raises a
+        ValueError if they don't. The values of the arrays are not
+        checked. Use Validator.validate() for that.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+        px : np.array[shape=(N, 2)]
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+
+        Returns
+        -------
+        None
+
+        """
+        num_strata = o_y_bar_x.shape[0] if o_y_bar_x.ndim else 0
+        if o_y_bar_x.shape != (num_strata, 2, 2):
+            raise ValueError("o_y_bar_x must have shape (N, 2, 2), not %s"
+                             % (o_y_bar_x.shape, ))
+        if px.shape != (num_strata, 2):
+            raise ValueError("px must have shape (%d, 2), not %s"
+                             % (num_strata, px.shape))
+        if e_y_bar_x is not None and e_y_bar_x.shape != (num_strata, 2, 2):
+            raise ValueError("e_y_bar_x must have shape (%d, 2, 2), not %s"
+                             % (num_strata, e_y_bar_x.shape))
+
+    def get_ate(self):
+        """
+        Returns ATE = E_{1|1} - E_{1|0} for each stratum, or None. Strata
+        without Experimental data get a NaN.
+
+        Returns
+        -------
+        np.array[shape=(N, )], None
+
+        """
+        if self.e_y_bar_x is not None:
+            return self.e_y_bar_x[:, 1, 1] - self.e_y_bar_x[:, 1, 0]
+        else:
+            return None
+
+    def set_exp_probs_bds(self):
+        """
+        This method sets the class attributes for the elementwise bounds on
+        the transition probability matrices E_{y|x} of every stratum.
+
+        Returns
+        -------
+        None
+
+        """
+        self.left_bds_e_y_bar_x, self.right_bds_e_y_bar_x = \
+            BatchBounder.calc_exp_probs_bds(
+                self.o_y_bar_x,
+                self.px,
+                monotonicity=self.monotonicity)
+
+    def get_exp_probs_bds(self):
+        """
+        Returns left (low) and right (high) bounds of e_y_bar_x
+
+        Returns
+        -------
+        np.array[shape=(N, 2, 2)], np.array[shape=(N, 2, 2)]
+            self.left_bds_e_y_bar_x,  self.right_bds_e_y_bar_x
+
+        """
+        return self.left_bds_e_y_bar_x, self.right_bds_e_y_bar_x
+
+    def get_exp_compatibility(self, tol=COMPAT_TOL):
+        """
+        Returns, for each stratum, whether E_{y|x} lies inside the bounds
+        that O_{y|x} imposes on it, and by how much it violates them.
+        set_exp_probs_bds() must be called before this method.
+
+        Parameters
+        ----------
+        tol : float
+            violations smaller than or equal to tol are tolerated
+
+        Returns
+        -------
+        np.array[shape=(N, ), dtype=bool], np.array[shape=(N, )]
+            compatible, margin
+
+        """
+        return BatchBounder.calc_exp_compatibility(
+            self.e_y_bar_x,
+            self.left_bds_e_y_bar_x,
+            self.right_bds_e_y_bar_x,
+            tol=tol)
+
+    @staticmethod
+    def calc_exp_probs_bds(o_y_bar_x, px, monotonicity=False):
+        """
+        Returns the elementwise bounds on E_{y|x} that O_{y|x} and P(x)
+        impose, for N strata. This is the vectorized version of
+        Bounder.set_exp_probs_bds().
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+            O_{y|x}
+        px : np.array[shape=(N, 2)]
+            P(x)
+        monotonicity : bool, np.array[shape=(N, )]
+
+        Returns
+        -------
+        np.array[shape=(N, 2, 2)], np.array[shape=(N, 2, 2)]
+            left (low) bounds, right (high) bounds
+
+        """
+        o_y_bar_x = np.asarray(o_y_bar_x)
+        px = np.asarray(px)
+        num_strata = o_y_bar_x.shape[0]
+        d = BatchBounder.get_dofs(o_y_bar_x, px)
+        mono = np.broadcast_to(monotonicity, (num_strata, ))
+        dtype = np.result_type(o_y_bar_x, px)
+        left = np.empty(shape=(num_strata, 2, 2), dtype=dtype)
+        right = np.empty(shape=(num_strata, 2, 2), dtype=dtype)
+
+        left[:, 1, 1] = np.where(mono, d['py1'], d['o11'])
+        right[:, 1, 1] = 1 - d['o10']
+        left[:, 1, 0] = d['o01']
+        right[:, 1, 0] = np.where(mono, d['py1'], 1 - d['o00'])
+
+        # use if a <= x <= b then 1-b <= 1-x <= 1-a
+        left[:, 0, 1] = d['o10']
+        right[:, 0, 1] = np.where(mono, d['py0'], 1 - d['o11'])
+        left[:, 0, 0] = np.where(mono, d['py0'], d['o00'])
+        right[:, 0, 0] = 1 - d['o01']
+        return left, right
+
+    @staticmethod
+    def calc_exp_compatibility(e_y_bar_x, left_bds, right_bds,
+                               tol=COMPAT_TOL):
+        """
+        Checks, for N strata at once, whether the Experimental data E_{y|x}
+        is compatible with the Observational data, i.e., whether every
+        element of E_{y|x} lies inside the bounds that O_{y|x} imposes on
+        it. This is the non-printing, vectorized version of
+        Bounder.print_exp_probs_bds().
+
+        The violation margin of a stratum is the largest distance by which
+        an element of E_{y|x} falls outside its interval [left, right]. It
+        is 0 for compatible strata. Strata without Experimental data (rows
+        with a NaN) are reported as compatible with margin 0.
+
+        Parameters
+        ----------
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+            E_{y|x}. None means no Experimental data for all strata.
+        left_bds : np.array[shape=(N, 2, 2)]
+        right_bds : np.array[shape=(N, 2, 2)]
+        tol : float
+            violations smaller than or equal to tol are tolerated
+
+        Returns
+        -------
+        np.array[shape=(N, ), dtype=bool], np.array[shape=(N, )]
+            compatible, margin
+
+        """
+        num_strata = left_bds.shape[0]
+        if e_y_bar_x is None:
+            return np.ones(num_strata, dtype=bool), \
+                np.zeros(num_strata, dtype=left_bds.dtype)
+        e_y_bar_x = np.asarray(e_y_bar_x)
+        excess = np.maximum(left_bds - e_y_bar_x, e_y_bar_x - right_bds)
+        # fmax() turns the NaN margins of rows without Experimental data
+        # into 0
+        margin = np.fmax(excess.reshape(num_strata, 4).max(axis=1), 0)
+        compatible = margin <= tol
+        return compatible, margin
+
+    def set_pns3_bds(self):
+        """
+        This method sets the class attribute for the bounds for PNS3 = (PNS,
+        PN, PS) of every stratum.
+
+        Returns
+        -------
+        None
+
+        """
+        self.pns3_bds = BatchBounder.calc_pns3_bds(
+            self.o_y_bar_x,
+            self.px,
+            self.e_y_bar_x,
+            exogeneity=self.exogeneity,
+            monotonicity=self.monotonicity,
+            strong_exo=self.strong_exo)
+
+    def get_pns3_bds(self):
+        """
+        Returns PNS3 bounds.
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        return self.pns3_bds
+
+    @staticmethod
+    def get_probs_from_dofs(o1b0, o1b1, px1, e1b0=None, e1b1=None):
+        """
+        Returns the input arrays O_{y|x}, P(x) and E_{y|x} of N strata,
+        built from their 5 independent dofs. This is the inverse of
+        get_dofs(). The arrays have the dtype of the dofs (float64 for
+        integer dofs).
+
+        Parameters
+        ----------
+        o1b0 : np.array[shape=(N, )]
+            O_{1|0}
+        o1b1 : np.array[shape=(N, )]
+            O_{1|1}
+        px1 : np.array[shape=(N, )]
+            P(x=1)
+        e1b0 : np.array[shape=(N, )], None
+            E_{1|0}. None means no Experimental data.
+        e1b1 : np.array[shape=(N, )], None
+            E_{1|1}
+
+        Returns
+        -------
+        np.array[shape=(N, 2, 2)], np.array[shape=(N, 2)],
+        np.array[shape=(N, 2, 2)] | None
+            o_y_bar_x, px, e_y_bar_x
+
+        """
+        o1b0, o1b1, px1 = [np.asarray(v) for v in [o1b0, o1b1, px1]]
+        dofs = [o1b0, o1b1, px1]
+        if e1b0 is not None:
+            e1b0, e1b1 = np.asarray(e1b0), np.asarray(e1b1)
+            dofs += [e1b0, e1b1]
+        dtype = np.result_type(*dofs, 0.)
+        num_strata = len(o1b0)
+
+        o_y_bar_x = np.empty(shape=(num_strata, 2, 2), dtype=dtype)
+        o_y_bar_x[:, 1, 0] = o1b0
+        o_y_bar_x[:, 1, 1] = o1b1
+        o_y_bar_x[:, 0] = 1 - o_y_bar_x[:, 1]
+        px = np.empty(shape=(num_strata, 2), dtype=dtype)
+        px[:, 1] = px1
+        px[:, 0] = 1 - px[:, 1]
+        e_y_bar_x = None
+        if e1b0 is not None:
+            e_y_bar_x = np.empty(shape=(num_strata, 2, 2), dtype=dtype)
+            e_y_bar_x[:, 1, 0] = e1b0
+            e_y_bar_x[:, 1, 1] = e1b1
+            e_y_bar_x[:, 0] = 1 - e_y_bar_x[:, 1]
+        return o_y_bar_x, px, e_y_bar_x
+
+    @staticmethod
+    def get_dofs(o_y_bar_x, px, e_y_bar_x=None):
+        """
+        Returns a dictionary with the 1-dim arrays (one entry per stratum)
+        of all the quantities that the bounds formulas use. The names of
+        the keys are the same as the names of the scalar attributes of class
+        Bounder.
+
+        If e_y_bar_x is None, the E entries are filled with NaNs.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+        px : np.array[shape=(N, 2)]
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+
+        Returns
+        -------
+        dict[str, np.array[shape=(N, )]]
+
+        """
+        dofs = dict(
+            o0b0=o_y_bar_x[:, 0, 0],
+            o0b1=o_y_bar_x[:, 0, 1],
+            o1b0=o_y_bar_x[:, 1, 0],
+            o1b1=o_y_bar_x[:, 1, 1],
+            px0=px[:, 0],
+            px1=px[:, 1])
+        dofs['o00'] = dofs['o0b0']*dofs['px0']
+        dofs['o01'] = dofs['o1b0']*dofs['px0']  # oxy and oybx so flip x,y
+        dofs['o10'] = dofs['o0b1']*dofs['px1']  # oxy and oybx so flip x,y
+        dofs['o11'] = dofs['o1b1']*dofs['px1']
+        dofs['py0'] = dofs['o00'] + dofs['o10']
+        dofs['py1'] = dofs['o01'] + dofs['o11']
+        dofs['o_star_star'] = dofs['o00'] + dofs['o11']
+        dofs['o_star_bar_star'] = dofs['o0b0'] + dofs['o1b1']
+        if e_y_bar_x is None:
+            nans = np.full_like(dofs['o00'], np.nan)
+            e_y_bar_x = np.broadcast_to(nans[:, None, None], o_y_bar_x.shape)
+        dofs['e0b0'] = e_y_bar_x[:, 0, 0]
+        dofs['e0b1'] = e_y_bar_x[:, 0, 1]
+        dofs['e1b0'] = e_y_bar_x[:, 1, 0]
+        dofs['e1b1'] = e_y_bar_x[:, 1, 1]
+        dofs['e_star_bar_star'] = dofs['e0b0'] + dofs['e1b1']
+        return dofs
+
+    @staticmethod
+    def safe_ratio(num, den, default):
+        """
+        Returns num/den where den > 0 and default elsewhere, without ever
+        dividing by zero. This is the vectorized version of the "if den <=
+        0:" special cases in Bounder.set_pns3_bds().
+
+        Parameters
+        ----------
+        num : np.array[shape=(N, )]
+        den : np.array[shape=(N, )]
+        default : float
+
+        Returns
+        -------
+        np.array[shape=(N, )]
+
+        """
+        pos = den > 0
+        return np.where(pos, num/np.where(pos, den, 1), default)
+
+    @staticmethod
+    def calc_scenario_pns3_bds(dofs, exogeneity, monotonicity, strong_exo):
+        """
+        Returns the PNS3 bounds for all strata in dofs, assuming that they
+        all have Experimental data and that they all share the same
+        constraint flags. This is the vectorized version of the if-elif
+        chain in Bounder.set_pns3_bds().
+
+        Parameters
+        ----------
+        dofs : dict[str, np.array[shape=(N, )]]
+            output of get_dofs()
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        d = dofs
+        ratio = BatchBounder.safe_ratio
+        if strong_exo:
+            exogeneity = True
+        if not exogeneity and not monotonicity:
+            pns_left = np.maximum.reduce([
+                np.zeros_like(d['py0']),
+                d['e_star_bar_star'] - 1,
+                d['e0b0'] - d['py0'],
+                d['e1b1'] - d['py1']])
+            pns_right = np.minimum.reduce([
+                d['e1b1'],
+                d['e0b0'],
+                d['o_star_star'],
+                d['e_star_bar_star'] - d['o_star_star']])
+            pn_left = np.maximum(0, ratio(d['e0b0'] - d['py0'], d['o11'], 0))
+            pn_right = np.minimum(
+                1, ratio(d['e0b0'] - d['o00'], d['o11'], 1))
+            ps_left = np.maximum(0, ratio(d['e1b1'] - d['py1'], d['o00'], 0))
+            ps_right = np.minimum(
+                1, ratio(d['e1b1'] - d['o11'], d['o00'], 1))
+        elif exogeneity and not monotonicity:
+            pns_left = np.maximum(0, d['o_star_bar_star'] - 1)
+            pns_right = np.minimum(d['o1b1'], d['o0b0'])
+            pn_left = np.maximum(
+                0, ratio(d['o1b1'] - d['o1b0'], d['o1b1'], 0))
+            pn_right = np.minimum(1, ratio(d['o0b0'], d['o1b1'], 1))
+            ps_left = np.maximum(
+                0, ratio(d['o0b0'] - d['o0b1'], d['o0b0'], 0))
+            ps_right = np.minimum(1, ratio(d['o1b1'], d['o0b0'], 1))
+        else:
+            if not exogeneity:
+                e0b0, e1b1 = d['e0b0'], d['e1b1']
+                pns_left = d['e_star_bar_star'] - 1
+            else:
+                e0b0, e1b1 = d['o0b0'], d['o1b1']
+                pns_left = d['o_star_bar_star'] - 1
+            pns_right = pns_left
+            pn_left = ratio(e0b0 - d['py0'], d['o11'], 1)
+            pn_right = pn_left
+            ps_left = ratio(e1b1 - d['py1'], d['o00'], 1)
+            ps_right = ps_left
+        if strong_exo:
+            pos = d['o1b1'] > 0
+            pn_strong = ratio(pns_left, d['o1b1'], 0)
+            pn_left = np.where(pos, pn_strong, pn_left)
+            pn_right = np.where(pos, pn_strong, pn_right)
+            pos = d['o0b0'] > 0
+            ps_strong = ratio(pns_left, d['o0b0'], 0)
+            ps_left = np.where(pos, ps_strong, ps_left)
+            ps_right = np.where(pos, ps_strong, ps_right)
+        return np.stack([
+            np.stack([pns_left, pns_right], axis=-1),
+            np.stack([pn_left, pn_right], axis=-1),
+            np.stack([ps_left, ps_right], axis=-1)], axis=1)
+
+    @staticmethod
+    def calc_pns3_bds(o_y_bar_x, px, e_y_bar_x=None,
+                      exogeneity=False, monotonicity=False, strong_exo=False):
+        """
+        Returns the bounds for PNS3 = (PNS, PN, PS) of N strata. This
+        static method does all the work of set_pns3_bds(), and can be used
+        without building a BatchBounder object.
+
+        Strata are grouped by their constraint flags, so that each group is
+        evaluated with a single vectorized call to calc_scenario_pns3_bds().
+        Strata without Experimental data get the bounds [0, O_{*,*}],
+        [0, 1], [0, 1], as in Bounder.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+            O_{y|x}
+        px : np.array[shape=(N, 2)]
+            P(x)
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+            E_{y|x}. Rows containing a NaN mean no Experimental data.
+        exogeneity : bool, np.array[shape=(N, )]
+        monotonicity : bool, np.array[shape=(N, )]
+        strong_exo : bool, np.array[shape=(N, )]
+            strong exogeneity. It implies exogeneity, as in Bounder.
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        dofs, has_exp, dtype = BatchBounder.get_dofs_and_has_exp(
+            o_y_bar_x, px, e_y_bar_x)
+        return BatchBounder.calc_pns3_bds_from_dofs(
+            dofs, has_exp, dtype, exogeneity, monotonicity, strong_exo)
+
+    @staticmethod
+    def get_dofs_and_has_exp(o_y_bar_x, px, e_y_bar_x=None):
+        """
+        Returns the output of get_dofs(), plus a mask of the strata that
+        have Experimental data, plus the dtype of the bounds.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+        px : np.array[shape=(N, 2)]
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+
+        Returns
+        -------
+        dict[str, np.array[shape=(N, )]], np.array[shape=(N, ), dtype=bool],
+        np.dtype
+            dofs, has_exp, dtype
+
+        """
+        o_y_bar_x = np.asarray(o_y_bar_x)
+        px = np.asarray(px)
+        num_strata = o_y_bar_x.shape[0]
+        if e_y_bar_x is None:
+            dtype = np.result_type(o_y_bar_x, px)
+            has_exp = np.zeros(num_strata, dtype=bool)
+        else:
+            e_y_bar_x = np.asarray(e_y_bar_x)
+            dtype = np.result_type(o_y_bar_x, px, e_y_bar_x)
+            has_exp = ~np.isnan(e_y_bar_x).any(axis=(1, 2))
+        dofs = BatchBounder.get_dofs(o_y_bar_x, px, e_y_bar_x)
+        return dofs, has_exp, dtype
+
+    @staticmethod
+    def calc_pns3_bds_from_dofs(dofs, has_exp, dtype,
+                                exogeneity, monotonicity, strong_exo):
+        """
+        Does the work of calc_pns3_bds(), starting from the output of
+        get_dofs_and_has_exp().
+
+        Parameters
+        ----------
+        dofs : dict[str, np.array[shape=(N, )]]
+        has_exp : np.array[shape=(N, ), dtype=bool]
+        dtype : np.dtype
+        exogeneity : bool, np.array[shape=(N, )]
+        monotonicity : bool, np.array[shape=(N, )]
+        strong_exo : bool, np.array[shape=(N, )]
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        num_strata = len(has_exp)
+        pns3_bds = np.empty(shape=(num_strata, 3, 2), dtype=dtype)
+        # no experimental data
+        pns3_bds[:, 0, 0] = 0
+        pns3_bds[:, 0, 1] = dofs['o_star_star']
+        pns3_bds[:, 1:, 0] = 0
+        pns3_bds[:, 1:, 1] = 1
+        if not has_exp.any():
+            return pns3_bds
+
+        strong = np.broadcast_to(strong_exo, (num_strata, ))
+        exo = np.broadcast_to(exogeneity, (num_strata, )) | strong
+        mono = np.broadcast_to(monotonicity, (num_strata, ))
+        for exo_val, mono_val, strong_val in BatchBounder.FLAG_COMBOS:
+            rows = has_exp & (exo == exo_val) & (mono == mono_val) & \
+                (strong == strong_val)
+            if rows.all():
+                pns3_bds[:] = BatchBounder.calc_scenario_pns3_bds(
+                    dofs, exo_val, mono_val, strong_val)
+            elif rows.any():
+                sub_dofs = {key: val[rows] for key, val in dofs.items()}
+                pns3_bds[rows] = BatchBounder.calc_scenario_pns3_bds(
+                    sub_dofs, exo_val, mono_val, strong_val)
+        return pns3_bds
+
+    @staticmethod
+    def calc_all_scenarios_pns3_bds(o_y_bar_x, px, e_y_bar_x=None,
+                                    strong_exo=False):
+        """
+        Returns the bounds for PNS3 = (PNS, PN, PS) of N strata, for each of
+        the 4 scenarios (exogeneity, monotonicity) in SCENARIOS. The
+        intermediate quantities of get_dofs() are calculated only once and
+        shared by the 4 scenarios.
+
+        Use get_scenario_index() to find which of the 4 slices corresponds
+        to a given pair of flags. Flipping a flag then becomes a lookup
+        instead of a recomputation.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+            O_{y|x}
+        px : np.array[shape=(N, 2)]
+            P(x)
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+            E_{y|x}. Rows containing a NaN mean no Experimental data.
+        strong_exo : bool, np.array[shape=(N, )]
+            strong exogeneity, applied in all 4 scenarios. Since it
+            implies exogeneity, the two scenarios without exogeneity
+            coincide with their exogeneity counterparts for strata where
+            it is True.
+
+        Returns
+        -------
+        np.array[shape=(4, N, 3, 2)]
+
+        """
+        dofs, has_exp, dtype = BatchBounder.get_dofs_and_has_exp(
+            o_y_bar_x, px, e_y_bar_x)
+        all_bds = np.empty(shape=(4, len(has_exp), 3, 2), dtype=dtype)
+        for k, (exo, mono) in enumerate(BatchBounder.SCENARIOS):
+            all_bds[k] = BatchBounder.calc_pns3_bds_from_dofs(
+                dofs, has_exp, dtype, exo, mono, strong_exo)
+        return all_bds
+
+    @staticmethod
+    def get_scenario_index(exogeneity, monotonicity):
+        """
+        Returns the index k such that the output of
+        calc_all_scenarios_pns3_bds()[k] corresponds to the flags
+        exogeneity and monotonicity.
+
+        Parameters
+        ----------
+        exogeneity : bool
+        monotonicity : bool
+
+        Returns
+        -------
+        int
+
+        """
+        return BatchBounder.SCENARIOS.index(
+            (bool(exogeneity), bool(monotonicity)))
+
+    def get_stratum_label(self, n):
+        """
+        Returns the label of stratum n used by the print methods.
+
+        Parameters
+        ----------
+        n : int
+
+        Returns
+        -------
+        str
+
+        """
+        return str(n)
+
+    def print_exp_probs(self, st="", strata=None):
+        """
+        Prints the Experimental probabilities E_{y|x} of each stratum.
+
+        Parameters
+        ----------
+        st : str
+            st is used for more explicit labeling of the strata. The
+            stratum label is appended to it.
+        strata : list[int], None
+            indices of the strata to print. None means all of them.
+
+        Returns
+        -------
+        None
+
+        """
+        if strata is None:
+            strata = range(self.num_strata)
+        for n in strata:
+            label = st + self.get_stratum_label(n)
+            if self.e_y_bar_x is None:
+                print("E_{y|x" + label + "}=\n", None)
+            else:
+                print("E_{y|x" + label + "}=\n", self.e_y_bar_x[n])
+
+    def print_obs_probs(self, st="", strata=None):
+        """
+        Prints the Observational Probabilities O_{y|x} and P(x) of each
+        stratum.
+
+        Parameters
+        ----------
+        st : str
+            st is used for more explicit labeling of the strata. The
+            stratum label is appended to it.
+        strata : list[int], None
+            indices of the strata to print. None means all of them.
+
+        Returns
+        -------
+        None
+
+        """
+        if strata is None:
+            strata = range(self.num_strata)
+        for n in strata:
+            label = st + self.get_stratum_label(n)
+            print("O_{y|x" + label + "}=\n", self.o_y_bar_x[n])
+            print("P_{x" + label + "}=\n", self.px[n])
+
+    def print_all_probs(self, st="", strata=None):
+        """
+        Calls print_obs_probs() and print_exp_probs()
+
+        Parameters
+        ----------
+        st : str
+            st is used for more explicit labeling of the strata. The
+            stratum label is appended to it.
+        strata : list[int], None
+            indices of the strata to print. None means all of them.
+
+        Returns
+        -------
+        None
+
+        """
+        self.print_obs_probs(st, strata)
+        self.print_exp_probs(st, strata)
+
+    def print_exp_probs_bds(self, st="", strata=None):
+        """
+        Prints left (low) and right (high) bounds for each element of
+        E_{y|x}, for each stratum.
+
+        Parameters
+        ----------
+        st : str
+            st is used for more explicit labeling of the strata. The
+            stratum label is appended to it.
+        strata : list[int], None
+            indices of the strata to print. None means all of them.
+
+        Returns
+        -------
+        None
+
+        """
+        if strata is None:
+            strata = range(self.num_strata)
+        left = self.left_bds_e_y_bar_x
+        right = self.right_bds_e_y_bar_x
+        mid = self.e_y_bar_x
+        if mid is None:
+            mid = np.full_like(left, np.nan)
+        for n in strata:
+            label = st + self.get_stratum_label(n)
+            for x in range(2):
+                for y in range(2):
+                    print("E_{" + str(y) + "|" + str(x) + label + "}: "
+                          + "%.3f <= %.3f <= %.3f"
+                          % (left[n, y, x],
+                             mid[n, y, x],
+                             right[n, y, x]))
+
+    def print_pns3_bds(self, st="", strata=None):
+        """
+        Prints bounds on PNS3 = (PNS, PN, PS) for each stratum.
+
+        Parameters
+        ----------
+        st : str
+            st is used for more explicit labeling of the strata. The
+            stratum label is appended to it.
+        strata : list[int], None
+            indices of the strata to print. None means all of them.
+
+        Returns
+        -------
+        None
+
+        """
+        if strata is None:
+            strata = range(self.num_strata)
+        for n in strata:
+            label = st + self.get_stratum_label(n)
+            for i, st1 in zip([0, 1, 2], ['PNS', ' PN', ' PS']):
+                print("%.3f" % self.pns3_bds[n, i, 0]
+                      + " <= " + st1 + label + " <= "
+                      + "%.3f" % self.pns3_bds[n, i, 1])
+
+
+if __name__ == "__main__":
+    from Bounder import Bounder
+
+    def main():
+        # same female and male strata as in Bounder.main()
+        e_y_bar_x = np.array([[[.79, .52],
+                               [.21, .48]],
+                              [[.79, .51],
+                               [.21, .49]]])
+        o_y_bar_x = np.array([[[.3, .73],
+                               [.7, .27]],
+                              [[.3, .3],
+                               [.7, .7]]])
+        px = np.array([[.3, .7],
+                       [.3, .7]])
+        bb = BatchBounder(o_y_bar_x, px, e_y_bar_x=e_y_bar_x)
+        print("Check exp. data is within bds imposed by obs. data:")
+        bb.set_exp_probs_bds()
+        bb.print_exp_probs_bds(",")
+        compatible, margin = bb.get_exp_compatibility()
+        print("compatible=", compatible, ", margin=", margin)
+        print("---------------------------")
+        for exo, mono, strong in BatchBounder.FLAG_COMBOS:
+            print("exogeneity=%s, monotonicity=%s, strong_exo=%s"
+                  % (exo, mono, strong))
+            bb.exogeneity = exo
+            bb.monotonicity = mono
+            bb.strong_exo = strong
+            bb.set_pns3_bds()
+            bb.print_pns3_bds("_")
+            for n in range(bb.num_strata):
+                b = Bounder(o_y_bar_x[n], px[n], e_y_bar_x=e_y_bar_x[n])
+                b.exogeneity = exo
+                b.monotonicity = mono
+                b.strong_exo = strong
+                b.set_pns3_bds()
+                assert np.array_equal(b.get_pns3_bds(), bb.pns3_bds[n])
+
+    main()
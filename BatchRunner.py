@@ -0,0 +1,440 @@
+import csv
+import itertools
+import json
+import os
+from collections import deque
+import numpy as np
+from BatchBounder import BatchBounder
+from Ingester import Ingester
+from Validator import Validator
+
+
+class BatchRunner:
+    # input columns. Only o1b0, o1b1 and px1 are required.
+    IN_COLUMNS = ('o1b0', 'o1b1', 'px1', 'e1b0', 'e1b1',
+                  'exogeneity', 'monotonicity', 'strong_exo')
+    # output columns, after the row index and the optional id column
+    OUT_COLUMNS = ('pns_low', 'pns_high', 'pn_low', 'pn_high',
+                   'ps_low', 'ps_high', 'ate', 'compatible', 'margin')
+
+    def __init__(self, exogeneity=False, monotonicity=False,
+                 strong_exo=False, on_error='raise',
+                 tol=BatchBounder.COMPAT_TOL,
+                 id_col=None, chunk_size=100000, num_workers=None):
+        """
+        This class is the headless batch mode of this app. It reads a
+        file of stratum rows, calculates their bounds with the vectorized
+        BatchBounder, and writes one output row per input row. It imports
+        only NumPy and the core modules, never matplotlib or ipywidgets,
+        so it runs on servers without a display.
+
+        Each input row has the independent dofs O_{1|0}, O_{1|1} and
+        P(x=1) (columns o1b0, o1b1, px1), optionally E_{1|0} and E_{1|1}
+        (columns e1b0, e1b1; empty means no Experimental data), and
+        optionally the constraint flags (columns exogeneity, monotonicity,
+        strong_exo). Missing or empty flags take the default values given
+        to the constructor. CSV, JSONL (both optionally gzipped) and
+        Parquet (requires pyarrow) files are supported.
+
+        Each output row has the input row index, the id column if any,
+        the PNS3 bounds, ATE = E_{1|1} - E_{1|0} (NaN without Experimental
+        data), and the compatibility flag and violation margin of E_{y|x}
+        (see BatchBounder.calc_exp_compatibility()). The output format
+        (CSV, JSONL, Parquet or NPZ) is given by the extension of the
+        output file.
+
+        The input is read in chunks of chunk_size rows. The chunks are
+        calculated by a process pool (when there is more than one chunk
+        and num_workers > 1) and written in order, with a bounded number
+        of chunks in flight.
+
+        Attributes
+        ----------
+        chunk_size : int
+        exogeneity : bool
+            default for rows without an exogeneity value
+        id_col : str, None
+            name of an input column copied to the output, e.g., a stratum
+            name
+        monotonicity : bool
+            default for rows without a monotonicity value
+        num_workers : int
+        on_error : str
+            one of Validator.ON_ERROR_OPTIONS. Bad rows dropped by 'drop'
+            or 'clip' are missing from the output.
+        strong_exo : bool
+            default for rows without a strong_exo value
+        tol : float
+            tolerance of the compatibility flag
+
+        Parameters
+        ----------
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+        on_error : str
+        tol : float
+        id_col : str, None
+        chunk_size : int
+        num_workers : int, None
+            None means os.cpu_count()
+        """
+        self.exogeneity = exogeneity
+        self.monotonicity = monotonicity
+        self.strong_exo = strong_exo
+        self.on_error = on_error
+        self.tol = tol
+        self.id_col = id_col
+        self.chunk_size = chunk_size
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = num_workers
+
+    def get_in_columns(self):
+        """
+        Returns the names of the input columns that are read.
+
+        Returns
+        -------
+        list[str]
+
+        """
+        columns = list(BatchRunner.IN_COLUMNS)
+        if self.id_col is not None:
+            columns.append(self.id_col)
+        return columns
+
+    def iter_chunks(self, path):
+        """
+        Generator that yields the requested columns of the input file, in
+        chunks of rows.
+
+        Parameters
+        ----------
+        path : str
+
+        Yields
+        -------
+        list[list]
+            one list of values per column of get_in_columns()
+
+        """
+        columns = self.get_in_columns()
+        name = str(path)
+        if name.endswith('.gz'):
+            name = name[:-len('.gz')]
+        if name.endswith('.csv'):
+            yield from Ingester.iter_csv_chunks(path, columns,
+                                                self.chunk_size)
+        elif name.endswith('.jsonl') or name.endswith('.json'):
+            yield from Ingester.iter_jsonl_chunks(path, columns,
+                                                  self.chunk_size)
+        elif name.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(path)
+            present = [col for col in columns
+                       if col in parquet_file.schema_arrow.names]
+            for batch in parquet_file.iter_batches(
+                    batch_size=self.chunk_size, columns=present):
+                num_rows = batch.num_rows
+                yield [batch.column(col).to_pylist() if col in present
+                       else [None]*num_rows for col in columns]
+        else:
+            raise ValueError("unsupported input file type: %s" % path)
+
+    @staticmethod
+    def get_float_values(values):
+        """
+        Converts raw values to floats. None, empty strings and nulls
+        become NaN.
+
+        Parameters
+        ----------
+        values : list
+
+        Returns
+        -------
+        np.array[shape=(C, )]
+
+        """
+        return np.array([np.nan if v is None or v == '' else float(v)
+                         for v in values], dtype=float)
+
+    @staticmethod
+    def get_flag_values(values, default):
+        """
+        Converts raw values to bools. Missing and empty values become
+        default.
+
+        Parameters
+        ----------
+        values : list
+        default : bool
+
+        Returns
+        -------
+        np.array[shape=(C, ), dtype=bool]
+
+        """
+        missing = np.array([v is None or str(v).strip() == ''
+                            for v in values], dtype=bool)
+        binary = Ingester.get_binary_values(values)
+        bad = (binary < 0) & ~missing
+        if bad.any():
+            raise ValueError("bad constraint flag value: %r"
+                             % values[np.flatnonzero(bad)[0]])
+        return np.where(missing, default, binary == 1)
+
+    def get_inputs(self, columns):
+        """
+        Converts the raw columns of a chunk into the input arrays of
+        BatchBounder.
+
+        Parameters
+        ----------
+        columns : list[list]
+            as yielded by iter_chunks()
+
+        Returns
+        -------
+        np.array[shape=(C, 2, 2)], np.array[shape=(C, 2)],
+        np.array[shape=(C, 2, 2)], np.array[shape=(3, C), dtype=bool]
+            o_y_bar_x, px, e_y_bar_x, flags
+
+        """
+        o1b0, o1b1, px1, e1b0, e1b1 = [
+            BatchRunner.get_float_values(values) for values in columns[:5]]
+        o_y_bar_x, px, e_y_bar_x = BatchBounder.get_probs_from_dofs(
+            o1b0, o1b1, px1, e1b0, e1b1)
+        defaults = (self.exogeneity, self.monotonicity, self.strong_exo)
+        flags = np.array([BatchRunner.get_flag_values(values, default)
+                          for values, default in zip(columns[5:8],
+                                                     defaults)])
+        return o_y_bar_x, px, e_y_bar_x, flags
+
+    @staticmethod
+    def calc_chunk(o_y_bar_x, px, e_y_bar_x, flags, on_error, tol):
+        """
+        Calculates the outputs of a chunk of rows. This is the work done
+        by a single worker of the process pool.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(C, 2, 2)]
+        px : np.array[shape=(C, 2)]
+        e_y_bar_x : np.array[shape=(C, 2, 2)]
+            rows with a NaN mean no Experimental data
+        flags : np.array[shape=(3, C), dtype=bool]
+            exogeneity, monotonicity, strong_exo of each row
+        on_error : str
+        tol : float
+
+        Returns
+        -------
+        np.array[shape=(M, ), dtype=int], dict[str, np.array]
+            indices in the chunk of the M rows kept, and the output columns
+
+        """
+        # a row with a NaN in E has no Experimental data; a NaN only in
+        # one of its two columns is made a full NaN row, which Validator
+        # accepts
+        e_y_bar_x = e_y_bar_x.copy()
+        e_y_bar_x[np.isnan(e_y_bar_x).any(axis=(1, 2))] = np.nan
+        o_y_bar_x, px, e_y_bar_x, kept_rows, _ = Validator.validate(
+            o_y_bar_x, px, e_y_bar_x, on_error=on_error)
+        exo, mono, strong = flags[:, kept_rows]
+        pns3_bds = BatchBounder.calc_pns3_bds(
+            o_y_bar_x, px, e_y_bar_x,
+            exogeneity=exo, monotonicity=mono, strong_exo=strong)
+        left_bds, right_bds = BatchBounder.calc_exp_probs_bds(
+            o_y_bar_x, px, mono)
+        compatible, margin = BatchBounder.calc_exp_compatibility(
+            e_y_bar_x, left_bds, right_bds, tol)
+        out = dict(zip(BatchRunner.OUT_COLUMNS[:6],
+                       pns3_bds.reshape(-1, 6).T))
+        out['ate'] = e_y_bar_x[:, 1, 1] - e_y_bar_x[:, 1, 0]
+        out['compatible'] = compatible
+        out['margin'] = margin
+        return kept_rows, out
+
+    def iter_results(self, in_path):
+        """
+        Generator that yields the output columns of the input file, chunk
+        by chunk, in order.
+
+        Parameters
+        ----------
+        in_path : str
+
+        Yields
+        -------
+        dict[str, np.array | list]
+            output columns of a chunk, starting with the input row index
+            and the id column if any
+
+        """
+        def get_result(start, columns, kept_rows, out):
+            result = {'row': start + kept_rows}
+            if self.id_col is not None:
+                ids = columns[-1]
+                result[self.id_col] = [ids[k] for k in kept_rows]
+            result.update(out)
+            return result
+
+        chunks = self.iter_chunks(in_path)
+        # a pool is only worth starting for files with several chunks
+        head = [columns for columns in [next(chunks, None),
+                                        next(chunks, None)]
+                if columns is not None]
+        chunks = itertools.chain(head, chunks)
+        start = 0
+        if len(head) < 2 or self.num_workers <= 1:
+            for columns in chunks:
+                out = BatchRunner.calc_chunk(*self.get_inputs(columns),
+                                             self.on_error, self.tol)
+                yield get_result(start, columns, *out)
+                start += len(columns[0])
+            return
+
+        # imported here since it loads multiprocessing, which costs more
+        # than the rest of this module
+        from concurrent.futures import ProcessPoolExecutor
+        # at most 2 chunks per worker are in flight, so memory stays
+        # bounded however big the file is
+        max_pending = 2*self.num_workers
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            for columns in chunks:
+                future = executor.submit(BatchRunner.calc_chunk,
+                                         *self.get_inputs(columns),
+                                         self.on_error, self.tol)
+                pending.append((start, columns, future))
+                start += len(columns[0])
+                if len(pending) >= max_pending:
+                    start0, columns0, future0 = pending.popleft()
+                    yield get_result(start0, columns0, *future0.result())
+            while pending:
+                start0, columns0, future0 = pending.popleft()
+                yield get_result(start0, columns0, *future0.result())
+
+    @staticmethod
+    def get_records(result):
+        """
+        Converts the output columns of a chunk into one dict per row, with
+        plain Python values, for the CSV and JSONL writers. NaN becomes
+        None.
+
+        Parameters
+        ----------
+        result : dict[str, np.array | list]
+
+        Returns
+        -------
+        list[dict]
+
+        """
+        names = list(result)
+        columns = []
+        for name in names:
+            col = result[name]
+            if isinstance(col, np.ndarray):
+                if col.dtype.kind == 'f':
+                    col = np.where(np.isnan(col), None, col)
+                col = col.tolist()
+            columns.append(col)
+        return [dict(zip(names, vals)) for vals in zip(*columns)]
+
+    def run(self, in_path, out_path):
+        """
+        Calculates the outputs of all the rows of the input file in_path
+        and writes them to the output file out_path. CSV and JSONL outputs
+        are written chunk by chunk. Parquet (requires pyarrow) and NPZ
+        outputs are written at the end.
+
+        Parameters
+        ----------
+        in_path : str
+        out_path : str
+            its extension (.csv, .jsonl, .parquet or .npz) gives the output
+            format
+
+        Returns
+        -------
+        int
+            number of rows written
+
+        """
+        num_rows = 0
+        if out_path.endswith('.csv') or out_path.endswith('.jsonl'):
+            with open(out_path, 'w', newline='') as f:
+                writer = None
+                for result in self.iter_results(in_path):
+                    records = BatchRunner.get_records(result)
+                    num_rows += len(records)
+                    if out_path.endswith('.jsonl'):
+                        for record in records:
+                            f.write(json.dumps(record) + '\n')
+                        continue
+                    if writer is None:
+                        writer = csv.DictWriter(f, fieldnames=list(result))
+                        writer.writeheader()
+                    writer.writerows(records)
+            return num_rows
+
+        if not (out_path.endswith('.parquet') or out_path.endswith('.npz')):
+            raise ValueError("unsupported output file type: %s" % out_path)
+        results = list(self.iter_results(in_path))
+        if not results:
+            raise ValueError("no rows in %s" % in_path)
+        table = {name: np.concatenate([result[name] for result in results])
+                 for name in results[0]}
+        num_rows = len(table['row'])
+        if out_path.endswith('.npz'):
+            np.savez(out_path, **table)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table(table), out_path)
+        return num_rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    def main():
+        parser = argparse.ArgumentParser(
+            description="Calculates the PNS3 bounds, ATE and compatibility"
+                        " flags of a file of stratum rows.")
+        parser.add_argument('in_path',
+                            help="input .csv, .jsonl (optionally .gz) or"
+                                 " .parquet file")
+        parser.add_argument('out_path',
+                            help="output .csv, .jsonl, .parquet or .npz"
+                                 " file")
+        parser.add_argument('--exogeneity', action='store_true',
+                            help="default for rows without this flag")
+        parser.add_argument('--monotonicity', action='store_true',
+                            help="default for rows without this flag")
+        parser.add_argument('--strong_exo', action='store_true',
+                            help="default for rows without this flag")
+        parser.add_argument('--on_error', default='raise',
+                            choices=Validator.ON_ERROR_OPTIONS)
+        parser.add_argument('--tol', type=float,
+                            default=BatchBounder.COMPAT_TOL)
+        parser.add_argument('--id_col', default=None,
+                            help="input column copied to the output")
+        parser.add_argument('--chunk_size', type=int, default=100000)
+        parser.add_argument('--num_workers', type=int, default=None)
+        args = parser.parse_args()
+        runner = BatchRunner(
+            exogeneity=args.exogeneity, monotonicity=args.monotonicity,
+            strong_exo=args.strong_exo, on_error=args.on_error,
+            tol=args.tol, id_col=args.id_col, chunk_size=args.chunk_size,
+            num_workers=args.num_workers)
+        start = time.time()
+        num_rows = runner.run(args.in_path, args.out_path)
+        print("wrote %d rows to %s in %.1f s"
+              % (num_rows, args.out_path, time.time() - start))
+
+    main()
@@ -0,0 +1,305 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from BatchBounder import BatchBounder
+from Ingester import Ingester
+
+
+class Bootstrapper:
+    def __init__(self, obs_counts, exp_counts=None,
+                 exogeneity=False, monotonicity=False, strong_exo=False):
+        """
+        This class calculates bootstrap confidence bands for each end of
+        the PNS3 bounds of N strata. Class Bounder treats O_{y|x}, P(x) and
+        E_{y|x} as exact, but in practice they are estimated from finite
+        samples, so the bounds themselves have sampling error.
+
+        The replicates are drawn as vectorized count arrays. For each
+        stratum, the Observational counts (one survey of fixed size) are
+        resampled from a multinomial over the 4 (x, y) cells, and the
+        Experimental counts (an RCT with a fixed number of patients per
+        arm x) from a binomial per arm. Each replicate is then pushed
+        through BatchBounder in one call.
+
+        The strata are split into blocks that are spread over a process
+        pool. Each block gets its own random seed, spawned from a single
+        seed with np.random.SeedSequence, so the results depend on the seed
+        and the block size but not on the number of workers. Each worker
+        draws all the replicates of its block and returns only their
+        percentiles, so memory and inter-process traffic stay small.
+
+        Attributes
+        ----------
+        band_hi : np.array[shape=(N, 3, 2)]
+            upper percentile of each end of each bound
+        band_lo : np.array[shape=(N, 3, 2)]
+            lower percentile of each end of each bound
+        exogeneity : bool
+        exp_counts : np.array[shape=(N, 2, 2)], None
+            exp_counts[n, y, x]
+        monotonicity : bool
+        obs_counts : np.array[shape=(N, 2, 2)]
+            obs_counts[n, y, x]
+        pns3_bds : np.array[shape=(N, 3, 2)]
+            PNS3 bounds calculated from the counts themselves
+        strong_exo : bool
+
+        Parameters
+        ----------
+        obs_counts : np.array[shape=(N, 2, 2)]
+            Observational counts, e.g., Ingester.get_obs_counts()
+        exp_counts : np.array[shape=(N, 2, 2)], None
+            Experimental counts, e.g., Ingester.get_exp_counts()
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+        """
+        self.obs_counts = np.asarray(obs_counts, dtype=np.int64)
+        self.exp_counts = None
+        if exp_counts is not None:
+            self.exp_counts = np.asarray(exp_counts, dtype=np.int64)
+        self.exogeneity = exogeneity
+        self.monotonicity = monotonicity
+        self.strong_exo = strong_exo
+
+        num_strata = len(self.obs_counts)
+        self.pns3_bds = Bootstrapper.calc_pns3_bds_from_counts(
+            self.obs_counts, self.exp_counts, self.get_flags())
+        self.band_lo = np.full(shape=(num_strata, 3, 2), fill_value=np.nan)
+        self.band_hi = np.full(shape=(num_strata, 3, 2), fill_value=np.nan)
+
+    def get_flags(self):
+        """
+        Returns the constraint flags.
+
+        Returns
+        -------
+        tuple[bool, bool, bool]
+            exogeneity, monotonicity, strong_exo
+
+        """
+        return self.exogeneity, self.monotonicity, self.strong_exo
+
+    @staticmethod
+    def calc_pns3_bds_from_counts(obs_counts, exp_counts, flags):
+        """
+        Returns the PNS3 bounds implied by counts of any batch shape.
+
+        Parameters
+        ----------
+        obs_counts : np.array[shape=(..., 2, 2)]
+        exp_counts : np.array[shape=(..., 2, 2)], None
+        flags : tuple[bool, bool, bool]
+            exogeneity, monotonicity, strong_exo
+
+        Returns
+        -------
+        np.array[shape=(..., 3, 2)]
+
+        """
+        batch_shape = obs_counts.shape[:-2]
+        obs_counts = obs_counts.reshape(-1, 2, 2)
+        if exp_counts is not None:
+            exp_counts = exp_counts.reshape(-1, 2, 2)
+        o_y_bar_x, px, e_y_bar_x = Ingester.counts_to_probs(
+            obs_counts, exp_counts)
+        pns3_bds = BatchBounder.calc_pns3_bds(o_y_bar_x, px, e_y_bar_x,
+                                              *flags)
+        return pns3_bds.reshape(*batch_shape, 3, 2)
+
+    @staticmethod
+    def draw_replicates(rng, obs_counts, exp_counts, num_reps):
+        """
+        Draws num_reps bootstrap replicates of the counts of all the strata
+        of a block, as vectorized multinomial/binomial count arrays.
+
+        Parameters
+        ----------
+        rng : np.random.Generator
+        obs_counts : np.array[shape=(B, 2, 2)]
+        exp_counts : np.array[shape=(B, 2, 2)], None
+        num_reps : int
+
+        Returns
+        -------
+        np.array[shape=(R, B, 2, 2)], np.array[shape=(R, B, 2, 2)] | None
+            replicates of obs_counts and exp_counts
+
+        """
+        num_strata = len(obs_counts)
+        num_obs = obs_counts.sum(axis=(1, 2))
+        pvals = obs_counts.reshape(num_strata, 4) / \
+            np.maximum(num_obs, 1)[:, np.newaxis]
+        pvals[num_obs == 0] = .25
+        obs_reps = rng.multinomial(num_obs, pvals,
+                                   size=(num_reps, num_strata))
+        obs_reps = obs_reps.reshape(num_reps, num_strata, 2, 2)
+        if exp_counts is None:
+            return obs_reps, None
+        # an RCT has a fixed number of patients per arm x
+        num_x = exp_counts.sum(axis=1)
+        p1 = exp_counts[:, 1, :] / np.maximum(num_x, 1)
+        y1_reps = rng.binomial(num_x, p1, size=(num_reps, num_strata, 2))
+        exp_reps = np.stack([num_x - y1_reps, y1_reps], axis=2)
+        return obs_reps, exp_reps
+
+    @staticmethod
+    def run_block(obs_counts, exp_counts, flags, num_reps, rep_chunk_size,
+                  percentiles, seed_seq):
+        """
+        Runs all the replicates of one block of strata and returns the
+        percentiles of each end of each bound. This is the work done by a
+        single worker of the process pool.
+
+        Parameters
+        ----------
+        obs_counts : np.array[shape=(B, 2, 2)]
+        exp_counts : np.array[shape=(B, 2, 2)], None
+        flags : tuple[bool, bool, bool]
+        num_reps : int
+        rep_chunk_size : int
+            number of replicates drawn at a time
+        percentiles : tuple[float, float]
+        seed_seq : np.random.SeedSequence
+
+        Returns
+        -------
+        np.array[shape=(2, B, 3, 2)]
+            lower and upper percentiles
+
+        """
+        rng = np.random.default_rng(seed_seq)
+        rep_bds = np.empty(shape=(num_reps, len(obs_counts), 3, 2))
+        for start in range(0, num_reps, rep_chunk_size):
+            size = min(rep_chunk_size, num_reps - start)
+            obs_reps, exp_reps = Bootstrapper.draw_replicates(
+                rng, obs_counts, exp_counts, size)
+            rep_bds[start:start + size] = \
+                Bootstrapper.calc_pns3_bds_from_counts(
+                    obs_reps, exp_reps, flags)
+        with warnings.catch_warnings():
+            # np.errstate() doesn't silence the "All-NaN slice"
+            # warning. Ends that are NaN in all replicates get NaN bands.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanpercentile(rep_bds, percentiles, axis=0)
+
+    def run(self, num_reps=1000, percentiles=(2.5, 97.5), seed=0,
+            block_size=256, rep_chunk_size=100, num_workers=None):
+        """
+        Runs the bootstrap and sets self.band_lo and self.band_hi.
+
+        Parameters
+        ----------
+        num_reps : int
+            number of bootstrap replicates per stratum
+        percentiles : tuple[float, float]
+            lower and upper percentiles of the bands
+        seed : int
+            root seed. Block b uses the b-th child of
+            np.random.SeedSequence(seed).
+        block_size : int
+            number of strata per task of the process pool
+        rep_chunk_size : int
+            number of replicates drawn at a time by a worker
+        num_workers : int, None
+            number of worker processes. None means os.cpu_count(). 1 means
+            no process pool.
+
+        Returns
+        -------
+        None
+
+        """
+        num_strata = len(self.obs_counts)
+        starts = list(range(0, num_strata, block_size))
+        seed_seqs = np.random.SeedSequence(seed).spawn(len(starts))
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(starts))
+
+        def get_args(start, seed_seq):
+            block = slice(start, start + block_size)
+            exp_counts = None
+            if self.exp_counts is not None:
+                exp_counts = self.exp_counts[block]
+            return (self.obs_counts[block], exp_counts, self.get_flags(),
+                    num_reps, rep_chunk_size, percentiles, seed_seq)
+        all_args = [get_args(start, seed_seq)
+                    for start, seed_seq in zip(starts, seed_seqs)]
+        if num_workers <= 1:
+            results = [Bootstrapper.run_block(*args) for args in all_args]
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                results = list(executor.map(Bootstrapper.run_block,
+                                            *zip(*all_args)))
+        for start, result in zip(starts, results):
+            block = slice(start, start + block_size)
+            self.band_lo[block] = result[0]
+            self.band_hi[block] = result[1]
+
+    def get_pns3_bds(self):
+        """
+        Returns the PNS3 bounds calculated from the counts themselves.
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        return self.pns3_bds
+
+    def get_pns3_bands(self):
+        """
+        Returns the bootstrap percentile bands of each end of each bound.
+        Must be called after run().
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)], np.array[shape=(N, 3, 2)]
+            band_lo, band_hi
+
+        """
+        return self.band_lo, self.band_hi
+
+    def print_pns3_bands(self, st=""):
+        """
+        Prints, for each stratum, the bounds on PNS3 = (PNS, PN, PS) with
+        the bootstrap band of each end in brackets.
+
+        Parameters
+        ----------
+        st : str
+            st is used for more explicit labeling of the strata. The
+            stratum index is appended to it.
+
+        Returns
+        -------
+        None
+
+        """
+        bds, lo, hi = self.pns3_bds, self.band_lo, self.band_hi
+        for n in range(len(bds)):
+            for i, st1 in zip([0, 1, 2], ['PNS', ' PN', ' PS']):
+                print("%.3f [%.3f, %.3f] <= %s%s%d <= %.3f [%.3f, %.3f]"
+                      % (bds[n, i, 0], lo[n, i, 0], hi[n, i, 0],
+                         st1, st, n,
+                         bds[n, i, 1], lo[n, i, 1], hi[n, i, 1]))
+
+
+if __name__ == "__main__":
+    def main():
+        # counts[n, y, x]
+        obs_counts = np.array([[[90, 511],
+                                [210, 189]],
+                               [[90, 210],
+                                [210, 490]]])
+        exp_counts = np.array([[[395, 260],
+                                [105, 240]],
+                               [[395, 255],
+                                [105, 245]]])
+        bootstrapper = Bootstrapper(obs_counts, exp_counts)
+        bootstrapper.run(num_reps=2000, num_workers=2, block_size=1)
+        bootstrapper.print_pns3_bands("_")
+
+    main()
@@ -1,4 +1,5 @@
 import numpy as np
+from Validator import Validator
 np.set_printoptions(precision=3, floatmode="fixed")
 
 
@@ -42,6 +43,9 @@ class Bounder:
 
         Attributes
         ----------
+        cache : BoundsCache, None
+            optional cache consulted by set_pns3_bds() before
+            calculating the bounds
         e0b0 : float
             E_{0|0}
         e0b1 : float
@@ -129,6 +133,8 @@ class Bounder:
         self.monotonicity = False
         self.strong_exo = False
 
+        self.cache = None
+
     def set_obs_probs(self, o_y_bar_x, px):
         """
         This method refreshes the class attributes with new observational
@@ -187,7 +193,8 @@ class Bounder:
     @staticmethod
     def check_2d_trans_matrix(mat):
         """
-        Checks that the 2x2 transition probability matrix mat is well defined.
+        Checks that the 2x2 transition probability matrix mat is well
+        defined. Raises a ValueError if it isn't.
 
         Parameters
         ----------
@@ -198,16 +205,17 @@ class Bounder:
         None
 
         """
-        assert mat.shape == (2, 2)
-        assert (0 <= mat).all()
-        assert (mat <= 1).all()  # can't check 0<=mat<=1 at once
-        assert np.abs(sum(mat[:, 0]) - 1) < 1e-5
-        assert np.abs(sum(mat[:, 1]) - 1) < 1e-5
+        if mat.shape != (2, 2):
+            raise ValueError("mat must have shape (2, 2), not %s"
+                             % (mat.shape, ))
+        report = Validator.check_trans_matrices(mat[np.newaxis], 'mat')
+        report.raise_if_invalid()
 
     @staticmethod
     def check_prob_vec(vec):
         """
-        Checks that the probability vector vec is well defined.
+        Checks that the probability vector vec is well defined. Raises a
+        ValueError if it isn't.
 
         Parameters
         ----------
@@ -218,10 +226,11 @@ class Bounder:
         None
 
         """
-        assert vec.shape == (2, )
-        assert (0 <= vec).all()
-        assert (vec <= 1).all()
-        assert np.abs(sum(vec) - 1) < 1e-5
+        if vec.shape != (2, ):
+            raise ValueError("vec must have shape (2, ), not %s"
+                             % (vec.shape, ))
+        report = Validator.check_prob_vecs(vec[np.newaxis], 'vec')
+        report.raise_if_invalid()
 
     def get_ate(self):
         """
@@ -340,7 +349,13 @@ class Bounder:
     def set_pns3_bds(self):
         """
         Tis method sets the class attribute for the bounds for PNS3 = (PNS,
-        PN, PS).
+        PN, PS). If self.cache is not None, the bounds are looked up in it
+        first. The cache keys are the dofs rounded to multiples of
+        self.cache.resolution, so a hit returns the bounds of the first
+        input seen in the same rounding cell, not those of the current
+        input. They can differ from the uncached bounds by about
+        resolution (more for PN and PS, whose formulas divide by O_{1|1}
+        or O_{11}, and O_{0|0} or O_{00}).
 
         Returns
         -------
@@ -349,6 +364,16 @@ class Bounder:
         """
         if self.strong_exo:
             self.exogeneity = True
+        key = None
+        if self.cache is not None:
+            key = (self.cache.get_obs_key(self.o1b0, self.o1b1, self.px1),
+                   self.cache.get_exp_key(self.e1b0, self.e1b1),
+                   (bool(self.exogeneity), bool(self.monotonicity),
+                    bool(self.strong_exo)))
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.pns3_bds = np.array(cached)
+                return
         if self.e_y_bar_x is None:         # no experimental data
             pns_bds = [0, self.get_o_star_star()]
             pn_bds = [0, 1]
@@ -467,6 +492,8 @@ class Bounder:
             ps_bds = [ps_left, ps_right]
 
         self.pns3_bds = np.array([pns_bds, pn_bds, ps_bds])
+        if key is not None:
+            self.cache.put(key, self.pns3_bds)
 
     def get_pns3_bds(self):
         """
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+import math
+import numpy as np
+
+
+class BoundsCache:
+    def __init__(self, max_size=100000, resolution=1e-6):
+        """
+        This class is a memoizing LRU (Least Recently Used) cache for the
+        PNS3 bounds calculated by Bounder. It can be attached to a Bounder
+        (bounder.cache = BoundsCache()), in which case
+        Bounder.set_pns3_bds() looks up its result in it before
+        calculating it.
+
+        A lookup must cost less than the calculation it saves, so keys are
+        built with plain Python arithmetic on the scalar dofs. There is no
+        cached version of BatchBounder: its vectorized formulas cost a
+        fraction of a microsecond per stratum, less than building a key
+        and looking it up. Nor are the bounds of E_{y|x} cached: they are
+        a handful of additions, which also cost less than a lookup.
+
+        The keys are the independent dofs O_{1|0}, O_{1|1}, P(x=1), E_{1|0}
+        and E_{1|1}, quantized to multiples of resolution, plus the
+        constraint flags. Inputs that fall in the same quantization cell
+        share the result calculated for the first of them, so resolution
+        should be much smaller than the precision one cares about. The
+        default resolution, 1e-6, maps each position of a slider with step
+        .001 to its own key.
+
+        When the cache holds max_size entries, adding one evicts the least
+        recently used one.
+
+        Attributes
+        ----------
+        entries : OrderedDict[tuple, np.array]
+            cached results, ordered from least to most recently used
+        max_size : int
+            maximum number of entries
+        num_evictions : int
+        num_hits : int
+            number of lookups of a key that was already cached
+        num_misses : int
+        resolution : float
+
+        Parameters
+        ----------
+        max_size : int
+        resolution : float
+        """
+        self.max_size = max_size
+        self.resolution = resolution
+        self.entries = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def quantize(self, val):
+        """
+        Returns the integer quantization cell of the value val. The value
+        is converted to a Python float first: Python arithmetic on a
+        single value is an order of magnitude faster than NumPy's, which
+        keeps a lookup cheaper than the bounds it saves.
+
+        Parameters
+        ----------
+        val : float
+
+        Returns
+        -------
+        int
+
+        """
+        return round(float(val)/self.resolution)
+
+    def get(self, key):
+        """
+        Returns the result cached under key, or None if there is none. A
+        hit makes the entry the most recently used one.
+
+        Parameters
+        ----------
+        key : tuple
+
+        Returns
+        -------
+        np.array, None
+            a read-only array
+
+        """
+        val = self.entries.get(key)
+        if val is None:
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        self.entries.move_to_end(key)
+        return val
+
+    def put(self, key, val):
+        """
+        Caches the result val under key, evicting the least recently used
+        entry if the cache is full.
+
+        Parameters
+        ----------
+        key : tuple
+        val : np.array
+
+        Returns
+        -------
+        None
+
+        """
+        val = np.array(val)
+        val.flags.writeable = False
+        self.entries[key] = val
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.num_evictions += 1
+
+    def get_obs_key(self, o1b0, o1b1, px1):
+        """
+        Returns the quantized key part of the Observational dofs.
+
+        Parameters
+        ----------
+        o1b0 : float
+        o1b1 : float
+        px1 : float
+
+        Returns
+        -------
+        tuple[int, int, int]
+
+        """
+        return (self.quantize(o1b0), self.quantize(o1b1),
+                self.quantize(px1))
+
+    def get_exp_key(self, e1b0, e1b1):
+        """
+        Returns the quantized key part of the Experimental dofs, or None
+        if there is no Experimental data.
+
+        Parameters
+        ----------
+        e1b0 : float, None
+        e1b1 : float, None
+
+        Returns
+        -------
+        tuple[int, int], None
+
+        """
+        if e1b0 is None or math.isnan(e1b0) or math.isnan(e1b1):
+            return None
+        return self.quantize(e1b0), self.quantize(e1b1)
+
+    def get_stats(self):
+        """
+        Returns the size and counters of the cache, to help size it.
+
+        Returns
+        -------
+        dict[str, float]
+
+        """
+        num_lookups = self.num_hits + self.num_misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.num_hits,
+            'misses': self.num_misses,
+            'evictions': self.num_evictions,
+            'hit_rate': self.num_hits/num_lookups if num_lookups else 0.}
+
+    def clear(self):
+        """
+        Empties the cache and resets its counters.
+
+        Returns
+        -------
+        None
+
+        """
+        self.entries.clear()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+
+if __name__ == "__main__":
+    import time
+    from Bounder import Bounder
+
+    def main():
+        b = Bounder(np.array([[.3, .3], [.7, .7]]), np.array([.3, .7]),
+                    e_y_bar_x=np.array([[.79, .51], [.21, .49]]))
+        b.exogeneity = True
+        o1b0s = np.arange(.2, .4, .001)
+        for cache in [None, BoundsCache(max_size=1000)]:
+            b.cache = cache
+            secs = 0.
+            # revisiting slider positions
+            for _ in range(10):
+                for o1b0 in o1b0s:
+                    b.set_obs_probs(np.array([[1 - o1b0, .3], [o1b0, .7]]),
+                                    np.array([.3, .7]))
+                    start = time.perf_counter()
+                    b.set_pns3_bds()
+                    secs += time.perf_counter() - start
+            print("cache=%s: %.1f us per set_pns3_bds()"
+                  % (cache is not None, 1e6*secs/(10*len(o1b0s))))
+        print(cache.get_stats())
+
+    main()
@@ -0,0 +1,185 @@
+import numpy as np
+from BatchBounder import BatchBounder
+from Bounder import Bounder
+
+
+class BoundsResult:
+    __slots__ = ('pns3_bds', 'left_bds_e_y_bar_x', 'right_bds_e_y_bar_x',
+                 'ate', 'compatible', 'margin',
+                 'exogeneity', 'monotonicity', 'strong_exo')
+
+    def __init__(self, pns3_bds, left_bds_e_y_bar_x, right_bds_e_y_bar_x,
+                 ate, compatible, margin,
+                 exogeneity, monotonicity, strong_exo):
+        """
+        This class is an immutable record of the bounds of one stratum, as
+        returned by the pure function calc_bounds(). Unlike a Bounder,
+        whose results live in arrays that the next set_*() call
+        overwrites, a BoundsResult never changes after it is built: its
+        attributes can't be reassigned and its arrays are read-only
+        copies. So one result can be shared by several threads, or kept
+        in a cache, without defensive copies.
+
+        It has __slots__ and no instance dict, so it is small.
+
+        Attributes
+        ----------
+        ate : float, None
+            ATE = E_{1|1} - E_{1|0}, None without Experimental data
+        compatible : bool
+            True iff E_{y|x} lies within its bounds (always True without
+            Experimental data)
+        exogeneity : bool
+        left_bds_e_y_bar_x : np.array[shape=(2, 2)]
+            left (low) bounds for each element of E_{y|x}, read-only
+        margin : float
+            the largest violation of the bounds of E_{y|x}, 0 if
+            compatible
+        monotonicity : bool
+        pns3_bds : np.array[shape=(3, 2)]
+            [[PNS_low, PNS_high],
+            [PN_low, PN_high],
+            [PS_low, PS_high]], read-only
+        right_bds_e_y_bar_x : np.array[shape=(2, 2)]
+            right (high) bounds for each element of E_{y|x}, read-only
+        strong_exo : bool
+
+        Parameters
+        ----------
+        pns3_bds : np.array[shape=(3, 2)]
+        left_bds_e_y_bar_x : np.array[shape=(2, 2)]
+        right_bds_e_y_bar_x : np.array[shape=(2, 2)]
+        ate : float, None
+        compatible : bool
+        margin : float
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+        """
+        vals = dict(pns3_bds=pns3_bds,
+                    left_bds_e_y_bar_x=left_bds_e_y_bar_x,
+                    right_bds_e_y_bar_x=right_bds_e_y_bar_x)
+        for name, val in vals.items():
+            val = np.array(val)
+            val.flags.writeable = False
+            object.__setattr__(self, name, val)
+        object.__setattr__(self, 'ate', None if ate is None else float(ate))
+        object.__setattr__(self, 'compatible', bool(compatible))
+        object.__setattr__(self, 'margin', float(margin))
+        object.__setattr__(self, 'exogeneity', bool(exogeneity))
+        object.__setattr__(self, 'monotonicity', bool(monotonicity))
+        object.__setattr__(self, 'strong_exo', bool(strong_exo))
+
+    def __setattr__(self, name, val):
+        raise AttributeError("BoundsResult is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("BoundsResult is immutable")
+
+    def __reduce__(self):
+        # pickling (e.g., by a process pool) rebuilds through __init__
+        return BoundsResult, tuple(getattr(self, name)
+                                   for name in BoundsResult.__slots__)
+
+    def __repr__(self):
+        return "BoundsResult(pns3_bds=%s, ate=%s, compatible=%s, " \
+            "exogeneity=%s, monotonicity=%s, strong_exo=%s)" \
+            % (self.pns3_bds.tolist(), self.ate, self.compatible,
+               self.exogeneity, self.monotonicity, self.strong_exo)
+
+    @staticmethod
+    def calc_bounds(o_y_bar_x, px, e_y_bar_x=None, exogeneity=False,
+                    monotonicity=False, strong_exo=False,
+                    tol=BatchBounder.COMPAT_TOL):
+        """
+        Pure, stateless version of the Bounder workflow set_obs_probs(),
+        set_exp_probs(), set_exp_probs_bds(), set_pns3_bds(). It reads
+        only its arguments, never modifies them, and returns a new
+        immutable result, so it is safe to call from several threads at
+        once. The bounds are those of Bounder, calculated by the
+        vectorized formulas of BatchBounder.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(2, 2)]
+            O_{y|x}
+        px : np.array[shape=(2, )]
+            P(x)
+        e_y_bar_x : np.array[shape=(2, 2)], None
+            E_{y|x}. None means no Experimental data.
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+            strong exogeneity. It implies exogeneity, as in Bounder.
+        tol : float
+            tolerance of the compatibility flag
+
+        Returns
+        -------
+        BoundsResult
+
+        """
+        o_y_bar_x = np.asarray(o_y_bar_x, dtype=float)
+        px = np.asarray(px, dtype=float)
+        Bounder.check_prob_vec(px)
+        Bounder.check_2d_trans_matrix(o_y_bar_x)
+        batch_e_y_bar_x = None
+        ate = None
+        if e_y_bar_x is not None:
+            e_y_bar_x = np.asarray(e_y_bar_x, dtype=float)
+            Bounder.check_2d_trans_matrix(e_y_bar_x)
+            batch_e_y_bar_x = e_y_bar_x[np.newaxis]
+            ate = e_y_bar_x[1, 1] - e_y_bar_x[1, 0]
+        left, right = BatchBounder.calc_exp_probs_bds(
+            o_y_bar_x[np.newaxis], px[np.newaxis], monotonicity)
+        compatible, margin = BatchBounder.calc_exp_compatibility(
+            batch_e_y_bar_x, left, right, tol)
+        pns3_bds = BatchBounder.calc_pns3_bds(
+            o_y_bar_x[np.newaxis], px[np.newaxis], batch_e_y_bar_x,
+            exogeneity, monotonicity, strong_exo)
+        return BoundsResult(pns3_bds[0], left[0], right[0], ate,
+                            compatible[0], margin[0], exogeneity or
+                            strong_exo, monotonicity, strong_exo)
+
+
+if __name__ == "__main__":
+    import pickle
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    def main():
+        o_y_bar_x = np.array([[.3, .3], [.7, .7]])
+        px = np.array([.3, .7])
+        e_y_bar_x = np.array([[.79, .51], [.21, .49]])
+        result = BoundsResult.calc_bounds(o_y_bar_x, px, e_y_bar_x,
+                                          exogeneity=True)
+        print(result)
+        b = Bounder(o_y_bar_x, px, e_y_bar_x=e_y_bar_x)
+        b.exogeneity = True
+        b.set_exp_probs_bds()
+        b.set_pns3_bds()
+        assert np.allclose(result.pns3_bds, b.get_pns3_bds())
+        try:
+            result.ate = 0.
+        except AttributeError as err:
+            print("AttributeError:", err)
+        try:
+            result.pns3_bds[0, 0] = 0.
+        except ValueError as err:
+            print("ValueError:", err)
+        assert pickle.loads(pickle.dumps(result)).ate == result.ate
+        print("size of a result: %d bytes (no instance dict)"
+              % sys.getsizeof(result))
+
+        # the same inputs shared by several threads
+        rng = np.random.default_rng(0)
+        o1b0s = rng.uniform(.1, .9, size=1000)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(
+                lambda o1b0: BoundsResult.calc_bounds(
+                    np.array([[1 - o1b0, .3], [o1b0, .7]]), px),
+                o1b0s))
+        print("%d results, PNS high of first: %.3f"
+              % (len(results), results[0].pns3_bds[0, 1]))
+
+    main()
@@ -0,0 +1,502 @@
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from BatchBounder import BatchBounder
+from BatchRunner import BatchRunner
+from Validator import Validator
+
+
+class BoundsServer:
+    # HTTP reason phrases of the status codes used
+    REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+    # largest accepted request body, in bytes
+    MAX_BODY_BYTES = 1 << 24
+
+    def __init__(self, host='127.0.0.1', port=8000, max_batch_size=4096,
+                 max_wait=.002, exogeneity=False, monotonicity=False,
+                 strong_exo=False, tol=BatchBounder.COMPAT_TOL,
+                 max_latencies=10000):
+        """
+        This class is a small HTTP/JSON service that answers bounds
+        queries, for services that want PNS3 bounds without embedding the
+        notebook. It uses only asyncio and the standard library. By
+        default, it listens on localhost only.
+
+        Endpoints:
+
+        POST /bounds
+            The body is one stratum, {"o1b0": .3, "o1b1": .7, "px1": .7,
+            "e1b0": .21, "e1b1": .49, "monotonicity": true}, or a list of
+            them, {"strata": [...]}. The keys are the input columns of
+            BatchRunner, so E_{y|x} and the constraint flags are optional.
+            The response is {"results": [...]}, one record per stratum with
+            the output columns of BatchRunner (PNS3 bounds, ATE and
+            compatibility flag and margin; null for NaN). Bad strata get
+            a 400 response with {"error": message}.
+        GET /metrics
+            Throughput and latency percentiles, see get_metrics().
+        GET /health
+            {"status": "ok"}
+
+        Concurrent requests are collected into micro-batches: the batcher
+        waits for a first request, then collects the requests that arrive
+        within max_wait seconds, up to max_batch_size strata, and
+        evaluates all of them with one vectorized call of
+        BatchRunner.calc_chunk(), in a worker thread so the event loop
+        keeps accepting requests meanwhile. A request's strata are never
+        split across batches.
+
+        Attributes
+        ----------
+        batch_sizes : deque[int]
+            number of strata of the most recent batches
+        batcher_task : asyncio.Task, None
+            the task running run_batcher()
+        executor : ThreadPoolExecutor
+            single worker thread that evaluates the batches
+        host : str
+        latencies : deque[float]
+            seconds from arrival to response of the most recent /bounds
+            requests
+        max_batch_size : int
+            maximum number of strata in a batch, unless a single request
+            has more
+        max_wait : float
+            seconds the batcher waits for more requests after the first
+            one of a batch
+        num_batches : int
+        num_requests : int
+            number of /bounds requests answered, including bad ones
+        num_strata : int
+            number of strata evaluated
+        port : int
+            the port actually listened on, once start() returns
+        queue : asyncio.Queue, None
+            pending (inputs, future) of the valid /bounds requests
+        runner : BatchRunner
+            converts the JSON strata to arrays, and holds the default
+            constraint flags and the compatibility tolerance
+        server : asyncio.Server, None
+        start_time : float
+            time.monotonic() when start() was called
+
+        Parameters
+        ----------
+        host : str
+        port : int
+            0 picks a free port
+        max_batch_size : int
+        max_wait : float
+        exogeneity : bool
+            default for strata without an exogeneity value
+        monotonicity : bool
+            default for strata without a monotonicity value
+        strong_exo : bool
+            default for strata without a strong_exo value
+        tol : float
+            tolerance of the compatibility flag
+        max_latencies : int
+            number of recent requests (and batches) the metrics are
+            calculated from
+        """
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.runner = BatchRunner(exogeneity=exogeneity,
+                                  monotonicity=monotonicity,
+                                  strong_exo=strong_exo, tol=tol)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.server = None
+        self.queue = None
+        self.batcher_task = None
+        self.start_time = time.monotonic()
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_strata = 0
+        self.latencies = deque(maxlen=max_latencies)
+        self.batch_sizes = deque(maxlen=max_latencies)
+
+    async def start(self):
+        """
+        Starts listening and batching. Must be called from a running event
+        loop.
+
+        Returns
+        -------
+        int
+            the port listened on
+
+        """
+        self.queue = asyncio.Queue()
+        self.batcher_task = asyncio.get_running_loop().create_task(
+            self.run_batcher())
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.start_time = time.monotonic()
+        return self.port
+
+    async def stop(self):
+        """
+        Stops listening and batching.
+
+        Returns
+        -------
+        None
+
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher_task.cancel()
+        try:
+            await self.batcher_task
+        except asyncio.CancelledError:
+            pass
+
+    async def serve_forever(self):
+        """
+        Starts the server and serves until cancelled.
+
+        Returns
+        -------
+        None
+
+        """
+        await self.start()
+        print("serving on http://%s:%d" % (self.host, self.port))
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    def get_inputs(self, payload):
+        """
+        Converts and validates the strata of a /bounds request.
+
+        Parameters
+        ----------
+        payload : dict
+            one stratum, or {"strata": [...]}
+
+        Returns
+        -------
+        tuple[np.array]
+            o_y_bar_x, px, e_y_bar_x, flags, as returned by
+            BatchRunner.get_inputs()
+
+        """
+        if not isinstance(payload, dict):
+            raise ValueError("the body must be a JSON object")
+        strata = payload.get('strata', [payload])
+        if not isinstance(strata, list) or not strata or \
+                not all(isinstance(stratum, dict) for stratum in strata):
+            raise ValueError("strata must be a non-empty list of objects")
+        columns = [[stratum.get(col) for stratum in strata]
+                   for col in BatchRunner.IN_COLUMNS]
+        try:
+            o_y_bar_x, px, e_y_bar_x, flags = self.runner.get_inputs(
+                columns)
+        except TypeError as err:
+            raise ValueError(str(err))
+        # a NaN in one of E_{1|0}, E_{1|1} means no Experimental data
+        e_y_bar_x[np.isnan(e_y_bar_x).any(axis=(1, 2))] = np.nan
+        Validator.validate(o_y_bar_x, px, e_y_bar_x)
+        return o_y_bar_x, px, e_y_bar_x, flags
+
+    async def run_batcher(self):
+        """
+        Coroutine that forms the micro-batches and evaluates them, until
+        cancelled.
+
+        Returns
+        -------
+        None
+
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(),
+                                                  timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0][0])
+            inputs = [np.concatenate(arrays, axis=-1 if k == 3 else 0)
+                      for k, arrays in enumerate(
+                          zip(*[item[0] for item in batch]))]
+            try:
+                _, out = await loop.run_in_executor(
+                    self.executor, BatchRunner.calc_chunk, *inputs,
+                    'raise', self.runner.tol)
+            except Exception as err:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(err)
+                continue
+            self.num_batches += 1
+            self.num_strata += size
+            self.batch_sizes.append(size)
+            start = 0
+            for (o_y_bar_x, *_), future in batch:
+                stop = start + len(o_y_bar_x)
+                if not future.done():
+                    future.set_result(
+                        {name: col[start:stop] for name, col in out.items()})
+                start = stop
+
+    async def get_bounds(self, payload):
+        """
+        Evaluates the strata of a /bounds request in the next
+        micro-batch.
+
+        Parameters
+        ----------
+        payload : dict
+
+        Returns
+        -------
+        dict
+            {"results": [...]}
+
+        """
+        inputs = self.get_inputs(payload)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((inputs, future))
+        out = await future
+        return {'results': BatchRunner.get_records(out)}
+
+    def get_metrics(self):
+        """
+        Returns the metrics of the server.
+
+        Returns
+        -------
+        dict
+            uptime, counters, throughput (requests and strata per second
+            since start()), mean batch size, and 50th, 90th, 99th
+            percentiles and max of the latencies (ms) of the recent
+            /bounds requests
+
+        """
+        uptime = time.monotonic() - self.start_time
+        metrics = {
+            'uptime_secs': uptime,
+            'num_requests': self.num_requests,
+            'num_batches': self.num_batches,
+            'num_strata': self.num_strata,
+            'requests_per_sec': self.num_requests/uptime,
+            'strata_per_sec': self.num_strata/uptime,
+            'mean_batch_size': (float(np.mean(self.batch_sizes))
+                                if self.batch_sizes else 0.)}
+        if self.latencies:
+            latencies = 1000*np.array(self.latencies)
+            for q in [50, 90, 99]:
+                metrics['latency_p%d_ms' % q] = float(
+                    np.percentile(latencies, q))
+            metrics['latency_max_ms'] = float(latencies.max())
+        return metrics
+
+    async def route(self, method, path, body):
+        """
+        Answers a request.
+
+        Parameters
+        ----------
+        method : str
+        path : str
+        body : bytes
+
+        Returns
+        -------
+        int, dict
+            status code and JSON response
+
+        """
+        path = path.split('?')[0]
+        if path == '/bounds':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            start = time.monotonic()
+            try:
+                response = 200, await self.get_bounds(json.loads(body))
+            except ValueError as err:
+                # json.JSONDecodeError is a ValueError too
+                response = 400, {'error': str(err)}
+            except Exception as err:
+                # a failed micro-batch fails all of its requests, but the
+                # clients still get a reply
+                response = 500, {'error': '%s: %s' % (
+                    type(err).__name__, err)}
+            self.num_requests += 1
+            self.latencies.append(time.monotonic() - start)
+            return response
+        if method != 'GET':
+            return 405, {'error': 'use GET'}
+        if path == '/metrics':
+            return 200, self.get_metrics()
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        return 404, {'error': 'no such path: %s' % path}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Coroutine that serves the HTTP/1.1 requests of a connection, with
+        keep-alive, until the client closes it.
+
+        Parameters
+        ----------
+        reader : asyncio.StreamReader
+        writer : asyncio.StreamWriter
+
+        Returns
+        -------
+        None
+
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = \
+                    request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                num_bytes = int(headers.get('content-length', 0))
+                if num_bytes > BoundsServer.MAX_BODY_BYTES:
+                    status, response = 413, {'error': 'body too large'}
+                    headers['connection'] = 'close'
+                else:
+                    body = await reader.readexactly(num_bytes)
+                    status, response = await self.route(method, path, body)
+                keep_alive = \
+                    headers.get('connection', '').lower() != 'close' and \
+                    version == 'HTTP/1.1'
+                data = json.dumps(response).encode()
+                writer.write((
+                    'HTTP/1.1 %d %s\r\n'
+                    'Content-Type: application/json\r\n'
+                    'Content-Length: %d\r\n'
+                    'Connection: %s\r\n\r\n'
+                    % (status, BoundsServer.REASONS[status], len(data),
+                       'keep-alive' if keep_alive else 'close')
+                    ).encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError,
+                ConnectionError):
+            # malformed request or client gone
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def fetch_json(reader, writer, method, path, payload=None):
+        """
+        Minimal HTTP/1.1 client, for testing the server on localhost.
+        Sends one request on an open keep-alive connection and returns
+        the response.
+
+        Parameters
+        ----------
+        reader : asyncio.StreamReader
+        writer : asyncio.StreamWriter
+            from asyncio.open_connection()
+        method : str
+        path : str
+        payload : dict, None
+
+        Returns
+        -------
+        int, dict
+            status code and JSON response
+
+        """
+        body = b'' if payload is None else json.dumps(payload).encode()
+        writer.write((
+            '%s %s HTTP/1.1\r\nHost: localhost\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: %d\r\n\r\n' % (method, path, len(body))
+            ).encode('latin-1') + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        num_bytes = 0
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                num_bytes = int(value)
+        return status, json.loads(await reader.readexactly(num_bytes))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    async def load_test(num_clients, num_requests):
+        server = BoundsServer(port=0)
+        port = await server.start()
+        rng = np.random.default_rng(0)
+
+        async def client():
+            reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                           port)
+            for _ in range(num_requests):
+                o1b0, o1b1, px1 = rng.random(3)
+                _, response = await BoundsServer.fetch_json(
+                    reader, writer, 'POST', '/bounds',
+                    {'o1b0': o1b0, 'o1b1': o1b1, 'px1': px1,
+                     'exogeneity': True})
+                result = response['results'][0]
+                expected = BatchBounder.calc_pns3_bds(
+                    np.array([[[1 - o1b0, 1 - o1b1], [o1b0, o1b1]]]),
+                    np.array([[1 - px1, px1]]), exogeneity=True)
+                assert np.isclose(result['pns_low'], expected[0, 0, 0])
+            writer.close()
+
+        await asyncio.gather(*[client() for _ in range(num_clients)])
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        print(await BoundsServer.fetch_json(reader, writer, 'POST',
+                                            '/bounds', {'o1b0': 2}))
+        _, metrics = await BoundsServer.fetch_json(reader, writer, 'GET',
+                                                   '/metrics')
+        writer.close()
+        await server.stop()
+        for name, val in metrics.items():
+            print("%s: %.2f" % (name, val))
+
+    def main():
+        parser = argparse.ArgumentParser(
+            description="Serves PNS3 bounds over HTTP/JSON.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--load_test', action='store_true',
+                            help="run a load test on localhost and exit")
+        args = parser.parse_args()
+        if args.load_test:
+            asyncio.run(load_test(num_clients=50, num_requests=40))
+        else:
+            asyncio.run(BoundsServer(args.host, args.port).serve_forever())
+
+    main()
@@ -0,0 +1,503 @@
+import csv
+import gzip
+import json
+import numpy as np
+
+
+class Ingester:
+    # raw values accepted for x and y
+    TO_BINARY = {'0': 0, '1': 1, '0.0': 0, '1.0': 1,
+                 'False': 0, 'True': 1, 'false': 0, 'true': 1}
+
+    def __init__(self, x_col='x', y_col='y', strata_cols=(),
+                 source_col='source', obs_tag='obs', exp_tag='exp'):
+        """
+        This class reads patient-level records (one row per patient) from
+        CSV or JSONL files and accumulates them into integer (x, y) counts
+        per stratum, separately for Observational (survey) and
+        Experimental (RCT) records. From those counts, it emits the
+        O_{y|x}, P(x) and E_{y|x} arrays that BatchBounder and Strata
+        consume.
+
+        The files are read in chunks of rows by generators, so memory use
+        is bounded by the chunk size plus the counts, no matter how big
+        the file is. A 100M row file is processed in a single pass without
+        ever being loaded whole.
+
+        Each record must have a treatment column x and an outcome column y
+        with values 0 or 1, zero or more stratum columns, and optionally a
+        source column whose value says whether the record is Observational
+        or Experimental. Records without a source value (a missing, empty
+        or NaN value, or all records, if the file has no source column)
+        are Observational. Records with bad x, y or source values are
+        counted in num_skipped and otherwise ignored.
+
+        Attributes
+        ----------
+        counts : np.array[shape=(K, 2, 2, 2), dtype=int64]
+            counts[g, s, y, x] is the number of records of stratum g with
+            treatment x and outcome y, from source s (0 for
+            Observational, 1 for Experimental). The [y, x] layout is the
+            same as that of O_{y|x} and E_{y|x}.
+        exp_tag : str
+        names : list[str]
+            names of the strata, in order of first appearance. The name of
+            a stratum is its stratum column values joined by '|'.
+        num_records : int
+            number of records counted
+        num_skipped : int
+            number of records skipped because of bad values
+        obs_tag : str
+        source_col : str
+        strata_cols : list[str]
+        stratum_to_index : dict[str, int]
+            maps the name of a stratum to its index g
+        x_col : str
+        y_col : str
+
+        Parameters
+        ----------
+        x_col : str
+            name of the treatment column
+        y_col : str
+            name of the outcome column
+        strata_cols : list[str]
+            names of the columns that define the strata. If empty, there
+            is a single stratum named 'all'.
+        source_col : str, None
+            name of the column that tags records as Observational or
+            Experimental. None means all records are Observational.
+        obs_tag : str
+            value of source_col for Observational records
+        exp_tag : str
+            value of source_col for Experimental records
+        """
+        self.x_col = x_col
+        self.y_col = y_col
+        self.strata_cols = list(strata_cols)
+        self.source_col = source_col
+        self.obs_tag = obs_tag
+        self.exp_tag = exp_tag
+
+        self.names = []
+        self.stratum_to_index = {}
+        self.counts = np.zeros(shape=(0, 2, 2, 2), dtype=np.int64)
+        self.num_records = 0
+        self.num_skipped = 0
+
+    @staticmethod
+    def open_text(path):
+        """
+        Opens a text file for reading, transparently decompressing it if
+        its name ends in '.gz'.
+
+        Parameters
+        ----------
+        path : str
+
+        Returns
+        -------
+        file object
+
+        """
+        if str(path).endswith('.gz'):
+            return gzip.open(path, 'rt', newline='')
+        return open(path, 'r', newline='')
+
+    @staticmethod
+    def iter_csv_chunks(path, columns, chunk_size=100000):
+        """
+        Generator that reads a CSV file with a header row and yields its
+        rows in chunks. Only the values of the requested columns are
+        kept. A column that is missing from the header yields None
+        values.
+
+        Parameters
+        ----------
+        path : str
+        columns : list[str]
+        chunk_size : int
+            number of rows per chunk
+
+        Yields
+        -------
+        list[list[str | None]]
+            one list per requested column, each with at most chunk_size
+            values
+
+        """
+        with Ingester.open_text(path) as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            header = [name.strip() for name in header]
+            positions = [header.index(col) if col in header else None
+                         for col in columns]
+            chunk = []
+            for row in reader:
+                if not row:
+                    continue
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    yield Ingester.get_chunk_columns(chunk, positions)
+                    chunk = []
+            if chunk:
+                yield Ingester.get_chunk_columns(chunk, positions)
+
+    @staticmethod
+    def get_chunk_columns(rows, positions):
+        """
+        Transposes a chunk of CSV rows into columns.
+
+        Parameters
+        ----------
+        rows : list[list[str]]
+        positions : list[int | None]
+            position of each requested column in a row, or None if the
+            column is missing
+
+        Returns
+        -------
+        list[list[str | None]]
+
+        """
+        columns = []
+        for pos in positions:
+            if pos is None:
+                columns.append([None]*len(rows))
+            else:
+                columns.append([row[pos] if pos < len(row) else None
+                                for row in rows])
+        return columns
+
+    @staticmethod
+    def iter_jsonl_chunks(path, columns, chunk_size=100000):
+        """
+        Generator that reads a JSONL file (one JSON object per line) and
+        yields its records in chunks. Only the values of the requested
+        keys are kept. A missing key yields a None value. A line that
+        isn't valid JSON, or isn't a JSON object, yields None for every
+        key, so that it is counted as a bad record downstream instead of
+        stopping the whole file.
+
+        Parameters
+        ----------
+        path : str
+        columns : list[str]
+        chunk_size : int
+            number of records per chunk
+
+        Yields
+        -------
+        list[list]
+            one list per requested key, each with at most chunk_size
+            values
+
+        """
+        with Ingester.open_text(path) as f:
+            chunk = [[] for _ in columns]
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if not isinstance(record, dict):
+                    record = {}
+                for col, values in zip(columns, chunk):
+                    values.append(record.get(col))
+                if len(chunk[0]) == chunk_size:
+                    yield chunk
+                    chunk = [[] for _ in columns]
+            if chunk[0]:
+                yield chunk
+
+    def get_columns(self):
+        """
+        Returns the names of the columns that are read from each record:
+        x, y, source (if any), then the stratum columns.
+
+        Returns
+        -------
+        list[str]
+
+        """
+        columns = [self.x_col, self.y_col]
+        if self.source_col is not None:
+            columns.append(self.source_col)
+        return columns + self.strata_cols
+
+    def get_stratum_indices(self, strata_values, num_records):
+        """
+        Returns the index g of the stratum of each record of a chunk,
+        registering new strata as they appear.
+
+        Parameters
+        ----------
+        strata_values : list[list]
+            one list of values per stratum column
+        num_records : int
+            number of records in the chunk
+
+        Returns
+        -------
+        np.array[shape=(C, ), dtype=int64]
+
+        """
+        if not strata_values:
+            keys = ['all']*num_records
+        elif len(strata_values) == 1:
+            keys = [str(v) for v in strata_values[0]]
+        else:
+            keys = ['|'.join(str(v) for v in vals)
+                    for vals in zip(*strata_values)]
+        indices = np.empty(shape=(len(keys), ), dtype=np.int64)
+        stratum_to_index = self.stratum_to_index
+        for i, key in enumerate(keys):
+            g = stratum_to_index.get(key)
+            if g is None:
+                g = len(self.names)
+                stratum_to_index[key] = g
+                self.names.append(key)
+            indices[i] = g
+        return indices
+
+    @staticmethod
+    def get_binary_values(values):
+        """
+        Converts a list of raw values of x or y into an array of 0s and 1s.
+        Bad values (anything other than 0, 1, '0', '1', True, False)
+        become -1.
+
+        Parameters
+        ----------
+        values : list
+
+        Returns
+        -------
+        np.array[shape=(C, ), dtype=int64]
+
+        """
+        to_binary = Ingester.TO_BINARY
+        return np.array([to_binary.get(str(v).strip(), -1) for v in values],
+                        dtype=np.int64)
+
+    def get_source_values(self, tags):
+        """
+        Converts a list of raw values of the source column into an array
+        of sources: 0 for Observational, 1 for Experimental. Missing
+        values (None, '' as read from a blank CSV cell, or NaN) mean
+        Observational. Other values, including unhashable ones such as
+        JSON lists and objects, become -1.
+
+        Parameters
+        ----------
+        tags : list
+
+        Returns
+        -------
+        np.array[shape=(C, ), dtype=int64]
+
+        """
+        tag_to_source = {self.obs_tag: 0, self.exp_tag: 1, None: 0, '': 0}
+        source = np.empty(shape=(len(tags), ), dtype=np.int64)
+        for i, tag in enumerate(tags):
+            try:
+                # NaN != NaN, so it can't be looked up in a dict
+                source[i] = 0 if tag != tag else tag_to_source.get(tag, -1)
+            except TypeError:
+                source[i] = -1
+        return source
+
+    def add_chunk(self, columns):
+        """
+        Adds the records of a chunk to the counts.
+
+        Parameters
+        ----------
+        columns : list[list]
+            one list of values per column of get_columns()
+
+        Returns
+        -------
+        None
+
+        """
+        x = Ingester.get_binary_values(columns[0])
+        y = Ingester.get_binary_values(columns[1])
+        if self.source_col is not None:
+            source = self.get_source_values(columns[2])
+            strata_values = columns[3:]
+        else:
+            strata_values = columns[2:]
+            source = np.zeros_like(x)
+        g = self.get_stratum_indices(strata_values, len(x))
+
+        good = (x >= 0) & (y >= 0) & (source >= 0)
+        num_strata = len(self.names)
+        if num_strata > len(self.counts):
+            self.counts = np.concatenate([
+                self.counts,
+                np.zeros(shape=(num_strata - len(self.counts), 2, 2, 2),
+                         dtype=np.int64)])
+        flat_index = (((g*2 + source)*2 + y)*2 + x)[good]
+        self.counts += np.bincount(
+            flat_index, minlength=num_strata*8).reshape(num_strata, 2, 2, 2)
+        self.num_records += int(good.sum())
+        self.num_skipped += len(x) - int(good.sum())
+
+    def ingest_file(self, path, chunk_size=100000):
+        """
+        Reads a whole CSV or JSONL file, chunk by chunk, and adds its
+        records to the counts. The format is inferred from the file
+        name: '.jsonl', '.ndjson' or '.json' (optionally followed by
+        '.gz') mean JSONL, anything else means CSV.
+
+        Parameters
+        ----------
+        path : str
+        chunk_size : int
+            number of records per chunk
+
+        Returns
+        -------
+        None
+
+        """
+        name = str(path)
+        if name.endswith('.gz'):
+            name = name[:-3]
+        if name.endswith(('.jsonl', '.ndjson', '.json')):
+            chunks = Ingester.iter_jsonl_chunks(
+                path, self.get_columns(), chunk_size)
+        else:
+            chunks = Ingester.iter_csv_chunks(
+                path, self.get_columns(), chunk_size)
+        for columns in chunks:
+            self.add_chunk(columns)
+
+    def get_obs_counts(self):
+        """
+        Returns the Observational counts.
+
+        Returns
+        -------
+        np.array[shape=(K, 2, 2), dtype=int64]
+            obs_counts[g, y, x]
+
+        """
+        return self.counts[:, 0]
+
+    def get_exp_counts(self):
+        """
+        Returns the Experimental counts.
+
+        Returns
+        -------
+        np.array[shape=(K, 2, 2), dtype=int64]
+            exp_counts[g, y, x]
+
+        """
+        return self.counts[:, 1]
+
+    @staticmethod
+    def counts_to_probs(obs_counts, exp_counts=None):
+        """
+        Returns the O_{y|x}, P(x) and E_{y|x} arrays estimated from counts.
+
+        O_{y|x} is NaN for the columns x with no Observational records.
+        E_{y|x} is NaN for the whole row of a stratum if either x=0 or x=1
+        has no Experimental records, which BatchBounder interprets as
+        "no Experimental data" for that stratum. P(x) is NaN for strata
+        with no Observational records.
+
+        Parameters
+        ----------
+        obs_counts : np.array[shape=(K, 2, 2)]
+            obs_counts[g, y, x]
+        exp_counts : np.array[shape=(K, 2, 2)], None
+            exp_counts[g, y, x]
+
+        Returns
+        -------
+        np.array[shape=(K, 2, 2)], np.array[shape=(K, 2)],
+        np.array[shape=(K, 2, 2)] | None
+            o_y_bar_x, px, e_y_bar_x
+
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            num_x = obs_counts.sum(axis=1)
+            o_y_bar_x = obs_counts/num_x[:, np.newaxis, :]
+            px = num_x/num_x.sum(axis=1, keepdims=True)
+            if exp_counts is None:
+                return o_y_bar_x, px, None
+            num_x = exp_counts.sum(axis=1)
+            e_y_bar_x = exp_counts/num_x[:, np.newaxis, :]
+        e_y_bar_x[(num_x == 0).any(axis=1)] = np.nan
+        return o_y_bar_x, px, e_y_bar_x
+
+    def get_probs(self):
+        """
+        Returns the O_{y|x}, P(x) and E_{y|x} arrays estimated from the
+        counts. E_{y|x} is None if there are no Experimental records at
+        all.
+
+        Returns
+        -------
+        np.array[shape=(K, 2, 2)], np.array[shape=(K, 2)],
+        np.array[shape=(K, 2, 2)] | None
+            o_y_bar_x, px, e_y_bar_x
+
+        """
+        exp_counts = self.get_exp_counts()
+        if not exp_counts.any():
+            exp_counts = None
+        return Ingester.counts_to_probs(self.get_obs_counts(), exp_counts)
+
+    def get_strata(self):
+        """
+        Returns a Strata object with the probabilities of get_probs(). The
+        weight P_g of each stratum is its share of the Observational
+        records.
+
+        Returns
+        -------
+        Strata
+
+        """
+        from Strata import Strata
+        o_y_bar_x, px, e_y_bar_x = self.get_probs()
+        weights = self.get_obs_counts().sum(axis=(1, 2))
+        return Strata(self.names, o_y_bar_x, px, weights,
+                      e_y_bar_x=e_y_bar_x)
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    def main():
+        rng = np.random.default_rng(0)
+        path = os.path.join(tempfile.mkdtemp(), "patients.csv")
+        with open(path, "w") as f:
+            f.write("sex,x,y,source\n")
+            for _ in range(10000):
+                sex = rng.choice(['m', 'f'])
+                source = rng.choice(['obs', 'exp'])
+                x = rng.integers(2)
+                y = int(rng.random() < .3 + .2*x)
+                f.write("%s,%d,%d,%s\n" % (sex, x, y, source))
+        ingester = Ingester(strata_cols=['sex'])
+        ingester.ingest_file(path, chunk_size=1000)
+        print("strata:", ingester.names)
+        print("records:", ingester.num_records,
+              "skipped:", ingester.num_skipped)
+        strata = ingester.get_strata()
+        strata.print_all_probs("_")
+        strata.set_pns3_bds()
+        strata.print_pns3_bds("_")
+
+    main()
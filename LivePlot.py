@@ -0,0 +1,156 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from Plotter import Plotter
+
+
+class LivePlot:
+    def __init__(self, names, colors=None):
+        """
+        This class is a persistent version of
+        Plotter.plot_strata_pns3_bds(). The figure, its bars and its text
+        labels are created once, by the constructor. After that, update()
+        only changes the heights and bottoms of the bars and the strings
+        and positions of the text labels, then redraws the canvas. This is
+        much cheaper than building a new figure on every slider event.
+
+        The figure is owned (see Plotter.owned_fig_nums), so
+        Plotter.cap_figures() never closes it. Call close() to release it.
+
+        With an interactive backend (e.g., %matplotlib widget), the canvas
+        is redrawn in place. With %matplotlib inline, call show() after
+        update() to display a fresh image of the same figure.
+
+        Attributes
+        ----------
+        ax : matplotlib.axes.Axes
+        bar_width : float
+        bars : list[matplotlib.container.BarContainer]
+            bars[g] holds the 3 bars (PNS, PN, PS) of stratum g
+        centers : np.array[shape=(K, 3)]
+            x coordinates of the centers of the bars
+        fig : matplotlib.figure.Figure
+        names : list[str]
+            names of the strata, used in the legend
+        texts : list[list[matplotlib.text.Text]]
+            texts[g][k] is the label of bar k of stratum g. Empty lists if
+            there are more than 4 strata.
+
+        Parameters
+        ----------
+        names : list[str]
+        colors : list[str], None
+            one color per stratum. None means Plotter.get_strata_colors(K)
+        """
+        self.names = list(names)
+        num_strata = len(self.names)
+        if colors is None:
+            colors = Plotter.get_strata_colors(num_strata)
+        # plt.ioff() keeps %matplotlib inline from displaying the empty
+        # figure at the end of the cell that creates it
+        with plt.ioff():
+            self.fig, self.ax = plt.subplots(figsize=(10, 5))
+        Plotter.owned_fig_nums.add(self.fig.number)
+        Plotter.format_axes(self.ax)
+        self.bar_width, self.centers = Plotter.get_bar_layout(num_strata)
+        self.bars = []
+        self.texts = []
+        for g in range(num_strata):
+            self.bars.append(self.ax.bar(
+                self.centers[g], np.zeros(3), width=self.bar_width,
+                color=colors[g]))
+            texts_g = []
+            if num_strata <= 4:
+                for x in self.centers[g] - self.bar_width/2:
+                    texts_g.append(self.ax.text(x, 0, '', size='small',
+                                                color=colors[g]))
+            self.texts.append(texts_g)
+        self.ax.legend(self.names)
+
+    def update(self, bds, strata=None):
+        """
+        Sets the bars and text labels to the bounds bds and redraws the
+        canvas. Bounds with a NaN are drawn as empty bars without label.
+
+        Parameters
+        ----------
+        bds : np.array[shape=(K, 3, 2)]
+            the output of strata.get_pns3_bds()
+        strata : list[int], None
+            indices of the strata whose bars and labels are updated. None
+            means all of them.
+
+        Returns
+        -------
+        None
+
+        """
+        if strata is None:
+            strata = range(len(self.bars))
+        for g in strata:
+            for k, rect in enumerate(self.bars[g]):
+                low, high = bds[g, k]
+                if np.isnan(low) or np.isnan(high):
+                    low, high, txt = 0., 0., ''
+                else:
+                    txt = '(%.2f, %.2f)' % (low, high)
+                rect.set_y(low)
+                rect.set_height(high - low)
+                if self.texts[g]:
+                    self.texts[g][k].set_y(high + .02)
+                    self.texts[g][k].set_text(txt)
+        self.fig.canvas.draw_idle()
+
+    def show(self):
+        """
+        Displays the figure in the current output of a Jupyter notebook.
+        Only needed with non-interactive backends such as %matplotlib
+        inline, which render a static image of the figure.
+
+        Returns
+        -------
+        None
+
+        """
+        from IPython.display import display
+        display(self.fig)
+
+    def close(self):
+        """
+        Closes the figure and gives up its ownership.
+
+        Returns
+        -------
+        None
+
+        """
+        Plotter.owned_fig_nums.discard(self.fig.number)
+        plt.close(self.fig)
+
+
+if __name__ == "__main__":
+    import time
+
+    def main():
+        rng = np.random.default_rng(0)
+        num_updates = 100
+
+        def random_bds():
+            return np.sort(rng.random((2, 3, 2)), axis=2)
+
+        start = time.time()
+        for _ in range(num_updates):
+            Plotter.plot_strata_pns3_bds(random_bds(), ['male', 'female'])
+            plt.gcf().canvas.draw()
+            plt.close('all')
+        print("new figure per update: %.1f ms"
+              % (1000*(time.time() - start)/num_updates))
+
+        live = LivePlot(['male', 'female'])
+        start = time.time()
+        for _ in range(num_updates):
+            # draw_idle() draws right away with non-interactive backends
+            live.update(random_bds())
+        print("LivePlot.update(): %.1f ms"
+              % (1000*(time.time() - start)/num_updates))
+
+    main()
@@ -0,0 +1,255 @@
+import os
+import numpy as np
+from BatchBounder import BatchBounder
+
+
+class MemmapBounder:
+    def __init__(self, o_path, px_path, e_path=None, chunk_size=1 << 14):
+        """
+        This class is the out-of-core mode of BatchBounder, for strata
+        arrays larger than RAM. The inputs O_{y|x}, P(x) and, optionally,
+        E_{y|x} are .npy files that are opened memory-mapped, read-only.
+        run() streams them through BatchBounder in chunks of chunk_size
+        strata and writes the outputs to memory-mapped .npy files.
+
+        Each chunk maps only its own rows of the input and output files
+        (see open_rows()), and unmaps them when done. Pages of a mapping
+        that covers the whole file would stay resident once touched, so
+        the memory of the process would grow with N. Mapping chunk by
+        chunk keeps the peak memory at a few chunks, whatever N is.
+
+        The default chunk size keeps the temporary arrays of
+        BatchBounder (a few dozen arrays of chunk_size floats) within the
+        L2 cache of common CPUs. Much smaller chunks pay Python overhead
+        per chunk, much larger ones spill to main memory, and both are
+        slower.
+
+        Attributes
+        ----------
+        chunk_size : int
+        e_y_bar_x : np.memmap[shape=(N, 2, 2)], None
+            rows containing a NaN mean no Experimental data
+        num_strata : int
+        o_y_bar_x : np.memmap[shape=(N, 2, 2)]
+        px : np.memmap[shape=(N, 2)]
+
+        Parameters
+        ----------
+        o_path : str
+            .npy file of O_{y|x}
+        px_path : str
+            .npy file of P(x)
+        e_path : str, None
+            .npy file of E_{y|x}. None means no Experimental data.
+        chunk_size : int
+        """
+        self.o_y_bar_x = np.load(o_path, mmap_mode='r')
+        self.px = np.load(px_path, mmap_mode='r')
+        self.e_y_bar_x = None
+        if e_path is not None:
+            self.e_y_bar_x = np.load(e_path, mmap_mode='r')
+        BatchBounder.check_batch_shapes(self.o_y_bar_x, self.px,
+                                        self.e_y_bar_x)
+        self.num_strata = self.o_y_bar_x.shape[0]
+        self.chunk_size = chunk_size
+
+    def get_dtype(self):
+        """
+        Returns the dtype of the outputs, which is that of BatchBounder.
+
+        Returns
+        -------
+        np.dtype
+
+        """
+        arrays = [self.o_y_bar_x, self.px]
+        if self.e_y_bar_x is not None:
+            arrays.append(self.e_y_bar_x)
+        return np.result_type(*arrays)
+
+    @staticmethod
+    def open_rows(arr, start, stop, mode='r'):
+        """
+        Maps only rows start:stop of the memory-mapped .npy array arr.
+        The rows are unmapped when the returned array is deleted.
+
+        The rows of an array that is not in C order (e.g., a .npy file
+        saved with fortran_order=True) are not contiguous in the file,
+        so for such an array this returns the slice arr[start:stop] of
+        the existing mapping instead.
+
+        Parameters
+        ----------
+        arr : np.memmap
+            from np.load(path, mmap_mode=...) or
+            np.lib.format.open_memmap()
+        start : int
+        stop : int
+        mode : str
+            'r' for reading, 'r+' for writing
+
+        Returns
+        -------
+        np.memmap[shape=(stop - start, ...)]
+
+        """
+        if not arr.flags.c_contiguous:
+            return arr[start:stop]
+        row_bytes = arr.dtype.itemsize*int(np.prod(arr.shape[1:]))
+        return np.memmap(arr.filename, dtype=arr.dtype, mode=mode,
+                         offset=arr.offset + start*row_bytes,
+                         shape=(stop - start, ) + arr.shape[1:])
+
+    @staticmethod
+    def get_chunk_flag(flag, rows):
+        """
+        Returns the rows of a constraint flag, which is either a bool or
+        an array with one entry per stratum (e.g., a memory-mapped .npy
+        file).
+
+        Parameters
+        ----------
+        flag : bool, np.array[shape=(N, )]
+        rows : slice
+
+        Returns
+        -------
+        bool, np.array[shape=(C, ), dtype=bool]
+
+        """
+        if np.ndim(flag) == 0:
+            return bool(flag)
+        if isinstance(flag, np.memmap):
+            flag = MemmapBounder.open_rows(flag, rows.start, rows.stop)
+            return np.array(flag, dtype=bool)
+        return np.asarray(flag[rows], dtype=bool)
+
+    def run(self, out_dir, exogeneity=False, monotonicity=False,
+            strong_exo=False, tol=BatchBounder.COMPAT_TOL):
+        """
+        Calculates the bounds of all the strata, chunk by chunk, and
+        writes them to memory-mapped .npy files in out_dir:
+
+        pns3_bds.npy : (N, 3, 2)
+            output of BatchBounder.calc_pns3_bds()
+        exp_left_bds.npy, exp_right_bds.npy : (N, 2, 2)
+            bounds of E_{y|x} implied by O_{y|x} and P(x), output of
+            BatchBounder.calc_exp_probs_bds()
+        compatible.npy : (N, ) bool, margin.npy : (N, )
+            only with Experimental data. Output of
+            BatchBounder.calc_exp_compatibility().
+
+        Parameters
+        ----------
+        out_dir : str
+            created if it doesn't exist
+        exogeneity : bool, np.array[shape=(N, )]
+        monotonicity : bool, np.array[shape=(N, )]
+        strong_exo : bool, np.array[shape=(N, )]
+        tol : float
+            tolerance of the compatibility flag
+
+        Returns
+        -------
+        dict[str, np.memmap]
+            the outputs, by file name without extension, opened read-only
+
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        num_strata = self.num_strata
+        dtype = self.get_dtype()
+        shapes = {'pns3_bds': ((num_strata, 3, 2), dtype),
+                  'exp_left_bds': ((num_strata, 2, 2), dtype),
+                  'exp_right_bds': ((num_strata, 2, 2), dtype)}
+        if self.e_y_bar_x is not None:
+            shapes['compatible'] = ((num_strata, ), np.dtype(bool))
+            shapes['margin'] = ((num_strata, ), dtype)
+        outs = {name: np.lib.format.open_memmap(
+                    os.path.join(out_dir, name + '.npy'), mode='w+',
+                    dtype=out_dtype, shape=shape)
+                for name, (shape, out_dtype) in shapes.items()}
+        for start in range(0, num_strata, self.chunk_size):
+            stop = min(start + self.chunk_size, num_strata)
+            rows = slice(start, stop)
+            # copying the rows out of their maps makes each chunk a
+            # contiguous in-memory array
+            o_y_bar_x = np.array(MemmapBounder.open_rows(
+                self.o_y_bar_x, start, stop))
+            px = np.array(MemmapBounder.open_rows(self.px, start, stop))
+            e_y_bar_x = None
+            if self.e_y_bar_x is not None:
+                e_y_bar_x = np.array(MemmapBounder.open_rows(
+                    self.e_y_bar_x, start, stop))
+            mono = MemmapBounder.get_chunk_flag(monotonicity, rows)
+            chunk_outs = {'pns3_bds': BatchBounder.calc_pns3_bds(
+                o_y_bar_x, px, e_y_bar_x,
+                MemmapBounder.get_chunk_flag(exogeneity, rows), mono,
+                MemmapBounder.get_chunk_flag(strong_exo, rows))}
+            left_bds, right_bds = BatchBounder.calc_exp_probs_bds(
+                o_y_bar_x, px, mono)
+            chunk_outs['exp_left_bds'] = left_bds
+            chunk_outs['exp_right_bds'] = right_bds
+            if e_y_bar_x is not None:
+                chunk_outs['compatible'], chunk_outs['margin'] = \
+                    BatchBounder.calc_exp_compatibility(
+                        e_y_bar_x, left_bds, right_bds, tol)
+            for name, val in chunk_outs.items():
+                out_rows = MemmapBounder.open_rows(outs[name], start, stop,
+                                                   mode='r+')
+                out_rows[...] = val
+                # unmapping hands the written pages to the OS page cache
+                del out_rows
+        for name in list(outs):
+            outs[name] = np.load(os.path.join(out_dir, name + '.npy'),
+                                 mmap_mode='r')
+        return outs
+
+
+if __name__ == "__main__":
+    import resource
+    import tempfile
+    import time
+
+    def main():
+        tmp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        for num_strata in [10**6, 10**7]:
+            # write the inputs chunk by chunk, so this demo stays small too
+            paths = [os.path.join(tmp_dir, name + '.npy')
+                     for name in ['o', 'px', 'e']]
+            o_map = np.lib.format.open_memmap(
+                paths[0], mode='w+', shape=(num_strata, 2, 2))
+            px_map = np.lib.format.open_memmap(
+                paths[1], mode='w+', shape=(num_strata, 2))
+            e_map = np.lib.format.open_memmap(
+                paths[2], mode='w+', shape=(num_strata, 2, 2))
+            for start in range(0, num_strata, 10**6):
+                stop = start + 10**6
+                o1 = rng.random((10**6, 2))
+                MemmapBounder.open_rows(o_map, start, stop, 'r+')[...] = \
+                    np.stack([1 - o1, o1], axis=1)
+                px1 = rng.random(10**6)
+                MemmapBounder.open_rows(px_map, start, stop, 'r+')[...] = \
+                    np.stack([1 - px1, px1], axis=1)
+                e1 = rng.random((10**6, 2))
+                MemmapBounder.open_rows(e_map, start, stop, 'r+')[...] = \
+                    np.stack([1 - e1, e1], axis=1)
+            del o_map, px_map, e_map
+            bounder = MemmapBounder(*paths)
+            start = time.time()
+            outs = bounder.run(os.path.join(tmp_dir, 'out'),
+                               exogeneity=True)
+            print("N=%d: %.1f s, peak RSS so far %d MB, output %d MB"
+                  % (num_strata, time.time() - start,
+                     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                     // 1024,
+                     sum(out.nbytes for out in outs.values()) >> 20))
+            rows = slice(num_strata - 1000, num_strata)
+            assert np.array_equal(
+                outs['pns3_bds'][rows],
+                BatchBounder.calc_pns3_bds(bounder.o_y_bar_x[rows],
+                                           bounder.px[rows],
+                                           bounder.e_y_bar_x[rows],
+                                           exogeneity=True))
+
+    main()
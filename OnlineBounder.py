@@ -0,0 +1,264 @@
+import numpy as np
+from BatchBounder import BatchBounder
+from Ingester import Ingester
+
+
+class OnlineBounder:
+    def __init__(self, exogeneity=False, monotonicity=False,
+                 strong_exo=False, tol=1e-3):
+        """
+        This class keeps running (x, y) counts per stratum for a stream of
+        survey and RCT records, and keeps the O_{y|x}, P(x), E_{y|x} and
+        PNS3 bounds of every stratum current as records arrive.
+
+        Adding a record costs O(1): it increments one count and marks its
+        stratum as dirty. refresh() recalculates, with a single vectorized
+        call to BatchBounder, only the strata that are dirty. Subscribers
+        registered with subscribe() are called after a refresh for each
+        stratum whose bounds moved by more than tol since the last time
+        they were notified.
+
+        Attributes
+        ----------
+        counts : np.array[shape=(K, 2, 2, 2), dtype=int64]
+            counts[g, s, y, x], with the same layout as Ingester.counts
+        dirty : set[int]
+            indices of the strata whose counts changed since the last
+            refresh()
+        e_y_bar_x : np.array[shape=(K, 2, 2)]
+            E_{y|x} of each stratum. NaN rows mean no Experimental data yet.
+        exogeneity : bool
+        monotonicity : bool
+        names : list[str]
+            names of the strata, in order of first appearance
+        notified_pns3_bds : np.array[shape=(K, 3, 2)]
+            PNS3 bounds of each stratum the last time subscribers were
+            notified about it (NaN if never)
+        o_y_bar_x : np.array[shape=(K, 2, 2)]
+            O_{y|x} of each stratum
+        pns3_bds : np.array[shape=(K, 3, 2)]
+            PNS3 bounds of each stratum, as of the last refresh()
+        px : np.array[shape=(K, 2)]
+            P(x) of each stratum
+        stratum_to_index : dict[str, int]
+            maps the name of a stratum to its index
+        strong_exo : bool
+        subscribers : list[function]
+            functions called as fun(name, pns3_bds) when the bounds of
+            stratum name change by more than tol
+        tol : float
+
+        Parameters
+        ----------
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+        tol : float
+            subscribers are notified when some bound of a stratum moves by
+            more than tol
+        """
+        self.exogeneity = exogeneity
+        self.monotonicity = monotonicity
+        self.strong_exo = strong_exo
+        self.tol = tol
+
+        self.names = []
+        self.stratum_to_index = {}
+        self.counts = np.zeros(shape=(0, 2, 2, 2), dtype=np.int64)
+        self.o_y_bar_x = np.zeros(shape=(0, 2, 2))
+        self.px = np.zeros(shape=(0, 2))
+        self.e_y_bar_x = np.zeros(shape=(0, 2, 2))
+        self.pns3_bds = np.zeros(shape=(0, 3, 2))
+        self.notified_pns3_bds = np.zeros(shape=(0, 3, 2))
+        self.dirty = set()
+        self.subscribers = []
+
+    def get_stratum_index(self, name):
+        """
+        Returns the index of the stratum named name, creating it if it
+        doesn't exist yet. The arrays grow by doubling, so creating a
+        stratum costs O(1) amortized.
+
+        Parameters
+        ----------
+        name : str
+
+        Returns
+        -------
+        int
+
+        """
+        g = self.stratum_to_index.get(name)
+        if g is not None:
+            return g
+        g = len(self.names)
+        self.names.append(name)
+        self.stratum_to_index[name] = g
+        if g == len(self.counts):
+            capacity = max(2*g, 8)
+
+            def grow(arr, fill_value):
+                new_arr = np.full(shape=(capacity, *arr.shape[1:]),
+                                  fill_value=fill_value, dtype=arr.dtype)
+                new_arr[:g] = arr
+                return new_arr
+            self.counts = grow(self.counts, 0)
+            self.o_y_bar_x = grow(self.o_y_bar_x, np.nan)
+            self.px = grow(self.px, np.nan)
+            self.e_y_bar_x = grow(self.e_y_bar_x, np.nan)
+            self.pns3_bds = grow(self.pns3_bds, np.nan)
+            self.notified_pns3_bds = grow(self.notified_pns3_bds, np.nan)
+        return g
+
+    def add_record(self, name, x, y, exp=False):
+        """
+        Adds one record to the counts of stratum name, and marks the
+        stratum as dirty. Costs O(1).
+
+        Parameters
+        ----------
+        name : str
+            name of the stratum
+        x : int
+            treatment, 0 or 1
+        y : int
+            outcome, 0 or 1
+        exp : bool
+            True for an Experimental (RCT) record, False for an
+            Observational (survey) one
+
+        Returns
+        -------
+        None
+
+        """
+        if x not in (0, 1) or y not in (0, 1):
+            raise ValueError("x and y must be 0 or 1, not %r, %r" % (x, y))
+        g = self.get_stratum_index(name)
+        self.counts[g, int(exp), y, x] += 1
+        self.dirty.add(g)
+
+    def add_counts(self, name, obs_counts=None, exp_counts=None):
+        """
+        Adds a block of counts to stratum name, and marks the stratum as
+        dirty. Useful for chunks coming from an Ingester.
+
+        Parameters
+        ----------
+        name : str
+        obs_counts : np.array[shape=(2, 2)], None
+            obs_counts[y, x]
+        exp_counts : np.array[shape=(2, 2)], None
+            exp_counts[y, x]
+
+        Returns
+        -------
+        None
+
+        """
+        g = self.get_stratum_index(name)
+        if obs_counts is not None:
+            self.counts[g, 0] += obs_counts
+        if exp_counts is not None:
+            self.counts[g, 1] += exp_counts
+        self.dirty.add(g)
+
+    def subscribe(self, fun):
+        """
+        Registers fun to be called as fun(name, pns3_bds) after a refresh,
+        for each stratum whose PNS3 bounds moved by more than self.tol
+        since the last notification about it.
+
+        Parameters
+        ----------
+        fun : function
+
+        Returns
+        -------
+        None
+
+        """
+        self.subscribers.append(fun)
+
+    def refresh(self):
+        """
+        Recalculates O_{y|x}, P(x), E_{y|x} and the PNS3 bounds of the dirty
+        strata only, with one vectorized call, then notifies the
+        subscribers about the strata whose bounds changed by more than
+        self.tol.
+
+        Returns
+        -------
+        list[int]
+            indices of the strata whose subscribers were notified
+
+        """
+        if not self.dirty:
+            return []
+        rows = np.array(sorted(self.dirty))
+        self.dirty = set()
+        counts = self.counts[rows]
+        o_y_bar_x, px, e_y_bar_x = Ingester.counts_to_probs(
+            counts[:, 0], counts[:, 1])
+        self.o_y_bar_x[rows] = o_y_bar_x
+        self.px[rows] = px
+        self.e_y_bar_x[rows] = e_y_bar_x
+        self.pns3_bds[rows] = BatchBounder.calc_pns3_bds(
+            o_y_bar_x, px, e_y_bar_x,
+            exogeneity=self.exogeneity,
+            monotonicity=self.monotonicity,
+            strong_exo=self.strong_exo)
+
+        # NaN bounds (strata without enough data) never trigger
+        # notifications, but the first non-NaN bounds always do
+        new = self.pns3_bds[rows]
+        old = self.notified_pns3_bds[rows]
+        with np.errstate(invalid='ignore'):
+            moved = np.abs(new - old).reshape(len(rows), 6).max(axis=1)
+        first = np.isnan(old).all(axis=(1, 2)) & \
+            ~np.isnan(new).any(axis=(1, 2))
+        changed = rows[(moved > self.tol) | first]
+        self.notified_pns3_bds[changed] = self.pns3_bds[changed]
+        for g in changed:
+            for fun in self.subscribers:
+                fun(self.names[g], self.pns3_bds[g])
+        return changed.tolist()
+
+    def get_pns3_bds(self, name=None):
+        """
+        Returns the PNS3 bounds of stratum name, or of all the strata if
+        name is None, as of the last refresh().
+
+        Parameters
+        ----------
+        name : str, None
+
+        Returns
+        -------
+        np.array[shape=(3, 2)], np.array[shape=(K, 3, 2)]
+
+        """
+        if name is None:
+            return self.pns3_bds[:len(self.names)]
+        return self.pns3_bds[self.stratum_to_index[name]]
+
+
+if __name__ == "__main__":
+    def main():
+        rng = np.random.default_rng(0)
+        ob = OnlineBounder(tol=.01)
+
+        def on_change(name, pns3_bds):
+            print("stratum %s: %.3f <= PNS <= %.3f"
+                  % (name, pns3_bds[0, 0], pns3_bds[0, 1]))
+        ob.subscribe(on_change)
+        for batch in range(5):
+            print("batch", batch)
+            for _ in range(2000):
+                name = rng.choice(['m', 'f'])
+                x = int(rng.integers(2))
+                y = int(rng.random() < .3 + .2*x)
+                ob.add_record(name, x, y, exp=bool(rng.integers(2)))
+            ob.refresh()
+
+    main()
@@ -0,0 +1,302 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from BatchBounder import BatchBounder
+
+
+class ParallelBounder:
+    BACKENDS = ('thread', 'process')
+    FLAG_NAMES = ('exogeneity', 'monotonicity', 'strong_exo')
+
+    def __init__(self, num_workers=None, backend='process',
+                 chunk_size=1 << 16):
+        """
+        This class is a multi-core version of BatchBounder.calc_pns3_bds().
+        The strata are split into ranges of chunk_size rows, and the ranges
+        are spread over a pool of workers. Workers receive index ranges,
+        never data: each worker reads its rows of the input arrays and
+        writes its rows of the output array in place.
+
+        With the 'thread' backend, the workers share the arrays of the
+        caller directly. NumPy releases the GIL inside its vectorized
+        loops, so threads scale as long as chunks are large.
+
+        With the 'process' backend, the input arrays are copied once into
+        shared memory blocks (multiprocessing.shared_memory), the output is
+        allocated in another block, and the workers attach to the blocks
+        by name. Nothing but block names, shapes and index ranges is
+        pickled, so the cost of pickling (N, 2, 2) arrays to and from the
+        workers disappears.
+
+        Each row is calculated by the same code as in the serial path, so
+        the results are identical to BatchBounder.calc_pns3_bds(),
+        including the dtype.
+
+        The pool is created on first use and kept until close(). A
+        ParallelBounder can be used as a context manager.
+
+        Attributes
+        ----------
+        backend : str
+            'thread' or 'process'
+        chunk_size : int
+            number of strata in the range of each task
+        executor : ThreadPoolExecutor, ProcessPoolExecutor, None
+        num_workers : int
+
+        Parameters
+        ----------
+        num_workers : int, None
+            None means os.cpu_count()
+        backend : str
+        chunk_size : int
+        """
+        if backend not in ParallelBounder.BACKENDS:
+            raise ValueError("backend must be one of %s, not %r"
+                             % (ParallelBounder.BACKENDS, backend))
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = num_workers
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_executor(self):
+        """
+        Returns the pool of workers, creating it if needed.
+
+        Returns
+        -------
+        ThreadPoolExecutor, ProcessPoolExecutor
+
+        """
+        if self.executor is None:
+            if self.backend == 'thread':
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.num_workers)
+            else:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers)
+        return self.executor
+
+    def close(self):
+        """
+        Shuts down the pool of workers.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    @staticmethod
+    def get_ranges(num_strata, chunk_size):
+        """
+        Splits range(num_strata) into consecutive ranges of at most
+        chunk_size rows.
+
+        Parameters
+        ----------
+        num_strata : int
+        chunk_size : int
+
+        Returns
+        -------
+        list[tuple[int, int]]
+            (start, stop) of each range
+
+        """
+        return [(start, min(start + chunk_size, num_strata))
+                for start in range(0, num_strata, chunk_size)]
+
+    @staticmethod
+    def calc_rows(arrays, flags, start, stop):
+        """
+        Calculates the bounds of rows start:stop and writes them to
+        arrays['pns3_bds']. This is the work of a single task.
+
+        Parameters
+        ----------
+        arrays : dict[str, np.array]
+            o_y_bar_x, px, optionally e_y_bar_x and the per-stratum flags,
+            and the output pns3_bds
+        flags : dict[str, bool]
+            the scalar flags
+        start : int
+        stop : int
+
+        Returns
+        -------
+        None
+
+        """
+        rows = slice(start, stop)
+        flags = dict(flags)
+        for name in ParallelBounder.FLAG_NAMES:
+            if name in arrays:
+                flags[name] = arrays[name][rows]
+        e_y_bar_x = arrays.get('e_y_bar_x')
+        arrays['pns3_bds'][rows] = BatchBounder.calc_pns3_bds(
+            arrays['o_y_bar_x'][rows], arrays['px'][rows],
+            None if e_y_bar_x is None else e_y_bar_x[rows], **flags)
+
+    @staticmethod
+    def calc_shared_rows(specs, flags, start, stop):
+        """
+        Process backend version of calc_rows(). Attaches to the shared
+        memory blocks described by specs, and detaches when done.
+
+        Parameters
+        ----------
+        specs : dict[str, tuple[str, tuple, str]]
+            (block name, shape, dtype) of each array
+        flags : dict[str, bool]
+        start : int
+        stop : int
+
+        Returns
+        -------
+        None
+
+        """
+        blocks = []
+        arrays = {}
+        try:
+            for name, (block_name, shape, dtype) in specs.items():
+                block = shared_memory.SharedMemory(name=block_name)
+                blocks.append(block)
+                arrays[name] = np.ndarray(shape, dtype=dtype,
+                                          buffer=block.buf)
+            ParallelBounder.calc_rows(arrays, flags, start, stop)
+        finally:
+            # the views must be gone before the blocks can be closed
+            arrays.clear()
+            for block in blocks:
+                block.close()
+
+    def calc_pns3_bds(self, o_y_bar_x, px, e_y_bar_x=None,
+                      exogeneity=False, monotonicity=False,
+                      strong_exo=False):
+        """
+        Parallel version of BatchBounder.calc_pns3_bds(), with the same
+        parameters and output.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+        px : np.array[shape=(N, 2)]
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+        exogeneity : bool, np.array[shape=(N, )]
+        monotonicity : bool, np.array[shape=(N, )]
+        strong_exo : bool, np.array[shape=(N, )]
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        arrays = {'o_y_bar_x': np.asarray(o_y_bar_x),
+                  'px': np.asarray(px)}
+        if e_y_bar_x is not None:
+            arrays['e_y_bar_x'] = np.asarray(e_y_bar_x)
+        BatchBounder.check_batch_shapes(**arrays)
+        num_strata = len(arrays['o_y_bar_x'])
+        flags = {}
+        for name, flag in zip(ParallelBounder.FLAG_NAMES,
+                              [exogeneity, monotonicity, strong_exo]):
+            if np.ndim(flag) == 0:
+                flags[name] = bool(flag)
+            else:
+                arrays[name] = np.asarray(flag, dtype=bool)
+                if arrays[name].shape != (num_strata, ):
+                    raise ValueError("%s must be a bool or have shape "
+                                     "(%d, ), not %s"
+                                     % (name, num_strata,
+                                        arrays[name].shape))
+        dtype = np.result_type(*[arrays[name] for name in
+                                 ['o_y_bar_x', 'px', 'e_y_bar_x']
+                                 if name in arrays])
+        ranges = ParallelBounder.get_ranges(num_strata, self.chunk_size)
+        if len(ranges) <= 1 or self.num_workers <= 1:
+            return BatchBounder.calc_pns3_bds(
+                o_y_bar_x, px, e_y_bar_x,
+                exogeneity, monotonicity, strong_exo)
+
+        if self.backend == 'thread':
+            arrays['pns3_bds'] = np.empty(shape=(num_strata, 3, 2),
+                                          dtype=dtype)
+            futures = [self.get_executor().submit(
+                ParallelBounder.calc_rows, arrays, flags, start, stop)
+                for start, stop in ranges]
+            for future in futures:
+                future.result()
+            return arrays['pns3_bds']
+
+        blocks = []
+        shared = {}
+        specs = {}
+        out_arrays = dict(arrays,
+                          pns3_bds=np.empty(shape=(0, 3, 2), dtype=dtype))
+        try:
+            for name, arr in out_arrays.items():
+                shape = (num_strata, ) + arr.shape[1:]
+                num_bytes = arr.dtype.itemsize*int(np.prod(shape))
+                block = shared_memory.SharedMemory(create=True,
+                                                   size=max(num_bytes, 1))
+                blocks.append(block)
+                shared[name] = np.ndarray(shape, dtype=arr.dtype,
+                                          buffer=block.buf)
+                if name in arrays:
+                    shared[name][...] = arr
+                specs[name] = (block.name, shape, arr.dtype.str)
+            futures = [self.get_executor().submit(
+                ParallelBounder.calc_shared_rows, specs, flags, start, stop)
+                for start, stop in ranges]
+            for future in futures:
+                future.result()
+            pns3_bds = shared['pns3_bds'].copy()
+        finally:
+            # the views must be gone before the blocks can be closed
+            shared.clear()
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return pns3_bds
+
+
+if __name__ == "__main__":
+    import time
+
+    def main():
+        rng = np.random.default_rng(0)
+        num_strata = 10**6
+        o1 = rng.random((num_strata, 2))
+        o_y_bar_x = np.stack([1 - o1, o1], axis=1)
+        px1 = rng.random(num_strata)
+        px = np.stack([1 - px1, px1], axis=1)
+        mono = rng.random(num_strata) < .5
+        start = time.time()
+        expected = BatchBounder.calc_pns3_bds(o_y_bar_x, px,
+                                              exogeneity=True,
+                                              monotonicity=mono)
+        print("serial: %.1f ms" % (1000*(time.time() - start)))
+        for backend in ParallelBounder.BACKENDS:
+            with ParallelBounder(num_workers=2, backend=backend) as pb:
+                start = time.time()
+                pns3_bds = pb.calc_pns3_bds(o_y_bar_x, px, exogeneity=True,
+                                            monotonicity=mono)
+                print("%s, 2 workers: %.1f ms"
+                      % (backend, 1000*(time.time() - start)))
+            assert np.array_equal(pns3_bds, expected)
+
+    main()
@@ -1,13 +1,32 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 class Plotter:
     """
-    This class has no constructor or attributes. It consists of just one
-    static method that plots using matplotlib.
+    This class has no constructor. It consists of static methods that plot
+    using matplotlib, and of static methods that manage the lifecycle of
+    the pyplot figures, so that long interactive sessions don't accumulate
+    figures.
+
+    matplotlib is imported by the methods that use it, not by this module,
+    so importing Plotter (or Widgeter) is cheap and the bounding code
+    never pays for matplotlib. The figure management methods don't import
+    pyplot at all if nothing has imported it yet, since there can be no
+    figures then.
+
+    Attributes
+    ----------
+    MAX_FIGURES : int
+        maximum number of pyplot figures kept open by cap_figures()
+    owned_fig_nums : set[int]
+        numbers of the pyplot figures owned by a GUI (e.g., the figure of
+        a LivePlot). cap_figures() and close_figures() never close them.
 
     """
+    MAX_FIGURES = 8
+    owned_fig_nums = set()
+
     @staticmethod
     def plot_pns3_bds(bds_m, bds_f):
         """
@@ -28,27 +47,217 @@ class Plotter:
         None
 
         """
-        plt.figure(figsize=(10, 5))
-        bar_width = 0.3
+        Plotter.plot_strata_pns3_bds(np.array([bds_m, bds_f]),
+                                     ['male', 'female'])
+
+    @staticmethod
+    def get_strata_colors(num_strata):
+        """
+        Returns one color per stratum. For 2 strata, these are the
+        traditional blue (male) and hotpink (female) of this app.
+
+        Parameters
+        ----------
+        num_strata : int
+
+        Returns
+        -------
+        list[str]
+
+        """
+        if num_strata == 2:
+            return ['blue', 'hotpink']
+        return ['C%d' % (k % 10) for k in range(num_strata)]
+
+    @staticmethod
+    def plot_strata_pns3_bds(bds, names, colors=None):
+        """
+        This method plots as 3 error bars the bounds bds[k] for PNS3 =
+        (PNS, PN, PS) for each stratum k. The error bars of the K strata
+        are plotted side-by-side.
+
+        Parameters
+        ----------
+        bds : np.array[shape=(K, 3, 2)]
+            the output of strata.get_pns3_bds()
+        names : list[str]
+            names of the strata, used in the legend
+        colors : list[str], None
+            one color per stratum. None means get_strata_colors(K)
+
+        Returns
+        -------
+        None
+
+        """
+        num_strata = len(bds)
+        if colors is None:
+            colors = Plotter.get_strata_colors(num_strata)
+        import matplotlib.pyplot as plt
+        Plotter.cap_figures(Plotter.MAX_FIGURES - 1)
+        fig, ax = plt.subplots(figsize=(10, 5))
+        Plotter.format_axes(ax)
+        bar_width, centers = Plotter.get_bar_layout(num_strata)
+        for g in range(num_strata):
+            ax.bar(centers[g], bds[g, :, 1]-bds[g, :, 0],
+                   width=bar_width, bottom=bds[g, :, 0], color=colors[g])
+            if num_strata <= 4:
+                for k, x in enumerate(centers[g] - bar_width/2):
+                    txt = '(%.2f, %.2f)' % (bds[g, k, 0], bds[g, k, 1])
+                    ax.text(x, bds[g, k, 1] + .02, txt, size='small',
+                            color=colors[g])
+        ax.legend(names)
+        plt.show()
+
+    @staticmethod
+    def format_axes(ax):
+        """
+        Sets the ticks, limits, grid and labels of the axes on which the
+        PNS3 bounds are plotted.
+
+        Parameters
+        ----------
+        ax : matplotlib.axes.Axes
+
+        Returns
+        -------
+        None
+
+        """
         x_labels = ("PNS", "PN", "PS")
-        plt.xticks(range(3), x_labels)
-        plt.ylim(0, 1)
+        ax.set_xticks(range(3), x_labels)
+        ax.set_ylim(0, 1)
         y_labels = np.arange(0, 1.1, .1)
-        plt.yticks(y_labels)
-        plt.grid(linestyle='--', axis='y')
-        plt.ylabel('probability')
-        plt.bar(np.arange(3) - bar_width/2, bds_m[:, 1]-bds_m[:, 0],
-                width=bar_width, bottom=bds_m[:, 0], color='blue')
-        for k, x in enumerate(np.arange(3) - bar_width):
-            txt = '(%.2f, %.2f)' % (bds_m[k, 0], bds_m[k, 1])
-            plt.text(x, bds_m[k, 1]+.02, txt, size='small', color='blue')
-        plt.bar(np.arange(3) + bar_width/2, bds_f[:, 1]-bds_f[:, 0],
-                width=bar_width, bottom=bds_f[:, 0], color='hotpink')
-        for k, x in enumerate(np.arange(3)):
-            txt = '(%.2f, %.2f)' % (bds_f[k, 0], bds_f[k, 1])
-            plt.text(x, bds_f[k, 1] + .02, txt, size='small', color='hotpink')
-        plt.legend(['male', 'female'])
-        plt.show()
+        ax.set_yticks(y_labels)
+        ax.grid(linestyle='--', axis='y')
+        ax.set_ylabel('probability')
+
+    @staticmethod
+    def get_bar_layout(num_strata):
+        """
+        Returns the width of the bars and, for each stratum, the x
+        coordinates of the centers of its 3 bars (PNS, PN, PS). The bars of
+        the K strata are side-by-side.
+
+        Parameters
+        ----------
+        num_strata : int
+
+        Returns
+        -------
+        float, np.array[shape=(K, 3)]
+            bar_width, centers
+
+        """
+        bar_width = .6/num_strata
+        offsets = (np.arange(num_strata) - (num_strata - 1)/2)*bar_width
+        centers = np.arange(3)[np.newaxis, :] + offsets[:, np.newaxis]
+        return bar_width, centers
+
+    @staticmethod
+    def is_pyplot_loaded():
+        """
+        Returns True iff matplotlib.pyplot has been imported, i.e., iff
+        there can be pyplot figures.
+
+        Returns
+        -------
+        bool
+
+        """
+        return 'matplotlib.pyplot' in sys.modules
+
+    @staticmethod
+    def close_figures(keep=()):
+        """
+        Closes all the pyplot figures except those in keep and those owned
+        by a GUI (see owned_fig_nums), e.g., the live plots of other open
+        GUIs. Owned figures are released by their owner (see
+        LivePlot.close()).
+
+        Parameters
+        ----------
+        keep : list[matplotlib.figure.Figure]
+
+        Returns
+        -------
+        None
+
+        """
+        if not Plotter.is_pyplot_loaded():
+            return
+        import matplotlib.pyplot as plt
+        keep_nums = {fig.number for fig in keep}
+        for num in plt.get_fignums():
+            if num not in keep_nums and num not in Plotter.owned_fig_nums:
+                plt.close(num)
+
+    @staticmethod
+    def cap_figures(max_figures=None):
+        """
+        Closes the oldest pyplot figures that are not owned by a GUI, until
+        at most max_figures figures are open (or only owned ones are left).
+
+        Parameters
+        ----------
+        max_figures : int, None
+            None means Plotter.MAX_FIGURES
+
+        Returns
+        -------
+        None
+
+        """
+        if not Plotter.is_pyplot_loaded():
+            return
+        import matplotlib.pyplot as plt
+        if max_figures is None:
+            max_figures = Plotter.MAX_FIGURES
+        nums = plt.get_fignums()
+        # figure numbers increase with creation time
+        unowned = [num for num in nums if num not in Plotter.owned_fig_nums]
+        num_to_close = len(nums) - max_figures
+        for num in unowned[:max(num_to_close, 0)]:
+            plt.close(num)
+
+    @staticmethod
+    def get_num_live_figures():
+        """
+        Returns the number of open pyplot figures.
+
+        Returns
+        -------
+        int
+
+        """
+        if not Plotter.is_pyplot_loaded():
+            return 0
+        import matplotlib.pyplot as plt
+        return len(plt.get_fignums())
+
+    @staticmethod
+    def get_live_figures_memory():
+        """
+        Returns an estimate, in bytes, of the memory held by the open
+        pyplot figures. The estimate counts the RGBA pixel buffer of each
+        figure that has been rendered, which dominates the memory of a
+        figure.
+
+        Returns
+        -------
+        int
+
+        """
+        if not Plotter.is_pyplot_loaded():
+            return 0
+        from matplotlib._pylab_helpers import Gcf
+        num_bytes = 0
+        # unlike plt.figure(num), Gcf doesn't make the figures current
+        for manager in Gcf.get_all_fig_managers():
+            renderer = getattr(manager.canvas, 'renderer', None)
+            if renderer is not None:
+                num_bytes += 4*int(renderer.width)*int(renderer.height)
+        return num_bytes
 
     # staticmethod
     # def thicken_line(bds_z):
@@ -0,0 +1,238 @@
+import numpy as np
+from BatchBounder import BatchBounder
+
+
+class PosteriorSampler:
+    # default maximum number of (draw, stratum) pairs per chunk
+    MAX_CHUNK_ELEMS = 1 << 20
+
+    def __init__(self, obs_counts, exp_counts=None, prior=1.,
+                 exogeneity=False, monotonicity=False, strong_exo=False):
+        """
+        This class samples the Bayesian posterior of the PNS3 bounds of N
+        strata. It is an alternative to class Bootstrapper.
+
+        For each stratum, the joint Observational probabilities P(x, y) get
+        a Dirichlet posterior over the 4 (x, y) cells, with parameters
+        counts + prior. O_{y|x} and P(x) are calculated from each draw of
+        P(x, y). For each arm x of the RCT, E_{1|x} gets a Beta posterior
+        with parameters (count of y=1) + prior, (count of y=0) + prior.
+        Every draw is then pushed through the BatchBounder logic.
+
+        The draws are generated in chunks of draws, each chunk with a
+        single batched call to the random generator and a single call to
+        BatchBounder, so S=10^4 draws over 10^3 strata take seconds.
+        chunk_size caps the memory used by the temporaries.
+
+        Attributes
+        ----------
+        draws : np.array[shape=(S, N, 3, 2)], None
+            PNS3 bounds of each draw, set by sample()
+        exogeneity : bool
+        exp_counts : np.array[shape=(N, 2, 2)], None
+            exp_counts[n, y, x]
+        monotonicity : bool
+        obs_counts : np.array[shape=(N, 2, 2)]
+            obs_counts[n, y, x]
+        prior : float
+            pseudo-count added to every cell (1 is the uniform prior)
+        strong_exo : bool
+
+        Parameters
+        ----------
+        obs_counts : np.array[shape=(N, 2, 2)]
+        exp_counts : np.array[shape=(N, 2, 2)], None
+            Strata with no Experimental records in some arm x are treated
+            as having no Experimental data.
+        prior : float
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+        """
+        self.obs_counts = np.asarray(obs_counts, dtype=float)
+        self.exp_counts = None
+        if exp_counts is not None:
+            self.exp_counts = np.asarray(exp_counts, dtype=float)
+        self.prior = prior
+        self.exogeneity = exogeneity
+        self.monotonicity = monotonicity
+        self.strong_exo = strong_exo
+        self.draws = None
+
+    def draw_probs(self, rng, num_draws):
+        """
+        Draws num_draws samples of O_{y|x}, P(x) and E_{y|x} for all the
+        strata from their posteriors.
+
+        Parameters
+        ----------
+        rng : np.random.Generator
+        num_draws : int
+
+        Returns
+        -------
+        np.array[shape=(S, N, 2, 2)], np.array[shape=(S, N, 2)],
+        np.array[shape=(S, N, 2, 2)] | None
+            o_y_bar_x, px, e_y_bar_x
+
+        """
+        num_strata = len(self.obs_counts)
+        # Dirichlet draws as normalized Gamma draws
+        alpha = self.obs_counts.reshape(num_strata, 4) + self.prior
+        joint = rng.standard_gamma(alpha, size=(num_draws, num_strata, 4))
+        joint = joint.reshape(num_draws, num_strata, 2, 2)  # [y, x]
+        px = joint.sum(axis=2)
+        o_y_bar_x = joint/px[:, :, np.newaxis, :]
+        px /= px.sum(axis=2, keepdims=True)
+        if self.exp_counts is None:
+            return o_y_bar_x, px, None
+        e1 = rng.beta(self.exp_counts[:, 1, :] + self.prior,
+                      self.exp_counts[:, 0, :] + self.prior,
+                      size=(num_draws, num_strata, 2))
+        e_y_bar_x = np.stack([1 - e1, e1], axis=2)
+        no_exp = (self.exp_counts.sum(axis=1) == 0).any(axis=1)
+        e_y_bar_x[:, no_exp] = np.nan
+        return o_y_bar_x, px, e_y_bar_x
+
+    def iter_draw_chunks(self, num_draws, seed=0, chunk_size=None):
+        """
+        Generator that yields the PNS3 bounds of num_draws posterior draws,
+        chunk by chunk. Use it directly to compute streaming statistics
+        without storing all the draws.
+
+        Parameters
+        ----------
+        num_draws : int
+            S
+        seed : int
+        chunk_size : int, None
+            number of draws per chunk. None means as many as fit in
+            MAX_CHUNK_ELEMS (draw, stratum) pairs.
+
+        Yields
+        -------
+        int, np.array[shape=(C, N, 3, 2)]
+            index of the first draw of the chunk, bounds of the chunk
+
+        """
+        num_strata = len(self.obs_counts)
+        if chunk_size is None:
+            chunk_size = max(1, PosteriorSampler.MAX_CHUNK_ELEMS//num_strata)
+        rng = np.random.default_rng(seed)
+        for start in range(0, num_draws, chunk_size):
+            size = min(chunk_size, num_draws - start)
+            o_y_bar_x, px, e_y_bar_x = self.draw_probs(rng, size)
+            if e_y_bar_x is not None:
+                e_y_bar_x = e_y_bar_x.reshape(-1, 2, 2)
+            bds = BatchBounder.calc_pns3_bds(
+                o_y_bar_x.reshape(-1, 2, 2),
+                px.reshape(-1, 2),
+                e_y_bar_x,
+                exogeneity=self.exogeneity,
+                monotonicity=self.monotonicity,
+                strong_exo=self.strong_exo)
+            yield start, bds.reshape(size, num_strata, 3, 2)
+
+    def sample(self, num_draws, seed=0, chunk_size=None, dtype=np.float64):
+        """
+        Draws num_draws posterior samples of the PNS3 bounds of all the
+        strata and stores them in self.draws.
+
+        Parameters
+        ----------
+        num_draws : int
+            S
+        seed : int
+        chunk_size : int, None
+            see iter_draw_chunks()
+        dtype : np.dtype
+            dtype of self.draws. np.float32 halves its memory.
+
+        Returns
+        -------
+        np.array[shape=(S, N, 3, 2)]
+
+        """
+        num_strata = len(self.obs_counts)
+        self.draws = np.empty(shape=(num_draws, num_strata, 3, 2),
+                              dtype=dtype)
+        for start, bds in self.iter_draw_chunks(num_draws, seed, chunk_size):
+            self.draws[start:start + len(bds)] = bds
+        return self.draws
+
+    def get_mean_pns3_bds(self):
+        """
+        Returns the posterior mean of the PNS3 bounds. Must be called after
+        sample().
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)]
+
+        """
+        return self.draws.mean(axis=0)
+
+    def get_prob_pns_low_above(self, threshold):
+        """
+        Returns P(PNS_low > threshold) for each stratum. Must be called
+        after sample().
+
+        Parameters
+        ----------
+        threshold : float
+
+        Returns
+        -------
+        np.array[shape=(N, )]
+
+        """
+        return (self.draws[:, :, 0, 0] > threshold).mean(axis=0)
+
+    def get_credible_bands(self, percentiles=(2.5, 97.5)):
+        """
+        Returns equal-tailed posterior credible bands for each end of each
+        bound. Must be called after sample().
+
+        Parameters
+        ----------
+        percentiles : tuple[float, float]
+
+        Returns
+        -------
+        np.array[shape=(N, 3, 2)], np.array[shape=(N, 3, 2)]
+            lower and upper percentiles
+
+        """
+        lo, hi = np.percentile(self.draws, percentiles, axis=0)
+        return lo, hi
+
+
+if __name__ == "__main__":
+    import time
+
+    def main():
+        # counts[n, y, x]
+        obs_counts = np.array([[[90, 511],
+                                [210, 189]],
+                               [[90, 210],
+                                [210, 490]]])
+        exp_counts = np.array([[[395, 260],
+                                [105, 240]],
+                               [[395, 255],
+                                [105, 245]]])
+        sampler = PosteriorSampler(obs_counts, exp_counts)
+        sampler.sample(10000)
+        print("posterior mean of PNS3 bounds:\n",
+              sampler.get_mean_pns3_bds())
+        print("P(PNS_low > .25)=", sampler.get_prob_pns_low_above(.25))
+
+        rng = np.random.default_rng(0)
+        obs_counts = rng.integers(0, 500, size=(1000, 2, 2))
+        exp_counts = rng.integers(0, 500, size=(1000, 2, 2))
+        sampler = PosteriorSampler(obs_counts, exp_counts)
+        start = time.time()
+        sampler.sample(10000, dtype=np.float32)
+        print("S=10^4 draws over N=10^3 strata: %.1f s"
+              % (time.time() - start))
+
+    main()
@@ -0,0 +1,255 @@
+import numpy as np
+from BatchBounder import BatchBounder
+
+
+class Strata(BatchBounder):
+    def __init__(self, names, o_y_bar_x, px, weights, e_y_bar_x=None):
+        """
+        This class holds a collection of K strata (e.g., male/female, or age
+        band x sex x comorbidity) together with their weights P_g, where g
+        labels the stratum. It replaces the pair of Bounder objects
+        bounder_m, bounder_f and the weight pmale that used to be hard-coded
+        in class Widgeter.
+
+        All the per-stratum data is stored in contiguous NumPy arrays (one
+        slot per stratum), inherited from class BatchBounder, so the
+        per-stratum bounds are calculated with a single vectorized call.
+        Adding a stratum costs nothing beyond its array slot.
+
+        The aggregates over strata are calculated with the backdoor
+        adjustment formulas
+
+        ATE = sum_g ATE_g P_g
+
+        PNS = sum_g PNS_g P_g
+
+        so the aggregate PNS bounds are the P_g weighted sums of the
+        per-stratum PNS bounds.
+
+        Attributes
+        ----------
+        names : list[str]
+            names of the strata
+        weights : np.array[shape=(K, )]
+            P_g, normalized so that they sum to 1
+
+        Parameters
+        ----------
+        names : list[str]
+        o_y_bar_x : np.array[shape=(K, 2, 2)]
+            O_{y|x,g}
+        px : np.array[shape=(K, 2)]
+            P(x|g)
+        weights : np.array[shape=(K, )]
+            P_g. They need not be normalized.
+        e_y_bar_x : np.array[shape=(K, 2, 2)], None
+            E_{y|x,g}. Rows containing a NaN mean no Experimental data for
+            that stratum.
+        """
+        # copies, because set_stratum() writes into the arrays
+        if e_y_bar_x is not None:
+            e_y_bar_x = np.array(e_y_bar_x, dtype=float)
+        BatchBounder.__init__(self,
+                              np.array(o_y_bar_x, dtype=float),
+                              np.array(px, dtype=float),
+                              e_y_bar_x)
+        self.names = list(names)
+        if len(self.names) != self.num_strata:
+            raise ValueError("there are %d names for %d strata"
+                             % (len(self.names), self.num_strata))
+        self.weights = None
+        self.set_weights(weights)
+
+    def get_stratum_label(self, n):
+        """
+        Returns the name of stratum n. Used by the print methods.
+
+        Parameters
+        ----------
+        n : int
+
+        Returns
+        -------
+        str
+
+        """
+        return self.names[n]
+
+    def get_index(self, name):
+        """
+        Returns the index of the stratum with name name.
+
+        Parameters
+        ----------
+        name : str
+
+        Returns
+        -------
+        int
+
+        """
+        return self.names.index(name)
+
+    def set_weights(self, weights):
+        """
+        Sets the weights P_g of the strata, after normalizing them so that
+        they sum to 1.
+
+        Parameters
+        ----------
+        weights : np.array[shape=(K, )]
+
+        Returns
+        -------
+        None
+
+        """
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (self.num_strata, ):
+            raise ValueError("weights must have shape (%d, ), not %s"
+                             % (self.num_strata, weights.shape))
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("weights must be non-negative, and not all 0")
+        self.weights = weights/weights.sum()
+
+    def set_stratum(self, k, o_y_bar_x=None, px=None, e_y_bar_x=None):
+        """
+        Overwrites in place the slot of stratum k of the arrays of input
+        probabilities. The inputs that are None are left unchanged. The
+        bounds are not recalculated.
+
+        Parameters
+        ----------
+        k : int
+        o_y_bar_x : np.array[shape=(2, 2)], None
+            O_{y|x,k}
+        px : np.array[shape=(2, )], None
+            P(x|k)
+        e_y_bar_x : np.array[shape=(2, 2)], None
+            E_{y|x,k}
+
+        Returns
+        -------
+        None
+
+        """
+        if o_y_bar_x is not None:
+            self.o_y_bar_x[k] = o_y_bar_x
+        if px is not None:
+            self.px[k] = px
+        if e_y_bar_x is not None:
+            if self.e_y_bar_x is None:
+                self.e_y_bar_x = np.full(
+                    shape=(self.num_strata, 2, 2), fill_value=np.nan)
+            self.e_y_bar_x[k] = e_y_bar_x
+
+    def add_stratum(self, name, o_y_bar_x, px, weight, e_y_bar_x=None):
+        """
+        Appends a new stratum at the end of the collection. The weights
+        are renormalized.
+
+        Parameters
+        ----------
+        name : str
+        o_y_bar_x : np.array[shape=(2, 2)]
+        px : np.array[shape=(2, )]
+        weight : float
+            unnormalized P_g, on the same scale as the current weights
+        e_y_bar_x : np.array[shape=(2, 2)], None
+
+        Returns
+        -------
+        None
+
+        """
+        self.names.append(name)
+        self.o_y_bar_x = np.concatenate([self.o_y_bar_x, [o_y_bar_x]])
+        self.px = np.concatenate([self.px, [px]])
+        if e_y_bar_x is None:
+            e_y_bar_x = np.full(shape=(2, 2), fill_value=np.nan)
+        if self.e_y_bar_x is not None or not np.isnan(e_y_bar_x).all():
+            if self.e_y_bar_x is None:
+                self.e_y_bar_x = np.full(
+                    shape=(self.num_strata, 2, 2), fill_value=np.nan)
+            self.e_y_bar_x = np.concatenate([self.e_y_bar_x, [e_y_bar_x]])
+        weights = np.append(self.weights, weight)
+        self.num_strata += 1
+        self.set_weights(weights)
+        for attr in ['left_bds_e_y_bar_x', 'right_bds_e_y_bar_x']:
+            setattr(self, attr, np.concatenate(
+                [getattr(self, attr), np.zeros(shape=(1, 2, 2))]))
+        self.pns3_bds = np.concatenate(
+            [self.pns3_bds, np.zeros(shape=(1, 3, 2))])
+
+    def get_weighted_ate(self):
+        """
+        Returns ATE = sum_g ATE_g P_g, or None if there is no Experimental
+        data. It is NaN if some stratum has no Experimental data.
+
+        Returns
+        -------
+        float, None
+
+        """
+        ate = self.get_ate()
+        if ate is None:
+            return None
+        return float(ate @ self.weights)
+
+    def get_agg_pns_bds(self):
+        """
+        Returns the bounds on the aggregate PNS = sum_g PNS_g P_g. Must be
+        called after set_pns3_bds().
+
+        Returns
+        -------
+        np.array[shape=(2, )]
+            [PNS_low, PNS_high]
+
+        """
+        return self.weights @ self.pns3_bds[:, 0, :]
+
+    def print_agg(self):
+        """
+        Prints the weighted ATE and the bounds on the aggregate PNS.
+
+        Returns
+        -------
+        None
+
+        """
+        ate = self.get_weighted_ate()
+        if ate is not None:
+            print("ATE=", "%.3f" % ate)
+        pns_bds = self.get_agg_pns_bds()
+        print("%.3f <= PNS <= %.3f" % (pns_bds[0], pns_bds[1]))
+
+
+if __name__ == "__main__":
+    def main():
+        # same female and male strata as in Bounder.main()
+        e_y_bar_x = np.array([[[.79, .52],
+                               [.21, .48]],
+                              [[.79, .51],
+                               [.21, .49]]])
+        o_y_bar_x = np.array([[[.3, .73],
+                               [.7, .27]],
+                              [[.3, .3],
+                               [.7, .7]]])
+        px = np.array([[.3, .7],
+                       [.3, .7]])
+        strata = Strata(['f', 'm'], o_y_bar_x, px, [.5, .5],
+                        e_y_bar_x=e_y_bar_x)
+        strata.add_stratum('x',
+                           np.array([[.4, .6], [.6, .4]]),
+                           np.array([.5, .5]),
+                           .25)
+        strata.print_all_probs("_")
+        strata.set_exp_probs_bds()
+        strata.set_pns3_bds()
+        strata.print_pns3_bds("_")
+        print("weights=", strata.weights)
+        print("ATE_g=", strata.get_ate())
+        strata.print_agg()
+
+    main()
@@ -0,0 +1,368 @@
+import numpy as np
+from BatchBounder import BatchBounder
+from Strata import Strata
+
+
+class StrataTree:
+    # columns of the terms summed up the tree
+    TERM_NAMES = ('weight', 'weighted_ate', 'weighted_pns_low',
+                  'weighted_pns_high')
+
+    def __init__(self, strata, paths, levels=None):
+        """
+        This class arranges the strata of a Strata object (the leaves) in
+        a tree, e.g., sex, then age band, then comorbidity, and aggregates
+        the weighted ATE and PNS bounds at every node of the tree. The
+        aggregates of a node are those of class Strata restricted to the
+        leaves below it, with the weights conditioned on the node:
+
+        ATE_node = sum_g ATE_g P_g / P_node
+
+        PNS_node = sum_g PNS_g P_g / P_node
+
+        where g runs over the leaves below the node and P_node = sum_g P_g.
+        The root aggregates equal Strata.get_weighted_ate() and
+        Strata.get_agg_pns_bds().
+
+        The leaf bounds are calculated by one vectorized call of
+        Strata.set_pns3_bds(). The nodes of each level are stored in
+        arrays, sorted by path, so the children of each node are a
+        contiguous run of the next level down. aggregate() then sums the
+        terms w_g, w_g*ATE_g and w_g*PNS_g bounds up the tree, one level at
+        a time, with one segment reduction (np.add.reduceat) per level.
+
+        set_leaf() changes one leaf, recalculates only its bounds, and
+        re-aggregates only its ancestors, each from its own children, in
+        O(depth*branching) time.
+
+        Attributes
+        ----------
+        leaf_pos : np.array[shape=(K, ), dtype=int]
+            leaf_pos[k] is the position of stratum k in the last level
+        leaf_weights : np.array[shape=(K, )]
+            unnormalized weights of the strata. Node aggregates are ratios
+            of sums, so they don't need normalized weights, and changing
+            one weight only changes its ancestors.
+        levels : list[str]
+            names of the levels below the root, e.g., ['sex', 'age',
+            'comorbidity']
+        node_children : list[np.array[shape=(M_d + 1, ), dtype=int]]
+            children of node j of level d are nodes node_children[d][j]
+            to node_children[d][j + 1] - 1 of level d + 1. One entry per
+            level but the last.
+        node_parents : list[np.array[shape=(M_d, ), dtype=int]]
+            index in level d - 1 of the parent of each node of level d. The
+            entry of the root level is empty.
+        node_paths : list[list[tuple]]
+            paths of the M_d nodes of level d, sorted. Level 0 is the root,
+            with path (), and the last level holds the strata.
+        node_terms : list[np.array[shape=(M_d, 4)]]
+            sums of the terms TERM_NAMES over the leaves below each node
+        path_to_node : dict[tuple, tuple[int, int]]
+            (level, index) of the node of each path
+        strata : Strata
+
+        Parameters
+        ----------
+        strata : Strata
+        paths : list[tuple]
+            path of each stratum, e.g., ('m', '18-40', 'diabetic'). All
+            the paths have the same length, the depth of the tree, and are
+            distinct.
+        levels : list[str], None
+            None means ['level1', 'level2', ...]
+        """
+        paths = [tuple(path) for path in paths]
+        if len(paths) != strata.num_strata:
+            raise ValueError("there are %d paths for %d strata"
+                             % (len(paths), strata.num_strata))
+        depth = len(paths[0]) if paths else 0
+        if depth == 0 or any(len(path) != depth for path in paths):
+            raise ValueError("the paths must all have the same length > 0")
+        if len(set(paths)) != len(paths):
+            raise ValueError("the paths must be distinct")
+        if levels is None:
+            levels = ['level%d' % (d + 1) for d in range(depth)]
+        if len(levels) != depth:
+            raise ValueError("there are %d levels for paths of length %d"
+                             % (len(levels), depth))
+        self.strata = strata
+        self.levels = list(levels)
+
+        # leaves sorted by path make every subtree a contiguous run
+        order = sorted(range(len(paths)), key=lambda k: paths[k])
+        self.leaf_pos = np.empty(len(paths), dtype=int)
+        self.leaf_pos[order] = np.arange(len(paths))
+        self.node_paths = [[()]]
+        self.node_parents = [np.zeros(0, dtype=int)]
+        self.node_children = []
+        leaf_paths = [paths[k] for k in order]
+        for d in range(1, depth + 1):
+            prefixes = [path[:d] for path in leaf_paths]
+            is_new = [True] + [prefixes[i] != prefixes[i - 1]
+                               for i in range(1, len(prefixes))]
+            level_paths = [p for p, new in zip(prefixes, is_new) if new]
+            parent_index = {p: j for j, p in enumerate(self.node_paths[-1])}
+            parents = np.array([parent_index[p[:-1]] for p in level_paths],
+                               dtype=int)
+            # parents are sorted, so each one's children are a run
+            self.node_children.append(np.searchsorted(
+                parents, np.arange(len(self.node_paths[-1]) + 1)))
+            self.node_paths.append(level_paths)
+            self.node_parents.append(parents)
+        self.path_to_node = {path: (d, j)
+                             for d, level_paths in enumerate(self.node_paths)
+                             for j, path in enumerate(level_paths)}
+        self.leaf_weights = np.array(strata.weights, dtype=float)
+        self.node_terms = [np.zeros(shape=(len(level_paths), 4))
+                           for level_paths in self.node_paths]
+        self.refresh()
+
+    def get_leaf_terms(self, rows):
+        """
+        Returns the terms TERM_NAMES of some strata.
+
+        Parameters
+        ----------
+        rows : np.array[dtype=int]
+            indices of the strata
+
+        Returns
+        -------
+        np.array[shape=(len(rows), 4)]
+
+        """
+        weights = self.leaf_weights[rows]
+        ate = self.strata.get_ate()
+        ate = np.zeros(len(rows)) if ate is None else ate[rows]
+        return np.column_stack([
+            weights, weights*ate,
+            weights[:, np.newaxis]*self.strata.pns3_bds[rows, 0, :]])
+
+    def refresh(self):
+        """
+        Recalculates the bounds of all the leaves with one vectorized
+        call, then aggregates them up the whole tree. Call it after
+        changing the constraint flags of self.strata.
+
+        Returns
+        -------
+        None
+
+        """
+        self.strata.set_exp_probs_bds()
+        self.strata.set_pns3_bds()
+        self.aggregate()
+
+    def aggregate(self):
+        """
+        Sums the terms of the leaves up every level of the tree, bottom-up,
+        with one segment reduction per level.
+
+        Returns
+        -------
+        None
+
+        """
+        rows = np.arange(self.strata.num_strata)
+        self.node_terms[-1][self.leaf_pos] = self.get_leaf_terms(rows)
+        for d in range(len(self.node_terms) - 2, -1, -1):
+            self.node_terms[d] = np.add.reduceat(
+                self.node_terms[d + 1], self.node_children[d][:-1], axis=0)
+
+    def set_leaf(self, k, o_y_bar_x=None, px=None, e_y_bar_x=None,
+                 weight=None):
+        """
+        Changes stratum k, recalculates its bounds, and re-aggregates its
+        ancestors only. The inputs that are None are left unchanged.
+
+        Parameters
+        ----------
+        k : int, tuple
+            index or path of the stratum
+        o_y_bar_x : np.array[shape=(2, 2)], None
+        px : np.array[shape=(2, )], None
+        e_y_bar_x : np.array[shape=(2, 2)], None
+        weight : float, None
+            unnormalized weight, on the same scale as the current ones
+
+        Returns
+        -------
+        None
+
+        """
+        strata = self.strata
+        if isinstance(k, tuple):
+            k = int(np.flatnonzero(self.leaf_pos ==
+                                   self.path_to_node[k][1])[0])
+        strata.set_stratum(k, o_y_bar_x, px, e_y_bar_x)
+        if weight is not None:
+            self.leaf_weights[k] = weight
+            strata.set_weights(self.leaf_weights)
+        rows = slice(k, k + 1)
+        flags = [flag if np.ndim(flag) == 0 else flag[rows]
+                 for flag in [strata.exogeneity, strata.monotonicity,
+                              strata.strong_exo]]
+        left, right = BatchBounder.calc_exp_probs_bds(
+            strata.o_y_bar_x[rows], strata.px[rows], flags[1])
+        strata.left_bds_e_y_bar_x[k] = left[0]
+        strata.right_bds_e_y_bar_x[k] = right[0]
+        strata.pns3_bds[k] = BatchBounder.calc_pns3_bds(
+            strata.o_y_bar_x[rows], strata.px[rows],
+            None if strata.e_y_bar_x is None else strata.e_y_bar_x[rows],
+            *flags)[0]
+
+        j = self.leaf_pos[k]
+        self.node_terms[-1][j] = self.get_leaf_terms(np.array([k]))[0]
+        for d in range(len(self.node_terms) - 2, -1, -1):
+            j = self.node_parents[d + 1][j]
+            start, stop = self.node_children[d][j:j + 2]
+            self.node_terms[d][j] = self.node_terms[d + 1][start:stop].sum(
+                axis=0)
+
+    def get_node_terms(self, path=()):
+        """
+        Returns the summed terms of the node with path path.
+
+        Parameters
+        ----------
+        path : tuple
+            () is the root
+
+        Returns
+        -------
+        np.array[shape=(4, )]
+
+        """
+        d, j = self.path_to_node[tuple(path)]
+        return self.node_terms[d][j]
+
+    def get_weight(self, path=()):
+        """
+        Returns P_node, the normalized weight of a node.
+
+        Parameters
+        ----------
+        path : tuple
+
+        Returns
+        -------
+        float
+
+        """
+        return float(self.get_node_terms(path)[0]/self.node_terms[0][0, 0])
+
+    def get_weighted_ate(self, path=()):
+        """
+        Returns ATE_node = sum_g ATE_g P_g / P_node, or None if there is no
+        Experimental data. It is NaN if some leaf below the node has no
+        Experimental data.
+
+        Parameters
+        ----------
+        path : tuple
+
+        Returns
+        -------
+        float, None
+
+        """
+        if self.strata.e_y_bar_x is None:
+            return None
+        terms = self.get_node_terms(path)
+        return float(terms[1]/terms[0])
+
+    def get_agg_pns_bds(self, path=()):
+        """
+        Returns the bounds on PNS_node = sum_g PNS_g P_g / P_node.
+
+        Parameters
+        ----------
+        path : tuple
+
+        Returns
+        -------
+        np.array[shape=(2, )]
+            [PNS_low, PNS_high]
+
+        """
+        terms = self.get_node_terms(path)
+        return terms[2:]/terms[0]
+
+    def get_level_aggs(self, d):
+        """
+        Returns the aggregates of all the nodes of level d at once.
+
+        Parameters
+        ----------
+        d : int
+            0 is the root, len(self.levels) the strata
+
+        Returns
+        -------
+        list[tuple], np.array[shape=(M_d, )], np.array[shape=(M_d, )],
+        np.array[shape=(M_d, 2)]
+            paths, weights P_node, ATE_node (NaN without Experimental
+            data), PNS_node bounds
+
+        """
+        terms = self.node_terms[d]
+        weights = terms[:, 0]
+        ate = terms[:, 1]/weights
+        if self.strata.e_y_bar_x is None:
+            ate = np.full_like(weights, np.nan)
+        return (self.node_paths[d], weights/self.node_terms[0][0, 0], ate,
+                terms[:, 2:]/weights[:, np.newaxis])
+
+    def print_tree(self):
+        """
+        Prints the weight, ATE and PNS bounds of every node, depth first.
+
+        Returns
+        -------
+        None
+
+        """
+        for path in sorted(self.path_to_node):
+            d = len(path)
+            name = ' / '.join(path) if path else 'all'
+            pns_bds = self.get_agg_pns_bds(path)
+            ate = self.get_weighted_ate(path)
+            ate_str = '' if ate is None else ", ATE=%.3f" % ate
+            print("%s%s: P=%.3f%s, %.3f <= PNS <= %.3f"
+                  % ('    '*d, name, self.get_weight(path), ate_str,
+                     pns_bds[0], pns_bds[1]))
+
+
+if __name__ == "__main__":
+    import itertools
+
+    def main():
+        rng = np.random.default_rng(0)
+        paths = list(itertools.product(['f', 'm'], ['<40', '40-65', '>65'],
+                                       ['healthy', 'comorbid']))
+        num_strata = len(paths)
+        o1 = rng.uniform(.2, .8, size=(num_strata, 2))
+        o_y_bar_x = np.stack([1 - o1, o1], axis=1)
+        px1 = rng.uniform(.2, .8, size=num_strata)
+        px = np.stack([1 - px1, px1], axis=1)
+        left, right = BatchBounder.calc_exp_probs_bds(o_y_bar_x, px)
+        e1 = rng.uniform(left[:, 1], right[:, 1])
+        e_y_bar_x = np.stack([1 - e1, e1], axis=1)
+        strata = Strata(['_'.join(path) for path in paths], o_y_bar_x,
+                        px, rng.uniform(1, 10, size=num_strata),
+                        e_y_bar_x=e_y_bar_x)
+        tree = StrataTree(strata, paths,
+                          levels=['sex', 'age', 'comorbidity'])
+        tree.print_tree()
+        assert np.isclose(tree.get_weighted_ate(),
+                          strata.get_weighted_ate())
+        assert np.allclose(tree.get_agg_pns_bds(), strata.get_agg_pns_bds())
+
+        # one leaf changes, only its 3 ancestors are re-aggregated
+        tree.set_leaf(('m', '>65', 'comorbid'),
+                      e_y_bar_x=np.array([[.6, .3], [.4, .7]]), weight=20.)
+        print()
+        tree.print_tree()
+
+    main()
@@ -0,0 +1,217 @@
+import numpy as np
+from BatchBounder import BatchBounder
+
+
+class Sweeper:
+    # the five degrees of freedom, in the order of the Bounder docstring
+    DOF_NAMES = ('o1b0', 'o1b1', 'px1', 'e1b0', 'e1b1')
+
+    def __init__(self, axes, fixed=None, exogeneity=False,
+                 monotonicity=False, strong_exo=False,
+                 tol=BatchBounder.COMPAT_TOL):
+        """
+        This class evaluates the PNS3 bounds over a dense grid of the five
+        degrees of freedom O_{1|0}, O_{1|1}, P(x=1), E_{1|0} and E_{1|1}.
+        It is the batch counterpart of dragging the sliders of
+        Widgeter.run_gui() one plot refresh at a time.
+
+        The grid is the Cartesian product of the values in axes. The dofs
+        that are not in axes are held at the values in fixed. If neither
+        E_{1|0} nor E_{1|1} is given, the grid has no Experimental data.
+
+        Grid points whose E_{y|x} lies outside the bounds that O_{y|x} and
+        P(x) impose on it (see Bounder.set_exp_probs_bds()) are infeasible,
+        and their PNS3 bounds are set to NaN.
+
+        run() walks the grid in chunks of flat indices, so memory stays
+        bounded, and can write the results to an on-disk .npy memmap, so
+        grids of 10^8 points fit.
+
+        Attributes
+        ----------
+        axes : dict[str, np.array[shape=(L, )]]
+            values of each swept dof, in the order given
+        exogeneity : bool
+        fixed : dict[str, float]
+            values of the dofs that are not swept
+        grid_shape : tuple[int]
+            lengths of the axes
+        monotonicity : bool
+        num_infeasible : int, None
+            number of infeasible grid points, set by run()
+        num_points : int
+            total number of grid points
+        strong_exo : bool
+        tol : float
+            E_{y|x} violations smaller than or equal to tol are tolerated
+
+        Parameters
+        ----------
+        axes : dict[str, list[float]]
+            keys must be in Sweeper.DOF_NAMES
+        fixed : dict[str, float], None
+        exogeneity : bool
+        monotonicity : bool
+        strong_exo : bool
+        tol : float
+        """
+        fixed = fixed or {}
+        for name in list(axes) + list(fixed):
+            if name not in Sweeper.DOF_NAMES:
+                raise ValueError("unknown dof %r, expected one of %s"
+                                 % (name, Sweeper.DOF_NAMES))
+            if name in axes and name in fixed:
+                raise ValueError("dof %r is both swept and fixed" % name)
+        for name in Sweeper.DOF_NAMES[:3]:
+            if name not in axes and name not in fixed:
+                raise ValueError("dof %r must be swept or fixed" % name)
+        given_e = [name in axes or name in fixed
+                   for name in Sweeper.DOF_NAMES[3:]]
+        if any(given_e) and not all(given_e):
+            raise ValueError("e1b0 and e1b1 must both be given or both be "
+                             "omitted")
+
+        self.axes = {name: np.asarray(vals, dtype=float).ravel()
+                     for name, vals in axes.items()}
+        self.fixed = dict(fixed)
+        self.exogeneity = exogeneity
+        self.monotonicity = monotonicity
+        self.strong_exo = strong_exo
+        self.tol = tol
+        self.grid_shape = tuple(len(vals) for vals in self.axes.values())
+        self.num_points = int(np.prod(self.grid_shape, dtype=np.int64))
+        self.num_infeasible = None
+
+    def has_exp(self):
+        """
+        Returns True iff the grid has Experimental data.
+
+        Returns
+        -------
+        bool
+
+        """
+        return 'e1b0' in self.axes or 'e1b0' in self.fixed
+
+    def get_points(self, start, stop):
+        """
+        Returns the values of the five dofs at the grid points with flat
+        (C order) indices start to stop - 1.
+
+        Parameters
+        ----------
+        start : int
+        stop : int
+
+        Returns
+        -------
+        dict[str, np.array[shape=(C, )]]
+
+        """
+        flat = np.arange(start, stop, dtype=np.int64)
+        indices = np.unravel_index(flat, self.grid_shape)
+        points = {}
+        for (name, vals), index in zip(self.axes.items(), indices):
+            points[name] = vals[index]
+        for name, val in self.fixed.items():
+            points[name] = np.full(len(flat), val, dtype=float)
+        return points
+
+    def calc_chunk(self, start, stop):
+        """
+        Returns the PNS3 bounds at the grid points with flat indices start
+        to stop - 1, with NaN bounds at the infeasible points.
+
+        Parameters
+        ----------
+        start : int
+        stop : int
+
+        Returns
+        -------
+        np.array[shape=(C, 3, 2)], np.array[shape=(C, ), dtype=bool]
+            pns3_bds, feasible
+
+        """
+        p = self.get_points(start, stop)
+        exp_dofs = [p['e1b0'], p['e1b1']] if self.has_exp() else []
+        o_y_bar_x, px, e_y_bar_x = BatchBounder.get_probs_from_dofs(
+            p['o1b0'], p['o1b1'], p['px1'], *exp_dofs)
+        left, right = BatchBounder.calc_exp_probs_bds(
+            o_y_bar_x, px, self.monotonicity)
+        feasible, _ = BatchBounder.calc_exp_compatibility(
+            e_y_bar_x, left, right, self.tol)
+        pns3_bds = BatchBounder.calc_pns3_bds(
+            o_y_bar_x, px, e_y_bar_x,
+            exogeneity=self.exogeneity,
+            monotonicity=self.monotonicity,
+            strong_exo=self.strong_exo)
+        pns3_bds[~feasible] = np.nan
+        return pns3_bds, feasible
+
+    def run(self, path=None, chunk_size=1 << 20, dtype=np.float64):
+        """
+        Evaluates the PNS3 bounds over the whole grid, chunk by chunk.
+
+        Parameters
+        ----------
+        path : str, None
+            If not None, the results are streamed to an .npy file at this
+            path (open it later with np.load(path, mmap_mode='r')).
+            Otherwise they are kept in memory.
+        chunk_size : int
+            number of grid points per chunk
+        dtype : np.dtype
+            dtype of the results
+
+        Returns
+        -------
+        np.array[shape=(*grid_shape, 3, 2)]
+            pns3_bds, NaN at the infeasible points. A np.memmap if path is
+            not None.
+
+        """
+        shape = (*self.grid_shape, 3, 2)
+        if path is None:
+            out = np.empty(shape=shape, dtype=dtype)
+        else:
+            out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                            shape=shape)
+        flat_out = out.reshape(self.num_points, 3, 2)
+        self.num_infeasible = 0
+        for start in range(0, self.num_points, chunk_size):
+            stop = min(start + chunk_size, self.num_points)
+            pns3_bds, feasible = self.calc_chunk(start, stop)
+            flat_out[start:stop] = pns3_bds
+            self.num_infeasible += int(np.count_nonzero(~feasible))
+        if path is not None:
+            out.flush()
+        return out
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    def main():
+        # 21^4 x 9 grid, about 1.7 x 10^6 points
+        axis = np.linspace(0, 1, 21)
+        sweeper = Sweeper(
+            axes={'o1b0': axis, 'o1b1': axis, 'px1': np.linspace(.1, .9, 9),
+                  'e1b0': axis, 'e1b1': axis},
+            exogeneity=False, monotonicity=False)
+        path = os.path.join(tempfile.mkdtemp(), "sweep.npy")
+        start = time.time()
+        sweeper.run(path)
+        print("%d points in %.1f s, %d infeasible"
+              % (sweeper.num_points, time.time() - start,
+                 sweeper.num_infeasible))
+        bds = np.load(path, mmap_mode='r')
+        print("grid shape:", bds.shape)
+        pns_low = bds[..., 0, 0]
+        print("max PNS lower bound over feasible points: %.3f"
+              % np.nanmax(pns_low))
+        os.remove(path)
+
+    main()
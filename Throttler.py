@@ -0,0 +1,218 @@
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Throttler:
+    def __init__(self, compute_fun, render_fun, interval=.05, debounce=0.,
+                 max_delay=.25):
+        """
+        This class sits between the observers of GUI events (e.g., slider
+        drags) and a slow compute + render path. Each event calls
+        request() with the current state. The state is computed by
+        compute_fun in a worker thread, off the event loop, and its result
+        is rendered by render_fun on the event loop.
+
+        compute_fun runs concurrently with the event loop, so it should
+        compute from the state passed to request() and return its result
+        without assigning it to shared state. render_fun, which runs on
+        the event loop, is the place to assign it.
+
+        At most one computation runs at a time. Requests that arrive while
+        it runs only overwrite the pending state, so a fast drag queues at
+        most one computation, not one per pixel. A result whose state has
+        been superseded by a newer request when its computation ends is
+        discarded without rendering, and the latest state is computed
+        instead, unless nothing has been rendered for max_delay seconds,
+        so the plot keeps following a long, fast drag. The latest state is
+        always rendered eventually.
+
+        Renders are throttled to at most one per interval seconds. If
+        debounce > 0, a computation only starts after the requests have
+        paused for debounce seconds.
+
+        If there is no running asyncio event loop (e.g., outside Jupyter),
+        request() computes and renders synchronously.
+
+        Attributes
+        ----------
+        compute_fun : function
+            called as result = compute_fun(*args) in the worker thread
+        debounce : float
+            seconds without requests before a computation starts
+        executor : ThreadPoolExecutor
+            single worker thread that runs compute_fun
+        interval : float
+            minimum number of seconds between the starts of two renders
+        last_render_time : float
+            time.monotonic() of the start of the last render
+        last_request_time : float
+            time.monotonic() of the last request
+        latest_args : tuple
+            state of the latest request
+        latest_gen : int
+            number of requests so far. Each request gets the next number.
+        max_delay : float
+            a stale result is rendered anyway if nothing has been rendered
+            for max_delay seconds
+        num_computed : int
+            number of computations so far
+        num_discarded : int
+            number of computed results discarded because they were stale
+        num_rendered : int
+            number of renders so far
+        render_fun : function
+            called as render_fun(result) on the event loop
+        rendered_gen : int
+            number of the request whose result was rendered last
+        task : asyncio.Task, None
+            the task that drains the pending requests, None if idle
+
+        Parameters
+        ----------
+        compute_fun : function
+        render_fun : function
+        interval : float
+        debounce : float
+        max_delay : float
+        """
+        self.compute_fun = compute_fun
+        self.render_fun = render_fun
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+        self.latest_args = ()
+        self.latest_gen = 0
+        self.rendered_gen = 0
+        self.last_request_time = 0.
+        self.last_render_time = -float('inf')
+        self.num_computed = 0
+        self.num_discarded = 0
+        self.num_rendered = 0
+
+    def request(self, *args):
+        """
+        Asks for the state args to be computed and rendered, superseding
+        all the previous requests that haven't been rendered yet.
+
+        Parameters
+        ----------
+        args : tuple
+            arguments of compute_fun
+
+        Returns
+        -------
+        None
+
+        """
+        self.latest_args = args
+        self.latest_gen += 1
+        self.last_request_time = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self.render_fun(self.compute(args))
+            self.rendered_gen = self.latest_gen
+            self.num_rendered += 1
+            return
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.drain())
+
+    def compute(self, args):
+        """
+        Calls compute_fun(*args) and counts the call.
+
+        Parameters
+        ----------
+        args : tuple
+
+        Returns
+        -------
+        object
+            the result of compute_fun
+
+        """
+        self.num_computed += 1
+        return self.compute_fun(*args)
+
+    async def drain(self):
+        """
+        Coroutine that computes and renders the latest state until no
+        request is pending.
+
+        Returns
+        -------
+        None
+
+        """
+        loop = asyncio.get_running_loop()
+        while self.rendered_gen < self.latest_gen:
+            wait = max(self.last_render_time + self.interval,
+                       self.last_request_time + self.debounce) \
+                - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            gen, args = self.latest_gen, self.latest_args
+            try:
+                result = await loop.run_in_executor(self.executor,
+                                                    self.compute, args)
+            except Exception:
+                traceback.print_exc()
+                self.rendered_gen = gen
+                continue
+            now = time.monotonic()
+            if gen != self.latest_gen and \
+                    now - self.last_render_time < self.max_delay:
+                self.num_discarded += 1
+                continue
+            self.last_render_time = now
+            try:
+                self.render_fun(result)
+            except Exception:
+                traceback.print_exc()
+            self.rendered_gen = max(self.rendered_gen, gen)
+            self.num_rendered += 1
+
+    def is_idle(self):
+        """
+        Returns True iff no request is pending.
+
+        Returns
+        -------
+        bool
+
+        """
+        return self.rendered_gen == self.latest_gen
+
+
+if __name__ == "__main__":
+    def main():
+        rendered = []
+
+        def compute_fun(x):
+            time.sleep(.03)  # a slow recalculation
+            return x
+
+        async def drag():
+            throttler = Throttler(compute_fun, rendered.append,
+                                  interval=.05)
+            # 200 slider events, 2 ms apart
+            for x in range(200):
+                throttler.request(x)
+                await asyncio.sleep(.002)
+            while not throttler.is_idle():
+                await asyncio.sleep(.01)
+            print("requests=%d, computed=%d, discarded=%d, rendered=%d"
+                  % (throttler.latest_gen, throttler.num_computed,
+                     throttler.num_discarded, throttler.num_rendered))
+            print("last rendered state:", rendered[-1])
+
+        asyncio.run(drag())
+
+    main()
@@ -0,0 +1,521 @@
+import numpy as np
+
+
+class ValidationReport:
+    def __init__(self, num_rows):
+        """
+        This class stores the result of a Validator check of N rows. For
+        every (row, rule) pair that fails, it stores the row index, the
+        name of the array checked, the rule that failed, and by how much it
+        failed (the excess).
+
+        The failures are stored as parallel 1-dim arrays, so that reports
+        for millions of rows can be filtered and sorted with NumPy instead
+        of Python loops. add_failures() and merge() only append the arrays
+        of their failures to a list, and get_failures() concatenates the
+        list once, when the report is read, so collecting F groups of
+        failures costs O(F), not O(F^2).
+
+        Attributes
+        ----------
+        failure_chunks : list[tuple]
+            the failures, in groups. Each group is a tuple of parallel
+            arrays (rows, array_names, rules, excesses), as returned by
+            get_failures().
+        num_rows : int
+            N
+
+        Parameters
+        ----------
+        num_rows : int
+        """
+        self.num_rows = num_rows
+        self.failure_chunks = []
+
+    def add_failures(self, array_name, rule, rows, excesses):
+        """
+        Appends the failures of one rule for one array.
+
+        Parameters
+        ----------
+        array_name : str
+        rule : str
+        rows : np.array[shape=(F, ), dtype=int]
+        excesses : np.array[shape=(F, )]
+
+        Returns
+        -------
+        None
+
+        """
+        num_new = len(rows)
+        if num_new == 0:
+            return
+        self.failure_chunks.append((
+            np.asarray(rows, dtype=np.int64),
+            np.full(num_new, array_name, dtype=object),
+            np.full(num_new, rule, dtype=object),
+            np.asarray(excesses, dtype=float)))
+
+    def merge(self, other):
+        """
+        Appends the failures of another report for the same rows.
+
+        Parameters
+        ----------
+        other : ValidationReport
+
+        Returns
+        -------
+        None
+
+        """
+        if other.num_rows != self.num_rows:
+            raise ValueError("can't merge a report of %d rows into a report"
+                             " of %d rows" % (other.num_rows, self.num_rows))
+        self.failure_chunks.extend(other.failure_chunks)
+
+    def get_failures(self):
+        """
+        Returns all the failures as parallel arrays. The groups of failures
+        appended so far are concatenated on the first call after they were
+        appended, and kept concatenated.
+
+        Returns
+        -------
+        np.array[shape=(F, ), dtype=int], np.array[shape=(F, ), dtype=object],
+        np.array[shape=(F, ), dtype=object], np.array[shape=(F, )]
+            rows, array_names, rules, excesses. For each of the F failures:
+            the row index, the name of the array (e.g., 'o_y_bar_x') that
+            failed, the name of the rule that failed (one of
+            Validator.RULES), and the amount by which it failed (NaN for
+            the rule 'not_finite').
+
+        """
+        if len(self.failure_chunks) != 1:
+            if self.failure_chunks:
+                chunk = tuple(np.concatenate(arrays) for arrays in
+                              zip(*self.failure_chunks))
+            else:
+                chunk = (np.zeros(shape=(0, ), dtype=np.int64),
+                         np.zeros(shape=(0, ), dtype=object),
+                         np.zeros(shape=(0, ), dtype=object),
+                         np.zeros(shape=(0, )))
+            self.failure_chunks = [chunk]
+        return self.failure_chunks[0]
+
+    def is_valid(self):
+        """
+        Returns True iff no rule failed.
+
+        Returns
+        -------
+        bool
+
+        """
+        return all(len(chunk[0]) == 0 for chunk in self.failure_chunks)
+
+    def get_bad_rows(self):
+        """
+        Returns the sorted indices of the rows that failed at least one
+        rule.
+
+        Returns
+        -------
+        np.array[shape=(B, ), dtype=int]
+
+        """
+        return np.unique(self.get_failures()[0])
+
+    def get_bad_mask(self):
+        """
+        Returns a boolean mask which is True for the rows that failed at
+        least one rule.
+
+        Returns
+        -------
+        np.array[shape=(N, ), dtype=bool]
+
+        """
+        mask = np.zeros(self.num_rows, dtype=bool)
+        mask[self.get_failures()[0]] = True
+        return mask
+
+    def get_summary(self):
+        """
+        Returns a short human readable summary of the failures: for each
+        (array, rule) pair, the number of failing rows and the largest
+        excess.
+
+        Returns
+        -------
+        str
+
+        """
+        if self.is_valid():
+            return "all %d rows are valid" % self.num_rows
+        lines = ["%d of %d rows are invalid:"
+                 % (len(self.get_bad_rows()), self.num_rows)]
+        rows, array_names, rules, excesses = self.get_failures()
+        pairs = sorted(set(zip(array_names, rules)))
+        for array_name, rule in pairs:
+            mask = (array_names == array_name) & (rules == rule)
+            line = "    %s, %s: %d rows" % (array_name, rule, mask.sum())
+            if not np.isnan(excesses[mask]).all():
+                line += ", max excess %.3g" % np.nanmax(excesses[mask])
+            line += ", first rows %s" % rows[mask][:5].tolist()
+            lines.append(line)
+        return "\n".join(lines)
+
+    def raise_if_invalid(self):
+        """
+        Raises a ValueError with the summary of the report if any rule
+        failed.
+
+        Returns
+        -------
+        None
+
+        """
+        if not self.is_valid():
+            raise ValueError(self.get_summary())
+
+
+class Validator:
+    """
+    This class has no constructor or attributes. It consists of static
+    methods that check whole batches of probability arrays at once.
+
+    Unlike Python's assert statements, the checks are not removed by
+    "python -O", they don't stop at the first bad row, and they return a
+    ValidationReport instead of raising. The caller decides what to do
+    with the bad rows via validate(): raise, drop them, or clip and
+    renormalize them.
+
+    """
+    # tolerance for the columns of a probability matrix to sum to 1
+    TOL = 1e-5
+    # number of rows checked at a time
+    CHUNK_SIZE = 1 << 14
+    RULES = ('not_finite', 'negative', 'above_one', 'col_sum')
+    ON_ERROR_OPTIONS = ('raise', 'drop', 'clip')
+
+    @staticmethod
+    def check_trans_matrices(mats, array_name="mat", allow_nan_rows=False):
+        """
+        Checks that each of the N 2x2 transition probability matrices in
+        mats is well defined: finite, elements in [0, 1], columns summing
+        to 1.
+
+        Parameters
+        ----------
+        mats : np.array[shape=(N, 2, 2)]
+        array_name : str
+            name used in the report
+        allow_nan_rows : bool
+            If True, matrices that are all NaN are valid. This is used for
+            E_{y|x}, where a NaN row means no Experimental data.
+
+        Returns
+        -------
+        ValidationReport
+
+        """
+        mats = np.asarray(mats)
+        if mats.ndim != 3 or mats.shape[1:] != (2, 2):
+            raise ValueError("%s must have shape (N, 2, 2), not %s"
+                             % (array_name, mats.shape))
+        return Validator.check_columns(mats, array_name, allow_nan_rows)
+
+    @staticmethod
+    def check_prob_vecs(vecs, array_name="vec"):
+        """
+        Checks that each of the N probability vectors in vecs is well
+        defined: finite, elements in [0, 1], summing to 1.
+
+        Parameters
+        ----------
+        vecs : np.array[shape=(N, 2)]
+        array_name : str
+            name used in the report
+
+        Returns
+        -------
+        ValidationReport
+
+        """
+        vecs = np.asarray(vecs)
+        if vecs.ndim != 2 or vecs.shape[1] != 2:
+            raise ValueError("%s must have shape (N, 2), not %s"
+                             % (array_name, vecs.shape))
+        cols = vecs.reshape(vecs.shape[0], 2, 1)
+        return Validator.check_columns(cols, array_name, False)
+
+    @staticmethod
+    def check_columns(cols, array_name, allow_nan_rows):
+        """
+        Does the work of check_trans_matrices() and check_prob_vecs().
+
+        The rows are checked in chunks of CHUNK_SIZE rows, so that all the
+        temporaries stay in the CPU cache. Valid input is the common case,
+        so for each chunk, a few whole-chunk reductions first decide
+        whether any of its rows can fail at all. Only if some can, the
+        per-row checks are done on that chunk.
+
+        Parameters
+        ----------
+        cols : np.array[shape=(N, 2, P)]
+            N rows, each with P columns that are probability
+            distributions over 2 values
+        array_name : str
+        allow_nan_rows : bool
+
+        Returns
+        -------
+        ValidationReport
+
+        """
+        num_rows, _, num_cols = cols.shape
+        report = ValidationReport(num_rows)
+        chunk_size = Validator.CHUNK_SIZE
+        for start in range(0, num_rows, chunk_size):
+            chunk = cols[start:start + chunk_size]
+            sum_err = Validator.get_col_sums(chunk)
+            sum_err -= 1
+            np.abs(sum_err, out=sum_err)
+            # min() and max() return NaN if there is a NaN in the chunk, in
+            # which case the comparisons are False
+            if chunk.min() >= 0 and chunk.max() <= 1 and \
+                    sum_err.max() <= Validator.TOL:
+                continue
+            Validator.check_chunk_rows(
+                report, start, chunk, sum_err, array_name, allow_nan_rows)
+        return report
+
+    @staticmethod
+    def get_col_sums(chunk):
+        """
+        Returns the sums of the columns of each row of chunk.
+
+        For 2x2 matrices stored contiguously, the two elements [y, 0] and
+        [y, 1] of a row of the matrix are viewed as the real and imaginary
+        parts of a single complex number. Then one contiguous complex
+        addition sums both columns. This is an order of magnitude faster
+        than adding the strided (C, 2) slices chunk[:, 0] and chunk[:, 1].
+
+        Parameters
+        ----------
+        chunk : np.array[shape=(C, 2, P)]
+
+        Returns
+        -------
+        np.array[shape=(C, P)]
+
+        """
+        cplx_dtypes = {np.dtype(np.float64): np.complex128,
+                       np.dtype(np.float32): np.complex64}
+        if chunk.shape[2] == 2 and chunk.dtype in cplx_dtypes \
+                and chunk.flags.c_contiguous:
+            cplx = chunk.view(cplx_dtypes[chunk.dtype])[:, :, 0]
+            sums = (cplx[:, 0] + cplx[:, 1]).view(chunk.dtype)
+            return sums.reshape(len(chunk), 2)
+        return chunk[:, 0] + chunk[:, 1]
+
+    @staticmethod
+    def check_chunk_rows(report, start, chunk, sum_err,
+                         array_name, allow_nan_rows):
+        """
+        Checks each row of a chunk that failed the fast whole-chunk test
+        of check_columns(), and adds the failures to report.
+
+        Parameters
+        ----------
+        report : ValidationReport
+        start : int
+            index of the first row of the chunk
+        chunk : np.array[shape=(C, 2, P)]
+        sum_err : np.array[shape=(C, P)]
+            |sum of column - 1| for each column of each row
+        array_name : str
+        allow_nan_rows : bool
+
+        Returns
+        -------
+        None
+
+        """
+        flat = chunk.reshape(len(chunk), -1)
+        not_finite = ~np.isfinite(flat).all(axis=1)
+        if allow_nan_rows:
+            not_finite &= ~np.isnan(flat).all(axis=1)
+        bad = np.flatnonzero(not_finite)
+        report.add_failures(array_name, 'not_finite', start + bad,
+                            np.full(len(bad), np.nan))
+        checks = [
+            ('negative', -np.fmin.reduce(flat, axis=1), 0),
+            ('above_one', np.fmax.reduce(flat, axis=1) - 1, 0),
+            ('col_sum', np.fmax.reduce(sum_err, axis=1), Validator.TOL)]
+        for rule, excess, tol in checks:
+            bad = np.flatnonzero(excess > tol)
+            report.add_failures(array_name, rule, start + bad, excess[bad])
+
+    @staticmethod
+    def check_all(o_y_bar_x, px, e_y_bar_x=None):
+        """
+        Checks the three input arrays of a BatchBounder and returns a single
+        report for all of them.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+        px : np.array[shape=(N, 2)]
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+
+        Returns
+        -------
+        ValidationReport
+
+        """
+        report = Validator.check_trans_matrices(o_y_bar_x, 'o_y_bar_x')
+        px_report = Validator.check_prob_vecs(px, 'px')
+        if px_report.num_rows != report.num_rows:
+            raise ValueError("o_y_bar_x and px have different numbers "
+                             "of rows")
+        report.merge(px_report)
+        if e_y_bar_x is not None:
+            e_report = Validator.check_trans_matrices(
+                e_y_bar_x, 'e_y_bar_x', allow_nan_rows=True)
+            if e_report.num_rows != report.num_rows:
+                raise ValueError("o_y_bar_x and e_y_bar_x have different "
+                                 "numbers of rows")
+            report.merge(e_report)
+        return report
+
+    @staticmethod
+    def clip_and_normalize(mats):
+        """
+        Returns a copy of mats with its elements clipped to [0, 1] and its
+        columns renormalized to sum to 1. For both input shapes, the
+        columns are along axis 1. Columns that sum to 0 after clipping
+        become NaN.
+
+        Parameters
+        ----------
+        mats : np.array[shape=(N, 2, 2)], np.array[shape=(N, 2)]
+
+        Returns
+        -------
+        np.array[shape=(N, 2, 2)], np.array[shape=(N, 2)]
+
+        """
+        clipped = np.clip(mats, 0, 1)
+        sums = clipped.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            clipped /= np.where(sums > 0, sums, np.nan)
+        return clipped
+
+    @staticmethod
+    def validate(o_y_bar_x, px, e_y_bar_x=None, on_error='raise'):
+        """
+        Checks the three input arrays of a BatchBounder and deals with the
+        bad rows according to on_error:
+
+        'raise': raise a ValueError if any row is bad.
+
+        'drop': remove the bad rows.
+
+        'clip': clip the bad rows to [0, 1] and renormalize their columns.
+        Rows that cannot be repaired that way (non finite values, or
+        columns that are all 0 after clipping) are removed.
+
+        Parameters
+        ----------
+        o_y_bar_x : np.array[shape=(N, 2, 2)]
+        px : np.array[shape=(N, 2)]
+        e_y_bar_x : np.array[shape=(N, 2, 2)], None
+        on_error : str
+            one of Validator.ON_ERROR_OPTIONS
+
+        Returns
+        -------
+        np.array[shape=(M, 2, 2)], np.array[shape=(M, 2)],
+        np.array[shape=(M, 2, 2)] | None, np.array[shape=(M, ), dtype=int],
+        ValidationReport
+            o_y_bar_x, px, e_y_bar_x, kept_rows, report. kept_rows are the
+            indices in the input arrays of the M rows that are returned.
+
+        """
+        if on_error not in Validator.ON_ERROR_OPTIONS:
+            raise ValueError("on_error must be one of %s, not %r"
+                             % (Validator.ON_ERROR_OPTIONS, on_error))
+        o_y_bar_x = np.asarray(o_y_bar_x)
+        px = np.asarray(px)
+        if e_y_bar_x is not None:
+            e_y_bar_x = np.asarray(e_y_bar_x)
+        report = Validator.check_all(o_y_bar_x, px, e_y_bar_x)
+        num_rows = report.num_rows
+        if report.is_valid():
+            return o_y_bar_x, px, e_y_bar_x, np.arange(num_rows), report
+        if on_error == 'raise':
+            report.raise_if_invalid()
+
+        bad = report.get_bad_mask()
+        if on_error == 'clip':
+            bad_rows = np.flatnonzero(bad)
+            o_y_bar_x = o_y_bar_x.copy()
+            px = px.copy()
+            o_y_bar_x[bad_rows] = \
+                Validator.clip_and_normalize(o_y_bar_x[bad_rows])
+            px[bad_rows] = Validator.clip_and_normalize(px[bad_rows])
+            repaired = Validator.check_all(
+                o_y_bar_x[bad_rows], px[bad_rows])
+            if e_y_bar_x is not None:
+                e_y_bar_x = e_y_bar_x.copy()
+                e_bad = e_y_bar_x[bad_rows]
+                all_nan = np.isnan(e_bad).all(axis=(1, 2))
+                e_bad[~all_nan] = \
+                    Validator.clip_and_normalize(e_bad[~all_nan])
+                e_y_bar_x[bad_rows] = e_bad
+                repaired = Validator.check_all(
+                    o_y_bar_x[bad_rows], px[bad_rows], e_bad)
+            bad = np.zeros(num_rows, dtype=bool)
+            bad[bad_rows[repaired.get_bad_rows()]] = True
+
+        kept_rows = np.flatnonzero(~bad)
+        o_y_bar_x = o_y_bar_x[kept_rows]
+        px = px[kept_rows]
+        if e_y_bar_x is not None:
+            e_y_bar_x = e_y_bar_x[kept_rows]
+        return o_y_bar_x, px, e_y_bar_x, kept_rows, report
+
+
+if __name__ == "__main__":
+    def main():
+        o_y_bar_x = np.array([[[.3, .73],
+                               [.7, .27]],
+                              [[.3, .3],
+                               [.8, .7]],
+                              [[-.1, .5],
+                               [1.1, .5]]])
+        px = np.array([[.3, .7],
+                       [.3, .7],
+                       [np.nan, .5]])
+        e_y_bar_x = np.array([[[.79, .52],
+                               [.21, .48]],
+                              [[np.nan, np.nan],
+                               [np.nan, np.nan]],
+                              [[.79, .51],
+                               [.21, .49]]])
+        report = Validator.check_all(o_y_bar_x, px, e_y_bar_x)
+        print(report.get_summary())
+        print("---------------------------")
+        for on_error in ['drop', 'clip']:
+            o, p, e, kept_rows, _ = Validator.validate(
+                o_y_bar_x, px, e_y_bar_x, on_error=on_error)
+            print(on_error + ": kept rows", kept_rows)
+        try:
+            Validator.validate(o_y_bar_x, px, e_y_bar_x, on_error='raise')
+        except ValueError as err:
+            print("raise: ValueError")
+
+    main()
@@ -1,35 +1,52 @@
-from Bounder import Bounder
-from Plotter import Plotter
+from Strata import Strata
+from BatchBounder import BatchBounder
+from Validator import Validator
+from contextlib import contextmanager
 import numpy as np
-import ipywidgets as wid
-from IPython.display import display, clear_output
 
 
 class Widgeter:
-    def __init__(self):
+    def __init__(self, strata_names=('m', 'f'),
+                 strata_labels=('male', 'female'),
+                 throttle_interval=.05, debounce=0.):
         """
         The main method of this class and the only one meant for external
         use is run_gui(). This method runs a GUI (Graphical User Interface)
         as a cell in a Jupyter notebook. The controls of the GUI are
         implemented using the library ipywidgets.
 
+        The population is split into K strata g (by default, g in {m, f}
+        for males and females). Each stratum gets its own sliders, and all
+        the strata are held by a single Strata object.
+
         Attributes
         ----------
+        agg_terms : np.array[shape=(K, 4)]
+            unnormalized weight w_g, w_g*ATE_g and w_g*PNS_g bounds of each
+            stratum, summed incrementally into agg_sums
+        agg_sums : np.array[shape=(4, )]
+            sum_g of agg_terms[g]
         bdoor_crit : bool
             True iff backdoor criterion for node G relative to (X,Y) is
             satisfied
-        bounder_f : Bounder
-            Bounder object for females
-        bounder_m : Bounder
-            Bounder object for males
+        debounce : float
+            seconds of slider inactivity before a recalculation starts
         exogeneity : bool
+        exp_bds_monotonicity : bool, None
+            value of monotonicity used to calculate the exp. bounds
         exp_sliders_to_latex : dict[wid.FloatSlider, str]
             dictionary mapping experimental sliders to a LaTex string
         exp_slider_to_tbox : dict[wid.FloatSlider, wid.BoundedFloatText]
             dictionary mapping experimental sliders to their text boxes
         exp_sliders : List[wid.FloatSlider]
-            list of experimental sliders
+            list of experimental sliders. The last K of them are the
+            weight sliders.
+        live_plot : LivePlot, None
+            the plot of the PNS3 bounds, created once by run_gui() and
+            updated in place after that
         monotonicity : bool
+        needs_refresh : bool
+            True iff the state changed since the last refresh of the GUI
         no_x_to_g : bool
             True iff G is not a descendant of X
         obs_sliders_to_latex : dict[wid.FloatSlider, str]
@@ -37,13 +54,56 @@ class Widgeter:
         obs_slider_to_tbox : dict[wid.FloatSlider, wid.BoundedFloatText]
             dictionary mapping observational sliders to their text boxes
         obs_sliders : List[wid.FloatSlider]
-            list of observational sliders        
+            list of observational sliders
+        num_refresh_holds : int
+            depth of nested hold_refresh() blocks. Refreshes are deferred
+            while it is > 0.
         only_obs : bool
             Only Observational Probabilities, no Experimental ones
-        pmale : float
-            P(gender=male)
+        refreshed_flags : dict[str, bool], None
+            the snapshot of the check boxes used by the last applied
+            refresh, None before the first one
+        refresh_gui_fun : function, None
+            function, set by run_gui(), that recalculates the bounds from
+            the slider values and redraws the plot and the labels
+        scenario_index : int, None
+            index, in BatchBounder.SCENARIOS, of the scenario whose bounds
+            are in self.strata.pns3_bds
+        scenario_key : tuple, None
+            the values of only_obs and strong_exogeneity used to calculate
+            scenario_pns3_bds. If they change, all the strata are dirty.
+        scenario_pns3_bds : np.array[shape=(4, K, 3, 2)]
+            PNS3 bounds of the K strata for each of the 4 (exogeneity,
+            monotonicity) scenarios in BatchBounder.SCENARIOS
+        strata : Strata
+            the K strata and their weights P_g
+        strata_labels : list[str]
+            long names of the strata, used in the legend of the plot
+        stratum_vals : np.array[shape=(K, 6)], None
+            slider values (o1b0, o1b1, px1, e1b0, e1b1, weight) of each
+            stratum at the last refresh, used to find the dirty strata
         strong_exogeneity : bool
+        throttle_interval : float
+            minimum number of seconds between two redraws of the plot
+        throttler : Throttler, None
+            created by run_gui(). It recalculates the bounds off the event
+            loop, with calc_refresh(), discards superseded slider states,
+            and applies and redraws the latest one on the event loop.
+        unrendered_strata : set[int]
+            strata whose bounds or labels changed since they were last
+            rendered
+        weight_sliders : List[wid.FloatSlider]
+            list of the K sliders for the weights P_g
 
+        Parameters
+        ----------
+        strata_names : list[str]
+            short names of the strata, used as LaTex subscripts
+        strata_labels : list[str], None
+            long names of the strata, used in the legend of the plot.
+            None means strata_names.
+        throttle_interval : float
+        debounce : float
         """
         self.only_obs = True
         self.exogeneity = False
@@ -52,20 +112,36 @@ class Widgeter:
         self.no_x_to_g = False
         self.bdoor_crit = False
 
-        o_y_bar_x_m = np.array([[.5, .5], [.5, .5]])
-        px_m = np.array([.5, .5])
-        self.bounder_m = Bounder(o_y_bar_x_m, px_m)
-        self.bounder_m.set_exp_probs_bds()
-
-        o_y_bar_x_f = np.array([[.5, .5], [.5, .5]])
-        px_f = np.array([.5, .5])
-        self.bounder_f = Bounder(o_y_bar_x_f, px_f)
-        self.bounder_f.set_exp_probs_bds()
+        num_strata = len(strata_names)
+        if strata_labels is None or len(strata_labels) != num_strata:
+            strata_labels = strata_names
+        self.strata_labels = list(strata_labels)
+        o_y_bar_x = np.full(shape=(num_strata, 2, 2), fill_value=.5)
+        px = np.full(shape=(num_strata, 2), fill_value=.5)
+        weights = np.ones(shape=(num_strata, ))
+        self.strata = Strata(strata_names, o_y_bar_x, px, weights)
+        self.strata.set_exp_probs_bds()
+
+        self.live_plot = None
+        self.throttle_interval = throttle_interval
+        self.debounce = debounce
+        self.throttler = None
+        self.refresh_gui_fun = None
+        self.needs_refresh = False
+        self.num_refresh_holds = 0
+        self.scenario_key = None
+        self.scenario_index = None
+        self.scenario_pns3_bds = np.zeros(shape=(4, num_strata, 3, 2))
+        self.exp_bds_monotonicity = None
+        self.stratum_vals = None
+        self.refreshed_flags = None
+        self.unrendered_strata = set()
+        self.agg_terms = np.zeros(shape=(num_strata, 4))
+        self.agg_sums = np.zeros(shape=(4, ))
 
-        self.pmale = .5
-        
         self.obs_sliders = []
         self.exp_sliders = []
+        self.weight_sliders = []
 
         self.obs_slider_to_tbox = {}
         self.exp_slider_to_tbox = {}
@@ -73,75 +149,274 @@ class Widgeter:
         self.obs_slider_to_latex = {}
         self.exp_slider_to_latex = {}
 
+    def get_flags(self):
+        """
+        Returns a snapshot of the check boxes that affect the bounds. It is
+        taken on the event loop and passed to calc_refresh(), so that a
+        computation in the worker thread never reads flags that a check
+        box handler is changing.
+
+        Returns
+        -------
+        dict[str, bool]
+            only_obs, exogeneity, monotonicity and strong_exo
+
+        """
+        return dict(only_obs=self.only_obs,
+                    exogeneity=self.exogeneity,
+                    monotonicity=self.monotonicity,
+                    strong_exo=self.strong_exogeneity)
+
     def refresh_bounders_using_slider_vals(
             self,
-            o1b0_m, o1b1_m, px1_m,
-            o1b0_f, o1b1_f, px1_f,
-            e1b0_m, e1b1_m,
-            e1b0_f, e1b1_f,
-            pmale
+            o1b0, o1b1, px1,
+            e1b0, e1b1,
+            weights
             ):
         """
-        This method is called by wid.interactive() which requires it. Its
-        inputs are all slider values. After doing some housework,
-        this method calls Plotter.plot_pns3_bds().
+        This method refreshes self.strata with all the slider values, one
+        entry per stratum g, and recalculates the bounds, using the
+        current check boxes. It is calc_refresh() followed by
+        apply_refresh(), in the calling thread.
 
         Parameters
         ----------
-        o1b0_m : float
-            O_{1|0,m}
-        o1b1_m : float
-            O_{1|1,m}
-        px1_m : float
-            P(x=1) for males
-        o1b0_f : float
-            O_{1|0,f}
-        o1b1_f : float
-            O_{1|1,f}
-        px1_f : float
-            P(x=1) for females
-        e1b0_m : float
-            E_{1|0,m}
-        e1b1_m : float
-            E_{1|1,m}
-        e1b0_f : float
-            E_{1|0,f}
-        e1b1_f : float
-            E_{1|1,f}
-        pmale : float
-            P(g=male)
+        o1b0 : np.array[shape=(K, )]
+            O_{1|0,g}
+        o1b1 : np.array[shape=(K, )]
+            O_{1|1,g}
+        px1 : np.array[shape=(K, )]
+            P(x=1|g)
+        e1b0 : np.array[shape=(K, )]
+            E_{1|0,g}
+        e1b1 : np.array[shape=(K, )]
+            E_{1|1,g}
+        weights : np.array[shape=(K, )]
+            P_g, not necessarily normalized
 
         Returns
         -------
         None
 
         """
-        o_y_bar_x_m = np.array([
-            [1 - o1b0_m, 1 - o1b1_m],
-            [o1b0_m, o1b1_m]])
-        px_m = np.array([1 - px1_m, px1_m])
-        self.bounder_m.set_obs_probs(o_y_bar_x_m, px_m)
-        self.bounder_m.set_exp_probs_bds()
-
-        o_y_bar_x_f = np.array([
-            [1 - o1b0_f, 1 - o1b1_f],
-            [o1b0_f, o1b1_f]])
-        px_f = np.array([1 - px1_f, px1_f])
-        self.bounder_f.set_obs_probs(o_y_bar_x_f, px_f)
-        self.bounder_f.set_exp_probs_bds()
-
-        if not self.only_obs:
-            e_y_bar_x_m = np.array([
-                [1 - e1b0_m, 1 - e1b1_m],
-                [e1b0_m, e1b1_m]])
-            self.bounder_m.set_exp_probs(e_y_bar_x_m)
-            e_y_bar_x_f = np.array([
-                [1 - e1b0_f, 1 - e1b1_f],
-                [e1b0_f, e1b1_f]])
-            self.bounder_f.set_exp_probs(e_y_bar_x_f)
-
-        self.bounder_m.set_pns3_bds()
-        self.bounder_f.set_pns3_bds()
+        self.apply_refresh(self.calc_refresh(
+            self.get_flags(), o1b0, o1b1, px1, e1b0, e1b1, weights))
+
+    def calc_refresh(self, flags, o1b0, o1b1, px1, e1b0, e1b1, weights):
+        """
+        This method is called by self.throttler, in its worker thread, once
+        per refresh of the GUI. It calculates the bounds for a snapshot of
+        the check boxes (flags) and of all the slider values, and returns
+        them without modifying self. apply_refresh() then assigns them on
+        the event loop.
+
+        Only the dirty strata, those whose inputs changed since the last
+        applied refresh, are recalculated. All the strata are dirty if
+        only_obs or strong_exo changed. Besides its arguments, this method
+        only reads the state written by apply_refresh(), which runs on the
+        event loop between two computations of the throttler.
+
+        Parameters
+        ----------
+        flags : dict[str, bool]
+            output of get_flags()
+        o1b0 : np.array[shape=(K, )]
+            O_{1|0,g}
+        o1b1 : np.array[shape=(K, )]
+            O_{1|1,g}
+        px1 : np.array[shape=(K, )]
+            P(x=1|g)
+        e1b0 : np.array[shape=(K, )]
+            E_{1|0,g}
+        e1b1 : np.array[shape=(K, )]
+            E_{1|1,g}
+        weights : np.array[shape=(K, )]
+            P_g, not necessarily normalized
+
+        Returns
+        -------
+        dict
+            the input of apply_refresh()
+
+        """
+        vals = np.stack([np.asarray(v, dtype=float) for v in
+                         [o1b0, o1b1, px1, e1b0, e1b1, weights]], axis=1)
+        if vals[:, 5].sum() <= 0:
+            vals[:, 5] = 1
+        num_strata = len(vals)
+
+        # the weights don't affect the bounds, so they are not part of
+        # the key
+        key = (flags['only_obs'], flags['strong_exo'])
+        if self.stratum_vals is None or key != self.scenario_key:
+            bds_dirty = np.ones(num_strata, dtype=bool)
+            weight_dirty = bds_dirty
+        else:
+            # the E sliders are ignored while there is no Experimental data
+            num_bds_cols = 3 if flags['only_obs'] else 5
+            diff = vals != self.stratum_vals
+            bds_dirty = diff[:, :num_bds_cols].any(axis=1)
+            weight_dirty = diff[:, 5]
+        # the exp. bounds depend on monotonicity
+        exp_bds_dirty = bds_dirty
+        if flags['monotonicity'] != self.exp_bds_monotonicity:
+            exp_bds_dirty = np.ones(num_strata, dtype=bool)
+        rows = np.flatnonzero(bds_dirty)
+        exp_bds_rows = np.flatnonzero(exp_bds_dirty)
+
+        # rows is a subset of exp_bds_rows
+        exp_dofs = [] if flags['only_obs'] else vals[exp_bds_rows, 3:5].T
+        o_y_bar_x, px, e_y_bar_x = BatchBounder.get_probs_from_dofs(
+            *vals[exp_bds_rows, :3].T, *exp_dofs)
+        Validator.validate(o_y_bar_x, px, on_error='raise')
+        left_bds, right_bds = BatchBounder.calc_exp_probs_bds(
+            o_y_bar_x, px, flags['monotonicity'])
+        in_rows = bds_dirty[exp_bds_rows]
+
+        if e_y_bar_x is not None:
+            e_y_bar_x = e_y_bar_x[in_rows]
+            Validator.check_trans_matrices(
+                e_y_bar_x, 'e_y_bar_x').raise_if_invalid()
+        scenario_pns3_bds = BatchBounder.calc_all_scenarios_pns3_bds(
+            o_y_bar_x[in_rows], px[in_rows], e_y_bar_x,
+            strong_exo=flags['strong_exo'])
+
+        # toggling exogeneity or monotonicity changes the bounds of all
+        # the strata
+        k = BatchBounder.get_scenario_index(flags['exogeneity'],
+                                            flags['monotonicity'])
+        if k != self.scenario_index:
+            bds_dirty = np.ones(num_strata, dtype=bool)
+        return dict(flags=flags, key=key, vals=vals, rows=rows,
+                    exp_bds_rows=exp_bds_rows, o_y_bar_x=o_y_bar_x, px=px,
+                    left_bds=left_bds, right_bds=right_bds,
+                    e_y_bar_x=e_y_bar_x,
+                    scenario_pns3_bds=scenario_pns3_bds, scenario_index=k,
+                    dirty=np.flatnonzero(bds_dirty | weight_dirty))
+
+    def apply_refresh(self, result):
+        """
+        This method assigns the output of calc_refresh() to self.strata
+        and to the scenario bounds, and updates the weighted aggregates
+        incrementally, from the dirty strata only. The strata whose bounds
+        or labels changed are added to self.unrendered_strata. In the GUI,
+        it runs on the event loop, before the render.
+
+        Parameters
+        ----------
+        result : dict
+            output of calc_refresh()
+
+        Returns
+        -------
+        None
+
+        """
+        num_strata = self.strata.num_strata
+        exp_bds_rows = result['exp_bds_rows']
+        self.strata.o_y_bar_x[exp_bds_rows] = result['o_y_bar_x']
+        self.strata.px[exp_bds_rows] = result['px']
+        self.strata.left_bds_e_y_bar_x[exp_bds_rows] = result['left_bds']
+        self.strata.right_bds_e_y_bar_x[exp_bds_rows] = result['right_bds']
+        self.exp_bds_monotonicity = result['flags']['monotonicity']
+
+        rows = result['rows']
+        if result['e_y_bar_x'] is not None:
+            if self.strata.e_y_bar_x is None:
+                self.strata.e_y_bar_x = np.full(
+                    shape=(num_strata, 2, 2), fill_value=np.nan)
+            self.strata.e_y_bar_x[rows] = result['e_y_bar_x']
+        self.strata.set_weights(result['vals'][:, 5])
+
+        self.scenario_pns3_bds[:, rows] = result['scenario_pns3_bds']
+        self.scenario_key = result['key']
+        self.stratum_vals = result['vals']
+        self.refreshed_flags = result['flags']
+        self.scenario_index = result['scenario_index']
+        self.refresh_pns3_bds_from_scenarios()
+
+        dirty = result['dirty']
+        self.refresh_aggregates(dirty, full=len(dirty) == num_strata)
+        self.unrendered_strata.update(dirty.tolist())
+
+    def refresh_aggregates(self, rows, full=False):
+        """
+        This method updates incrementally the P_g weighted sums over the
+        strata of 1, ATE_g and the PNS_g bounds, stored in self.agg_sums.
+        Only the terms of the strata in rows are replaced.
+
+        Parameters
+        ----------
+        rows : np.array[shape=(R, )]
+            indices of the strata whose terms changed
+        full : bool
+            True iff the sums should be recalculated from scratch (this
+            also clears accumulated rounding errors)
+
+        Returns
+        -------
+        None
+
+        """
+        weights = self.stratum_vals[rows, 5]
+        if self.refreshed_flags['only_obs']:
+            ate_g = np.zeros(len(rows))
+        else:
+            ate_g = self.stratum_vals[rows, 4] - self.stratum_vals[rows, 3]
+        terms = np.empty(shape=(len(rows), 4))
+        terms[:, 0] = weights
+        terms[:, 1] = weights*ate_g
+        terms[:, 2:] = weights[:, np.newaxis] * \
+            self.strata.pns3_bds[rows, 0, :]
+        if full:
+            self.agg_terms[rows] = terms
+            self.agg_sums = self.agg_terms.sum(axis=0)
+        else:
+            self.agg_sums += terms.sum(axis=0) - \
+                self.agg_terms[rows].sum(axis=0)
+            self.agg_terms[rows] = terms
+
+    def get_weighted_ate(self):
+        """
+        Returns ATE = sum_g ATE_g P_g from the incrementally updated
+        aggregates, or None if they were calculated without Experimental
+        data.
+
+        Returns
+        -------
+        float, None
+
+        """
+        if self.refreshed_flags is None or \
+                self.refreshed_flags['only_obs']:
+            return None
+        return float(self.agg_sums[1]/self.agg_sums[0])
+
+    def get_agg_pns_bds(self):
+        """
+        Returns the bounds on the aggregate PNS = sum_g PNS_g P_g from the
+        incrementally updated aggregates.
+
+        Returns
+        -------
+        np.array[shape=(2, )]
+            [PNS_low, PNS_high]
+
+        """
+        return self.agg_sums[2:]/self.agg_sums[0]
+
+    def refresh_pns3_bds_from_scenarios(self):
+        """
+        This method copies into self.strata the PNS3 bounds, stored in
+        self.scenario_pns3_bds, of the scenario self.scenario_index.
+
+        Returns
+        -------
+        None
+
+        """
+        self.strata.pns3_bds = \
+            self.scenario_pns3_bds[self.scenario_index].copy()
 
     def refresh_slider_colors(self, obs_green):
         """
@@ -166,7 +441,7 @@ class Widgeter:
                 color = 'green'
             else:
                 color = 'red'
-            return '$\color{' + color + '}{' + latex_str + '}$'
+            return '$\\color{' + color + '}{' + latex_str + '}$'
 
         for x in self.obs_sliders:
             x.disabled = not obs_green
@@ -181,28 +456,70 @@ class Widgeter:
 
     def refresh_plot(self):
         """
-        This method is a clever way of inducing the method wid.interactive()
-        to redraw the plot. The method jiggles the pmale slider,
-        thus causing wid.interactive() to redraw the plot.
+        This method asks for a recalculation and redraw of the GUI after a
+        change of state that doesn't come from a slider (e.g., a check
+        box). It is the same as invalidate().
+
+        Returns
+        -------
+        None
+
+        """
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        This method marks the GUI as out of date. The bounds are
+        recalculated and the plot is redrawn exactly once, right away, or,
+        inside a hold_refresh() block, once when the outermost block ends.
+
+        Returns
+        -------
+        None
+
+        """
+        self.needs_refresh = True
+        if self.num_refresh_holds == 0:
+            self.flush_refresh()
+
+    def flush_refresh(self):
+        """
+        This method refreshes the GUI if it is out of date.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.needs_refresh and self.refresh_gui_fun is not None:
+            self.needs_refresh = False
+            self.refresh_gui_fun()
+
+    @contextmanager
+    def hold_refresh(self):
+        """
+        Context manager that coalesces all the invalidate() calls made
+        inside it (e.g., by several sliders moved in sequence) into a single
+        refresh when the outermost block ends.
 
         Returns
         -------
         None
 
         """
-        # just jiggle the pmale slider
-        x = self.exp_sliders[4]
-        delta = .1
-        x.min -= delta
-        x.value -= delta
-        x.min += delta
-        x.value += delta
+        self.num_refresh_holds += 1
+        try:
+            yield
+        finally:
+            self.num_refresh_holds -= 1
+            if self.num_refresh_holds == 0:
+                self.flush_refresh()
 
     def set_exp_sliders_to_valid_values(self):
         """
-        This method calculates the experimental bounds for the male and
-        female bounders. Using those results, it sets the values of the min,
-        value and max parameters of the Experimental Probabilities sliders.
+        This method calculates the experimental bounds for all the strata.
+        Using those results, it sets the values of the min, value and max
+        parameters of the Experimental Probabilities sliders.
 
         Returns
         -------
@@ -216,106 +533,100 @@ class Widgeter:
             slider.disabled = False
             slider.value = a
 
-        self.bounder_m.set_exp_probs_bds()
-        left_bds, right_bds = self.bounder_m.get_exp_probs_bds()
-        # set value of E_{1|i,m} for i=0,1
-        for i, slider in zip([0, 1], self.exp_sliders[0:2]):
-            a, b = left_bds[1, i], right_bds[1, i]
-            change(slider, a, b)
-
-        self.bounder_f.set_exp_probs_bds()
-        left_bds, right_bds = self.bounder_f.get_exp_probs_bds()
-        # set value of E_{1|i,f} for i=0,1
-        for i, slider in zip([0, 1], self.exp_sliders[2:4]):
-            a, b = left_bds[1, i], right_bds[1, i]
-            change(slider, a, b)
+        self.strata.set_exp_probs_bds()
+        left_bds, right_bds = self.strata.get_exp_probs_bds()
+        # set value of E_{1|i,g} for i=0,1. The slider changes trigger a
+        # single refresh at the end.
+        with self.hold_refresh():
+            for g in range(self.strata.num_strata):
+                for i, slider in zip([0, 1],
+                                     self.exp_sliders[2*g:2*g + 2]):
+                    a, b = left_bds[g, 1, i], right_bds[g, 1, i]
+                    change(slider, a, b)
 
     def run_gui(self):
         """
         This is the main method of this class and the only one meant for
         external use. It draws a GUI.
 
-        The GUI has 11 sliders, 6 sliders for Observational Probabilities
-        and 5 sliders for Experimental Probabilities. Each slider has a text
-        box attached to it which can be used to enter input by typing
-        numbers instead of moving the slider. In addition, the GUI has
-        several clickable control buttons and check boxes and one disabled
-        text box that gives info about the current status of the calculations.
+        For K strata, the GUI has 6K sliders, 3K sliders for Observational
+        Probabilities and 3K sliders for Experimental Probabilities and
+        weights. Each slider has a text box attached to it which can be
+        used to enter input by typing numbers instead of moving the
+        slider. In addition, the GUI has several clickable control buttons
+        and check boxes and one disabled text box that gives info about the
+        current status of the calculations.
+
+        ipywidgets, IPython, matplotlib and Throttler (which loads
+        asyncio) are imported here, on first use, so that importing this
+        module doesn't load the GUI stack.
 
         Returns
         -------
         None
 
         """
+        import ipywidgets as wid
+        from IPython.display import display, clear_output
+        from Plotter import Plotter
+        from LivePlot import LivePlot
+        from Throttler import Throttler
+        names = self.strata.names
+        num_strata = len(names)
         slider_params = dict(
             min=0,
             max=1,
             value=.5,
             step=.001,
             orientation='vertical')
-        o1b0_m_slider = wid.widgets.FloatSlider(**slider_params)
-        o1b1_m_slider = wid.widgets.FloatSlider(**slider_params)
-        px1_m_slider = wid.widgets.FloatSlider(**slider_params)
-        # order important, 1b0 before 1b1,
-        # mnemonic 10 < 11
-        obs_m_sliders = [o1b0_m_slider,
-                        o1b1_m_slider,
-                        px1_m_slider]
-        o1b0_f_slider = wid.widgets.FloatSlider(**slider_params)
-        o1b1_f_slider = wid.widgets.FloatSlider(**slider_params)
-        px1_f_slider = wid.widgets.FloatSlider(**slider_params)
-        # order important, 1b0 before 1b1,
-        # mnemonic 10 < 11
-        obs_f_sliders = [o1b0_f_slider,
-                        o1b1_f_slider,
-                        px1_f_slider]
-        self.obs_sliders = [*obs_m_sliders,
-                            *obs_f_sliders]
-
-        e1b0_m_slider = wid.widgets.FloatSlider(**slider_params)
-        e1b1_m_slider = wid.widgets.FloatSlider(**slider_params)
-        # order important, 1b0 before 1b1,
-        # mnemonic 10 < 11
-        exp_m_sliders = [e1b0_m_slider, e1b1_m_slider]
 
-        e1b0_f_slider = wid.widgets.FloatSlider(**slider_params)
-        e1b1_f_slider = wid.widgets.FloatSlider(**slider_params)
         # order important, 1b0 before 1b1,
         # mnemonic 10 < 11
-        exp_f_sliders = [e1b0_f_slider, e1b1_f_slider]
-        pmale_slider = wid.widgets.FloatSlider(**slider_params)
-        self.exp_sliders = [*exp_m_sliders,
-                            *exp_f_sliders,
-                            pmale_slider]
-
-        self.obs_slider_to_latex = {
-            obs_m_sliders[0]: 'O_{1|0,m}',
-            obs_m_sliders[1]: 'O_{1|1,m}',
-            obs_m_sliders[2]: '\pi_{1,m}',
-            #
-            obs_f_sliders[0]: 'O_{1|0,f}',
-            obs_f_sliders[1]: 'O_{1|1,f}',
-            obs_f_sliders[2]: '\pi_{1,f}'}
-
-        self.exp_slider_to_latex = {
-            exp_m_sliders[0]: 'E_{1|0,m}',
-            exp_m_sliders[1]: 'E_{1|1,m}',
-            exp_f_sliders[0]: 'E_{1|0,f}',
-            exp_f_sliders[1]: 'E_{1|1,f}',
-            pmale_slider: 'P_m'
-        }
+        obs_slider_names = ['o1b0', 'o1b1', 'px1']
+        obs_latex = ['O_{1|0,%s}', 'O_{1|1,%s}', '\\pi_{1,%s}']
+        exp_slider_names = ['e1b0', 'e1b1']
+        exp_latex = ['E_{1|0,%s}', 'E_{1|1,%s}']
+
+        # slider_dict maps 'o1b0_0', ..., 'weight_<K-1>' to sliders
+        slider_dict = {}
+        self.obs_sliders = []
+        self.obs_slider_to_latex = {}
+        for g, name in enumerate(names):
+            for slider_name, latex in zip(obs_slider_names, obs_latex):
+                slider = wid.widgets.FloatSlider(**slider_params)
+                slider_dict[slider_name + '_%d' % g] = slider
+                self.obs_sliders.append(slider)
+                self.obs_slider_to_latex[slider] = latex % name
+
+        self.exp_sliders = []
+        self.exp_slider_to_latex = {}
+        for g, name in enumerate(names):
+            for slider_name, latex in zip(exp_slider_names, exp_latex):
+                slider = wid.widgets.FloatSlider(**slider_params)
+                slider_dict[slider_name + '_%d' % g] = slider
+                self.exp_sliders.append(slider)
+                self.exp_slider_to_latex[slider] = latex % name
+        self.weight_sliders = []
+        for g, name in enumerate(names):
+            slider = wid.widgets.FloatSlider(**slider_params)
+            slider_dict['weight_%d' % g] = slider
+            self.weight_sliders.append(slider)
+            self.exp_slider_to_latex[slider] = 'P_{%s}' % name
+        self.exp_sliders += self.weight_sliders
 
         header = wid.HTMLMath("Enter Observational Data from a survey." +
             "<br>Then press the 'Add Experimental Data (RCT)' button\
             if you also have Experimental Data."
             "<br>Sliders with green/red labels are\
             enabled/disabled."
-            "<br>$g\in\{m,f\}$ stands for gender.$x,y\in \{0,1\}$."
-            "<br>$E_{y|x} = \sum_g E_{y|x,g}P_g$ (backdoor adjustment "
+            "<br>$g\\in\\{" + ",".join(names) + "\\}$ labels the strata."
+            "$x,y\\in \\{0,1\\}$."
+            "<br>The weights $P_g$ are normalized to sum to 1."
+            "<br>$E_{y|x} = \\sum_g E_{y|x,g}P_g$ (backdoor adjustment "
             "formula)"
             "<br>$ATE_g = E_{1|1,g} - E_{1|0,g}$"
             "<br>$ATE=E_{1|1} - E_{1|0}$"
-            "<br>$PNS = \sum_g PNS_g P_g$")
+            "<br>$PNS = \\sum_g PNS_g P_g$")
 
         add_but = wid.Button(
             description='Add Experimental Data (RCT)',
@@ -326,9 +637,11 @@ class Widgeter:
 
         def add_but_do(btn):
             if self.only_obs:
-                self.refresh_slider_colors(obs_green=False)
-                self.set_exp_sliders_to_valid_values()
-                self.only_obs = False
+                with self.hold_refresh():
+                    self.refresh_slider_colors(obs_green=False)
+                    self.set_exp_sliders_to_valid_values()
+                    self.only_obs = False
+                    self.invalidate()
         add_but.on_click(add_but_do)
 
         print_but = wid.Button(
@@ -342,20 +655,16 @@ class Widgeter:
         def print_but_do(btn):
             with out:
                 print("###################################")
-                print("Male:------------------------------")
-                self.bounder_m.print_all_probs(',m')
-                self.bounder_m.print_pns3_bds('_m')
-                print("Female:----------------------------")
-                self.bounder_f.print_all_probs(',f')
-                self.bounder_f.print_pns3_bds('_f')
+                for g, label in enumerate(self.strata_labels):
+                    print((label + ":").ljust(35, "-"))
+                    self.strata.print_all_probs(',', strata=[g])
+                    self.strata.print_pns3_bds('_', strata=[g])
                 print("ATE:-------------------------------")
-                ate_f = self.bounder_f.get_ate()
-                ate_m = self.bounder_m.get_ate()
-                if ate_m is not None and ate_f is not None:
-                    ate = ate_m * self.pmale + ate_f * (1 - self.pmale)
-                    print("ATE_m=", "%.3f" % ate_m)
-                    print("ATE_f", "%.3f" % ate_f)
-                    print("ATE=", "%.3f" % ate)
+                ate_g = self.strata.get_ate()
+                if ate_g is not None:
+                    for g, name in enumerate(names):
+                        print("ATE_" + name + "=", "%.3f" % ate_g[g])
+                    print("ATE=", "%.3f" % self.strata.get_weighted_ate())
         print_but.on_click(print_but_do)
 
         exo_but = wid.Checkbox(
@@ -366,8 +675,7 @@ class Widgeter:
         def exo_but_do(change):
             new = change['new']
             self.exogeneity = new
-            self.bounder_m.exogeneity = new
-            self.bounder_f.exogeneity = new
+            self.strata.exogeneity = new
             if not self.only_obs:
                 self.refresh_plot()
         exo_but.observe(exo_but_do, names='value')
@@ -380,12 +688,11 @@ class Widgeter:
         def strong_exo_but_do(change):
             new = change['new']
             self.strong_exogeneity = new
-            self.bounder_m.strong_exogeneity = new
-            self.bounder_f.strong_exogeneity = new
+            self.strata.strong_exo = new
             if not self.only_obs:
                 self.refresh_plot()
         strong_exo_but.observe(strong_exo_but_do, names='value')
-        
+
         mono_but = wid.Checkbox(
             value=self.monotonicity,
             description="Monotonicity",
@@ -394,8 +701,7 @@ class Widgeter:
         def mono_but_do(change):
             new = change['new']
             self.monotonicity = new
-            self.bounder_m.monotonicity = new
-            self.bounder_f.monotonicity = new
+            self.strata.monotonicity = new
             if not self.only_obs:
                 self.refresh_plot()
         mono_but.observe(mono_but_do, names='value')
@@ -411,7 +717,7 @@ class Widgeter:
             if not self.only_obs:
                 self.refresh_plot()
         no_x_to_g_but.observe(no_x_to_g_but_do, names='value')
-        
+
         bdoor_crit_but = wid.Checkbox(
             value=self.bdoor_crit,
             description="Backdoor criterion is satisfied",
@@ -423,9 +729,9 @@ class Widgeter:
             if not self.only_obs:
                 self.refresh_plot()
         bdoor_crit_but.observe(bdoor_crit_but_do, names='value')
-        ate_m_sign = wid.Label()
-        ate_f_sign = wid.Label()
+        ate_g_signs = [wid.Label() for _ in range(num_strata)]
         ate_sign = wid.Label()
+        pns_sign = wid.Label()
 
         def box_the_sliders(sliders):
             vbox_list = []
@@ -443,7 +749,7 @@ class Widgeter:
         no_dags_box = wid.VBox([exo_but, strong_exo_but, mono_but])
         dags_box = wid.VBox([no_x_to_g_but, bdoor_crit_but])
         constraints_box = wid.HBox([no_dags_box, dags_box])
-        ate_box = wid.VBox([ate_m_sign, ate_f_sign, ate_sign])
+        ate_box = wid.VBox([*ate_g_signs, ate_sign, pns_sign])
         cmd_box = wid.HBox([print_but, add_but])
         obs_box, self.obs_slider_to_tbox = box_the_sliders(self.obs_sliders)
         # margin and padding are given as a single string with the values in
@@ -464,65 +770,80 @@ class Widgeter:
             wid.HBox([exp_box, exp_margin])
         ])
 
-        def fun(o1b0_m_slider, o1b1_m_slider, px1_m_slider,
-                o1b0_f_slider, o1b1_f_slider, px1_f_slider,
-                e1b0_m_slider, e1b1_m_slider,
-                e1b0_f_slider, e1b1_f_slider,
-                pmale_slider
-                ):
-            self.refresh_bounders_using_slider_vals(
-                o1b0_m_slider, o1b1_m_slider, px1_m_slider,
-                o1b0_f_slider, o1b1_f_slider, px1_f_slider,
-                e1b0_m_slider, e1b1_m_slider,
-                e1b0_f_slider, e1b1_f_slider,
-                pmale_slider
-            )
-            # refresh self.pmale using slider value
-            self.pmale = pmale_slider
-
-            bds_m = self.bounder_m.get_pns3_bds()
-            bds_f = self.bounder_f.get_pns3_bds()
-            Plotter.plot_pns3_bds(bds_m=bds_m, bds_f=bds_f)
-
-            if self.only_obs:
+        # the figure is created once and updated in place. An interactive
+        # canvas (%matplotlib widget) is displayed once and redraws
+        # itself. Otherwise (%matplotlib inline), a fresh image of the
+        # same figure is displayed after each update.
+        # one figure per GUI instance, reused if run_gui() is called again.
+        # Stray figures that no GUI owns are closed; the live plots of
+        # other open GUIs are kept.
+        if self.live_plot is None:
+            self.live_plot = LivePlot(self.strata_labels)
+        Plotter.close_figures(keep=[self.live_plot.fig])
+        canvas = self.live_plot.fig.canvas
+        interactive_canvas = isinstance(canvas, wid.DOMWidget)
+        plot_out = wid.Output()
+        if interactive_canvas:
+            with plot_out:
+                display(canvas)
+
+        def refresh_gui_fun():
+            # the check boxes and slider values are read on the event
+            # loop; the bounds are recalculated off it by the throttler,
+            # which then calls render_fun() with the latest result
+            def get_vals(slider_name):
+                return [slider_dict[slider_name + '_%d' % g].value
+                        for g in range(num_strata)]
+            self.throttler.request(
+                self.get_flags(),
+                *[get_vals(slider_name) for slider_name in
+                  [*obs_slider_names, *exp_slider_names, 'weight']])
+
+        def render_fun(result):
+            # the result is assigned here, on the event loop, so it never
+            # races the check box handlers
+            self.apply_refresh(result)
+            # only the strata that changed since the last render are
+            # re-rendered
+            dirty = sorted(self.unrendered_strata)
+            self.unrendered_strata.clear()
+            self.live_plot.update(self.strata.get_pns3_bds(), strata=dirty)
+            if not interactive_canvas:
+                with plot_out:
+                    clear_output(wait=True)
+                    self.live_plot.show()
+
+            if result['flags']['only_obs']:
                 exp_bds_sign.value = "Good choices for Observational " \
                     "Probabilities! :) They imply<br> the following bounds " \
                     "for the Experimental Probabilities:"
-                left_bds, right_bds = self.bounder_m.get_exp_probs_bds()
-                exp_bds_sign.value +=\
-                '<br>%.2f $\leq E_{1|0,m} \leq$ %.2f'\
-                    % (left_bds[1, 0], right_bds[1, 0]) +\
-                '<br>%.2f $\leq E_{1|1,m}\leq$ %.2f' \
-                    % (left_bds[1, 1], right_bds[1, 1])
-                exp_bds_sign.value += ', '
-                left_bds, right_bds = self.bounder_f.get_exp_probs_bds()
-                exp_bds_sign.value +=\
-                '<br>%.2f $\leq E_{1|0,f} \leq$ %.2f'\
-                    % (left_bds[1, 0], right_bds[1, 0]) +\
-                '<br>%.2f $\leq E_{1|1,f}\leq$ %.2f' \
-                    % (left_bds[1, 1], right_bds[1, 1])
-            ate_f = self.bounder_f.get_ate()
-            ate_m = self.bounder_m.get_ate()
-            if ate_m is not None and ate_f is not None:
-                ate = ate_m*self.pmale + ate_f*(1-self.pmale)
-                ate_m_sign.value = '$ATE_m=$ %.2f' % ate_m
-                ate_f_sign.value = '$ATE_f=$ %.2f' % ate_f
+                left_bds, right_bds = self.strata.get_exp_probs_bds()
+                for g, name in enumerate(names):
+                    if g > 0:
+                        exp_bds_sign.value += ', '
+                    exp_bds_sign.value +=\
+                    '<br>%.2f $\\leq E_{1|0,%s} \\leq$ %.2f'\
+                        % (left_bds[g, 1, 0], name, right_bds[g, 1, 0]) +\
+                    '<br>%.2f $\\leq E_{1|1,%s}\\leq$ %.2f' \
+                        % (left_bds[g, 1, 1], name, right_bds[g, 1, 1])
+            ate = self.get_weighted_ate()
+            if ate is not None:
+                ate_g = self.strata.get_ate()
+                for g in dirty:
+                    ate_g_signs[g].value = '$ATE_{%s}=$ %.2f' \
+                        % (names[g], ate_g[g])
                 ate_sign.value = '$ATE=$ %.2f' % ate
-
-        slider_dict = {
-            'o1b0_m_slider': o1b0_m_slider,
-            'o1b1_m_slider': o1b1_m_slider,
-            'px1_m_slider': px1_m_slider,
-            'o1b0_f_slider': o1b0_f_slider,
-            'o1b1_f_slider': o1b1_f_slider,
-            'px1_f_slider': px1_f_slider,
-            'e1b0_m_slider': e1b0_m_slider,
-            'e1b1_m_slider': e1b1_m_slider,
-            'e1b0_f_slider': e1b0_f_slider,
-            'e1b1_f_slider': e1b1_f_slider,
-            'pmale_slider': pmale_slider
-        }
-        plot = wid.interactive_output(fun, slider_dict)
-        # interactive_plot.layout.height = '800px'
+            pns_bds = self.get_agg_pns_bds()
+            pns_sign.value = '%.2f $\\leq PNS \\leq$ %.2f' \
+                % (pns_bds[0], pns_bds[1])
+
+        self.throttler = Throttler(self.calc_refresh,
+                                   render_fun,
+                                   interval=self.throttle_interval,
+                                   debounce=self.debounce)
+        self.refresh_gui_fun = refresh_gui_fun
+        for slider in slider_dict.values():
+            slider.observe(lambda change: self.invalidate(), names='value')
         self.refresh_slider_colors(obs_green=True)
-        display(all_boxes, plot)
+        display(all_boxes, plot_out)
+        self.invalidate()
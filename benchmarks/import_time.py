@@ -0,0 +1,87 @@
+"""
+Import-time benchmark of the core bounding API.
+
+Each module in CORE_MODULES is imported in a fresh interpreter, several
+times, and the best time is compared to the best time of importing NumPy
+alone. The benchmark fails (exit status 1) if a core module loads any of
+FORBIDDEN_MODULES, or if it costs more than BUDGET_SECS on top of NumPy.
+
+Usage, from the root of the repo:
+
+    python benchmarks/import_time.py
+
+"""
+import os
+import subprocess
+import sys
+
+# modules that must be importable with NumPy as their only dependency
+CORE_MODULES = ('Validator', 'BatchBounder', 'Bounder', 'Strata',
+                'Ingester', 'BoundsCache', 'Sweeper', 'BatchRunner',
+                'DofStore', 'BoundsResult',
+                'Plotter', 'Widgeter')
+# the GUI stack. Plotter and Widgeter import it on first use only.
+FORBIDDEN_MODULES = ('matplotlib', 'ipywidgets', 'IPython')
+# seconds a core module may add to the import time of NumPy
+BUDGET_SECS = .05
+NUM_RUNS = 5
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMER_CODE = """
+import sys, time
+start = time.perf_counter()
+import numpy
+numpy_secs = time.perf_counter() - start
+start = time.perf_counter()
+if %(module)r:
+    __import__(%(module)r)
+module_secs = time.perf_counter() - start
+loaded = sorted({name.split('.')[0] for name in sys.modules})
+print(numpy_secs, module_secs, ' '.join(loaded))
+"""
+
+
+def time_import(module):
+    """
+    Imports module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : str
+        '' imports NumPy only
+
+    Returns
+    -------
+    float, float, set[str]
+        seconds to import NumPy, seconds to import module after NumPy,
+        top-level names of all the modules loaded
+
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', TIMER_CODE % {'module': module}],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    numpy_secs, module_secs, *loaded = output.split()
+    return float(numpy_secs), float(module_secs), set(loaded)
+
+
+def main():
+    failed = False
+    numpy_secs = min(time_import('')[0] for _ in range(NUM_RUNS))
+    print("%-14s %8.1f ms" % ('numpy', 1000*numpy_secs))
+    for module in CORE_MODULES:
+        runs = [time_import(module) for _ in range(NUM_RUNS)]
+        module_secs = min(run[1] for run in runs)
+        forbidden = sorted(runs[0][2] & set(FORBIDDEN_MODULES))
+        status = 'ok'
+        if forbidden:
+            status = 'FAIL: loads ' + ', '.join(forbidden)
+        elif module_secs > BUDGET_SECS:
+            status = 'FAIL: over budget of %.0f ms' % (1000*BUDGET_SECS)
+        failed |= status != 'ok'
+        print("%-14s %+8.1f ms  %s" % (module, 1000*module_secs, status))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Scaling benchmark of ParallelBounder.
+
+Times ParallelBounder.calc_pns3_bds() with both backends, from 1 worker
+to os.cpu_count() workers, against the serial BatchBounder.calc_pns3_bds()
+and against a plain process pool that pickles the arrays of each chunk
+to the workers and the bounds back. The pools are warmed up before
+timing, so pool startup is not counted. With 1 worker, ParallelBounder
+runs the serial path.
+
+Usage, from the root of the repo:
+
+    python benchmarks/parallel_scaling.py [num_strata]
+
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+from BatchBounder import BatchBounder  # noqa: E402
+from ParallelBounder import ParallelBounder  # noqa: E402
+
+NUM_RUNS = 3
+CHUNK_SIZE = 1 << 16
+
+
+def best_time(fun):
+    """
+    Returns the best of NUM_RUNS wall times of fun(), in seconds.
+
+    """
+    secs = []
+    for _ in range(NUM_RUNS):
+        start = time.perf_counter()
+        fun()
+        secs.append(time.perf_counter() - start)
+    return min(secs)
+
+
+def calc_pickled(executor, o_y_bar_x, px, e_y_bar_x):
+    """
+    Baseline: each task pickles its rows to a worker and its bounds back.
+
+    """
+    ranges = ParallelBounder.get_ranges(len(o_y_bar_x), CHUNK_SIZE)
+    futures = [executor.submit(BatchBounder.calc_pns3_bds,
+                               o_y_bar_x[start:stop], px[start:stop],
+                               e_y_bar_x[start:stop], True, True)
+               for start, stop in ranges]
+    return np.concatenate([future.result() for future in futures])
+
+
+def main():
+    num_strata = int(sys.argv[1]) if len(sys.argv) > 1 else 4*10**6
+    rng = np.random.default_rng(0)
+    o1 = rng.random((num_strata, 2))
+    o_y_bar_x = np.stack([1 - o1, o1], axis=1)
+    px1 = rng.random(num_strata)
+    px = np.stack([1 - px1, px1], axis=1)
+    left, right = BatchBounder.calc_exp_probs_bds(o_y_bar_x, px, True)
+    e1 = rng.uniform(left[:, 1], right[:, 1])
+    e_y_bar_x = np.stack([1 - e1, e1], axis=1)
+    args = (o_y_bar_x, px, e_y_bar_x, True, True)
+
+    expected = BatchBounder.calc_pns3_bds(*args)
+    serial_secs = best_time(lambda: BatchBounder.calc_pns3_bds(*args))
+    print("%d strata, %d cores" % (num_strata, os.cpu_count()))
+    print("%-9s %7s %10s %8s" % ('backend', 'workers', 'ms', 'speedup'))
+    print("%-9s %7d %10.1f %8.2f" % ('serial', 1, 1000*serial_secs, 1.))
+    for num_workers in range(1, (os.cpu_count() or 1) + 1):
+        for backend in ParallelBounder.BACKENDS:
+            with ParallelBounder(num_workers, backend, CHUNK_SIZE) as pb:
+                assert np.array_equal(pb.calc_pns3_bds(*args), expected)
+                secs = best_time(lambda: pb.calc_pns3_bds(*args))
+            print("%-9s %7d %10.1f %8.2f" % (backend, num_workers,
+                                             1000*secs, serial_secs/secs))
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            assert np.array_equal(
+                calc_pickled(executor, o_y_bar_x, px, e_y_bar_x), expected)
+            secs = best_time(lambda: calc_pickled(executor, o_y_bar_x, px,
+                                                  e_y_bar_x))
+        print("%-9s %7d %10.1f %8.2f" % ('pickled', num_workers,
+                                         1000*secs, serial_secs/secs))
+
+
+if __name__ == "__main__":
+    main()